@@ -0,0 +1,323 @@
+"""
+Vectorized batch candle engine for historical backfills.
+
+Instead of pushing every trade through the quixstreams windows, the trades are read in
+large chunks (from the historical trades topic, or from the page cache of a REST
+backfill of the trades_ingestion service) into NumPy columns, and the candles of all
+pairs and all timeframes are computed with a group-by on (pair, timestamp_ms // window).
+
+The candles have the same schema as the ones of `MultiTimeframeStreamReader`. Like a
+historical run of the streaming engine, which closes the windows still open at the end
+of a partition, every window is emitted, including the last one of every pair. The
+indicators are computed with the same `Indicators` as the streaming engine.
+"""
+
+import gzip
+import json
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import orjson
+from columnar import decode_trade_columns
+from confluent_kafka import Consumer, TopicPartition
+from indicators import Indicators
+from loguru import logger
+from quixstreams import Application
+from quixstreams.utils.json import dumps
+
+# (pair codes, timestamp_ms, price, volume, side) of a chunk of trades, with the side
+# coded as 1 (buy), -1 (sell) or 0 (unknown)
+TradeChunk = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+SIDE_CODES = {'buy': 1, 'sell': -1, 'b': 1, 's': -1}
+
+
+class PairCodes:
+    """
+    Maps pair names to the integer codes used for the group-by.
+    """
+
+    def __init__(self):
+        self.pairs: List[str] = []
+        self._codes: Dict[str, int] = {}
+
+    def code(self, pair: str) -> int:
+        code = self._codes.get(pair)
+        if code is None:
+            code = self._codes[pair] = len(self.pairs)
+            self.pairs.append(pair)
+        return code
+
+
+def read_topic(
+    kafka_broker_address: str,
+    kafka_topic: str,
+    kafka_consumer_group: str,
+    trades_wire_format: str,
+    pair_codes: PairCodes,
+    chunk_size: int = 100_000,
+) -> Iterator[TradeChunk]:
+    """
+    Reads the trades topic from the beginning up to the high watermarks at the time of
+    the call, `chunk_size` messages at a time. No offsets are committed, so a backfill
+    can simply be run again.
+    """
+    consumer = Consumer(
+        {
+            'bootstrap.servers': kafka_broker_address,
+            'group.id': kafka_consumer_group,
+            'enable.auto.commit': False,
+        }
+    )
+
+    # Snapshot where the topic ends, so the backfill knows when it is done
+    partitions = consumer.list_topics(kafka_topic).topics[kafka_topic].partitions
+    remaining = {}
+    assignment = []
+    for partition in partitions:
+        low, high = consumer.get_watermark_offsets(
+            TopicPartition(kafka_topic, partition)
+        )
+        if high > low:
+            remaining[partition] = high
+            assignment.append(TopicPartition(kafka_topic, partition, low))
+    consumer.assign(assignment)
+
+    try:
+        while remaining:
+            codes, timestamps_ms, prices, volumes, sides = [], [], [], [], []
+            for message in consumer.consume(num_messages=chunk_size, timeout=1.0):
+                if message.error():
+                    logger.error(f'Error consuming trades: {message.error()}')
+                    continue
+
+                partition = message.partition()
+                if partition not in remaining:
+                    continue
+                if message.offset() >= remaining[partition] - 1:
+                    del remaining[partition]
+
+                if trades_wire_format == 'columnar':
+                    pair, ts, price, volume, side = decode_trade_columns(
+                        message.value()
+                    )
+                    codes.append(np.full(len(ts), pair_codes.code(pair), np.int32))
+                    timestamps_ms.append(np.frombuffer(ts, dtype=np.int64))
+                    prices.append(np.frombuffer(price, dtype=np.float64))
+                    volumes.append(np.frombuffer(volume, dtype=np.float64))
+                    sides.append(np.frombuffer(side, dtype=np.int8))
+                else:
+                    trade = orjson.loads(message.value())
+                    codes.append(pair_codes.code(trade['pair']))
+                    timestamps_ms.append(trade['timestamp_ms'])
+                    prices.append(trade['price'])
+                    volumes.append(trade['volume'])
+                    sides.append(SIDE_CODES.get(trade.get('side'), 0))
+
+            if not codes:
+                continue
+
+            if trades_wire_format == 'columnar':
+                yield (
+                    np.concatenate(codes),
+                    np.concatenate(timestamps_ms),
+                    np.concatenate(prices),
+                    np.concatenate(volumes),
+                    np.concatenate(sides),
+                )
+            else:
+                yield (
+                    np.array(codes, dtype=np.int32),
+                    np.array(timestamps_ms, dtype=np.int64),
+                    np.array(prices, dtype=np.float64),
+                    np.array(volumes, dtype=np.float64),
+                    np.array(sides, dtype=np.int8),
+                )
+    finally:
+        consumer.close()
+
+
+def read_archive(directory: str, pair_codes: PairCodes) -> Iterator[TradeChunk]:
+    """
+    Reads the REST page cache of the trades_ingestion service (the `pages` directory
+    under its BACKFILL_CACHE_DIR), one pair at a time. Trades of overlapping pages are
+    deduplicated by their trade id.
+
+    E.g. cached trade:
+        ['76395.00000', '0.01305597', 1731155565.4159515, 's', 'm', '', 75468573]
+    """
+    for pair_dir in sorted(Path(directory).iterdir()):
+        if not pair_dir.is_dir():
+            continue
+        pair = pair_dir.name.replace('-', '/')
+
+        trades = {}
+        for path in sorted(pair_dir.glob('*.json.gz')):
+            with gzip.open(path, 'rt') as f:
+                for trade in json.load(f):
+                    trades[trade[6] if len(trade) > 6 else (trade[2], trade[0])] = trade
+
+        if not trades:
+            continue
+
+        trades = list(trades.values())
+        yield (
+            np.full(len(trades), pair_codes.code(pair), dtype=np.int32),
+            (np.array([float(t[2]) for t in trades]) * 1000).astype(np.int64),
+            np.array([float(t[0]) for t in trades]),
+            np.array([float(t[1]) for t in trades]),
+            np.array([SIDE_CODES.get(t[3], 0) for t in trades], dtype=np.int8),
+        )
+        logger.info(f'Read {len(trades)} trades for pair {pair} from {pair_dir}')
+
+
+def compute_candles(
+    chunks: List[TradeChunk],
+    pairs: List[str],
+    candle_seconds: List[int],
+    indicators: Optional[Indicators] = None,
+) -> List[dict]:
+    """
+    Computes the OHLCV candles of all pairs for every timeframe in `candle_seconds`,
+    including the last window of every pair (like the streaming engine flushes it at
+    the end of a historical run).
+    """
+    codes = np.concatenate([chunk[0] for chunk in chunks])
+    timestamps_ms = np.concatenate([chunk[1] for chunk in chunks])
+    prices = np.concatenate([chunk[2] for chunk in chunks])
+    volumes = np.concatenate([chunk[3] for chunk in chunks])
+    sides = np.concatenate([chunk[4] for chunk in chunks])
+    if not len(codes):
+        return []
+
+    # Sort by pair, then by time. lexsort is stable, so trades with the same timestamp
+    # keep their order of arrival (like in the streaming windows)
+    order = np.lexsort((timestamps_ms, codes))
+    codes = codes[order]
+    timestamps_ms = timestamps_ms[order]
+    prices = prices[order]
+    volumes = volumes[order]
+    sides = sides[order]
+    buy_volumes = np.where(sides == 1, volumes, 0.0)
+    sell_volumes = np.where(sides == -1, volumes, 0.0)
+    notionals = prices * volumes
+
+    candles = []
+    for seconds in candle_seconds:
+        length_ms = seconds * 1000
+        windows = timestamps_ms // length_ms
+
+        # One group per (pair, window)
+        is_first = np.concatenate(
+            [[True], (np.diff(codes) != 0) | (np.diff(windows) != 0)]
+        )
+        groups = np.cumsum(is_first) - 1
+        firsts = np.flatnonzero(is_first)
+        lasts = np.concatenate([firsts[1:], [len(codes)]]) - 1
+
+        window_start_ms = windows[firsts] * length_ms
+        window_end_ms = window_start_ms + length_ms
+
+        columns = {
+            'pair': np.array(pairs, dtype=object)[codes[firsts]],
+            'timestamp_ms': timestamps_ms[lasts],
+            'open': prices[firsts],
+            'high': np.maximum.reduceat(prices, firsts),
+            'low': np.minimum.reduceat(prices, firsts),
+            'close': prices[lasts],
+            # bincount adds up in order, like the reducer of the streaming windows
+            'volume': np.bincount(groups, weights=volumes),
+            'trade_count': np.bincount(groups),
+            'buy_volume': np.bincount(groups, weights=buy_volumes),
+            'sell_volume': np.bincount(groups, weights=sell_volumes),
+            'vwap': np.bincount(groups, weights=notionals),
+            'window_start_ms': window_start_ms,
+            'window_end_ms': window_end_ms,
+        }
+        volume = columns['volume']
+        columns['vwap'] = np.divide(
+            columns['vwap'],
+            volume,
+            out=columns['close'].copy(),
+            where=volume > 0,
+        )
+        columns = {name: column.tolist() for name, column in columns.items()}
+
+        n = len(columns['pair'])
+        timeframe_candles = [
+            {name: column[i] for name, column in columns.items()}
+            | {'candle_seconds': seconds}
+            for i in range(n)
+        ]
+        if indicators is not None:
+            add_indicators(timeframe_candles, indicators)
+        candles += timeframe_candles
+        logger.info(f'Computed {n} candles of {seconds} seconds')
+
+    return candles
+
+
+def add_indicators(candles: List[dict], indicators: Indicators) -> None:
+    """
+    Adds the indicators to the candles of one timeframe (sorted by pair, then
+    by window), the same way the streaming engine does.
+    """
+    state = None
+    pair = None
+    for candle in candles:
+        if candle['pair'] != pair:
+            pair = candle['pair']
+            state = indicators.initial_state()
+        state = indicators.update(state, candle['close'])
+        candle.update(indicators.values(state))
+
+
+def run_batch_engine(
+    kafka_broker_address: str,
+    kafka_input_topic: str,
+    kafka_output_topic: str,
+    kafka_consumer_group: str,
+    candle_seconds: List[int],
+    trades_wire_format: str = 'json',
+    trades_archive_dir: Optional[str] = None,
+    chunk_size: int = 100_000,
+    indicators: Optional[Indicators] = None,
+) -> None:
+    """
+    Computes the candles of the whole history at once and pushes them to the output
+    topic.
+    """
+    pair_codes = PairCodes()
+    if trades_archive_dir:
+        logger.info(f'Reading trades from the archive {trades_archive_dir}')
+        chunks = list(read_archive(trades_archive_dir, pair_codes))
+    else:
+        logger.info(f'Reading trades from the topic {kafka_input_topic}')
+        chunks = []
+        n_trades = 0
+        for chunk in read_topic(
+            kafka_broker_address=kafka_broker_address,
+            kafka_topic=kafka_input_topic,
+            kafka_consumer_group=kafka_consumer_group,
+            trades_wire_format=trades_wire_format,
+            pair_codes=pair_codes,
+            chunk_size=chunk_size,
+        ):
+            chunks.append(chunk)
+            n_trades += len(chunk[0])
+            logger.info(f'Read {n_trades} trades')
+
+    candles = compute_candles(chunks, pair_codes.pairs, candle_seconds, indicators)
+
+    app = Application(broker_address=kafka_broker_address)
+    output_topic = app.topic(name=kafka_output_topic, value_serializer='json')
+    with app.get_producer() as producer:
+        for candle in candles:
+            producer.produce(
+                topic=output_topic.name,
+                key=candle['pair'].replace('/', '-'),
+                value=dumps(candle),
+            )
+
+    logger.info(f'Pushed {len(candles)} candles to {kafka_output_topic}')
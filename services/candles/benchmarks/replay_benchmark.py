@@ -0,0 +1,754 @@
+"""
+Deterministic replay benchmark and correctness check of `MultiTimeframeStreamReader`.
+
+Replays a fixed trade dataset (seeded synthetic trades, or a JSONL file of trades as
+the trades_ingestion service produces them) through the stream processing of the
+service, and compares the candles it emits with the candles the batch engine
+(`batch_candles.compute_candles`) computes from the same trades, for every
+`candle_seconds`. Every (pair, candle_seconds, window) has to match, including the
+indicators. Trades the service rejected as late (too far out of order for the allowed
+lateness) are taken out of the reference.
+
+Like a historical run at the end of a partition, the service closes (and rolls up)
+the windows still open at the end of the dataset, so every window is compared.
+
+By default the messages are fed to the dataframe of the service in-process, with an
+in-memory producer, checkpoint and state store, so only the service itself is measured.
+With `--broker` the dataset is produced to a fresh topic of a real broker (e.g. the
+local redpanda of docker-compose/redpanda.yaml) and the service runs in historical mode
+until its end.
+
+Every scenario (candle aggregation x trades wire format) runs in a fresh process.
+Reported are messages/sec and trades/sec, the latency from feeding a message until the
+candles it completed were produced (in-memory only), CPU time and peak RSS. The results
+are written as JSON, so runs on different commits can be compared with `--compare`. The
+exit status is 1 if the candles of any scenario do not match.
+
+Usage (from services/candles):
+    uv run python -m benchmarks.replay_benchmark --trades 200000
+    uv run python -m benchmarks.replay_benchmark --compare benchmarks/results/replay-<commit>.json
+"""
+
+import argparse
+import functools
+import json
+import math
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from contextvars import copy_context
+from datetime import datetime, timezone
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from unittest import mock
+
+import numpy as np
+from batch_candles import SIDE_CODES, PairCodes, compute_candles
+from columnar import HEADER, MAGIC
+from confluent_kafka import (
+    OFFSET_BEGINNING,
+    TIMESTAMP_CREATE_TIME,
+    Consumer,
+    TopicPartition,
+)
+from indicators import INDICATOR_FIELDS, Indicators
+from loguru import logger
+from quixstreams import Application
+from quixstreams.context import set_message_context
+from quixstreams.models import TopicConfig
+from quixstreams.rowproducer import _KEY_UNSET
+from quixstreams.utils.json import dumps, loads
+
+AGGREGATIONS = ['independent', 'cascade']
+WIRE_FORMATS = ['json', 'columnar']
+RESULTS_DIR = Path(__file__).parent / 'results'
+
+# (key, value, timestamp_ms) of a message of the trades topic
+TradeMessage = Tuple[bytes, bytes, int]
+CandleKey = Tuple[str, int, int]
+# Values of the candles and of the late trades the service produced
+Outputs = Tuple[List[bytes], List[bytes]]
+
+
+def make_trades(n_trades: int, n_pairs: int, seed: int, jitter_ms: int) -> List[dict]:
+    """
+    Returns `n_trades` trades of `n_pairs` pairs with a random walk price per pair.
+    Every trade is up to `jitter_ms` older than the latest one before it, so the trades
+    arrive out of order.
+    """
+    rng = random.Random(seed)
+    pairs = [f'PAIR{i}/USD' for i in range(n_pairs)]
+    prices = [rng.uniform(10, 1000) for _ in pairs]
+    timestamp_ms = 1_700_000_000_000
+
+    trades = []
+    for i in range(n_trades):
+        index = rng.randrange(n_pairs)
+        timestamp_ms += rng.randint(0, 40)
+        prices[index] *= 1 + rng.gauss(0, 0.0005)
+        trades.append(
+            {
+                'pair': pairs[index],
+                'price': round(prices[index], 6),
+                'volume': round(rng.random(), 8),
+                'timestamp_ms': timestamp_ms - rng.randint(0, jitter_ms),
+                'trade_id': i,
+                'side': rng.choice(['buy', 'sell']),
+            }
+        )
+    return trades
+
+
+def load_trades(path: Path) -> List[dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def encode_columnar(pair: str, trades: List[dict]) -> bytes:
+    """Same layout as the columnar encoder of the trades_ingestion service"""
+    pair_bytes = pair.encode()
+    columns = [
+        array('q', [t['timestamp_ms'] for t in trades]),
+        array('d', [t['price'] for t in trades]),
+        array('d', [t['volume'] for t in trades]),
+        array('b', [SIDE_CODES.get(t['side'], 0) for t in trades]),
+    ]
+    if sys.byteorder == 'big':
+        for column in columns:
+            column.byteswap()
+    return b''.join(
+        [HEADER.pack(MAGIC, len(pair_bytes), len(trades)), pair_bytes]
+        + [column.tobytes() for column in columns]
+    )
+
+
+def to_messages(
+    trades: List[dict], wire_format: str, batch_size: int
+) -> List[TradeMessage]:
+    """
+    Serializes the trades like the trades_ingestion service does: one message per trade,
+    or micro-batches of up to `batch_size` trades of a pair.
+    """
+    if wire_format == 'json':
+        return [
+            (t['pair'].replace('/', '-').encode(), dumps(t), t['timestamp_ms'])
+            for t in trades
+        ]
+
+    messages = []
+    batches: Dict[str, List[dict]] = {}
+
+    def flush(pair: str) -> None:
+        batch = batches.pop(pair)
+        messages.append(
+            (
+                pair.replace('/', '-').encode(),
+                encode_columnar(pair, batch),
+                batch[-1]['timestamp_ms'],
+            )
+        )
+
+    for trade in trades:
+        batches.setdefault(trade['pair'], []).append(trade)
+        if len(batches[trade['pair']]) >= batch_size:
+            flush(trade['pair'])
+    for pair in list(batches):
+        flush(pair)
+    return messages
+
+
+class Message:
+    """Stand-in for a consumed `confluent_kafka.Message`"""
+
+    def __init__(self, topic: str, offset: int, message: TradeMessage):
+        self._topic = topic
+        self._offset = offset
+        self._key, self._value, self._timestamp_ms = message
+
+    def topic(self) -> str:
+        return self._topic
+
+    def partition(self) -> int:
+        return 0
+
+    def offset(self) -> int:
+        return self._offset
+
+    def key(self) -> bytes:
+        return self._key
+
+    def value(self) -> bytes:
+        return self._value
+
+    def headers(self) -> None:
+        return None
+
+    def timestamp(self) -> Tuple[int, int]:
+        return TIMESTAMP_CREATE_TIME, self._timestamp_ms
+
+    def leader_epoch(self) -> None:
+        return None
+
+    def __len__(self) -> int:
+        return len(self._key) + len(self._value)
+
+
+class InMemoryProducer:
+    """
+    Stand-in for the producer of the application that serializes the messages like the
+    real one, and keeps them with the time they were produced.
+    """
+
+    def __init__(self):
+        self.messages: List[Tuple[str, Optional[bytes], float]] = []
+
+    def produce_row(self, row, topic, key=_KEY_UNSET, partition=None, timestamp=None):
+        message = topic.row_serialize(
+            row=row, key=row.key if key is _KEY_UNSET else key
+        )
+        self.produce(topic=topic.name, key=message.key, value=message.value)
+
+    def produce(self, topic: str, key=None, value=None, **kwargs) -> None:
+        self.messages.append((topic, value, time.perf_counter()))
+
+
+class InMemoryCheckpoint:
+    """Stand-in for the checkpoint, committing the state store transactions"""
+
+    def __init__(self, state_manager):
+        self.state_manager = state_manager
+        self._transactions = {}
+
+    def get_store_transaction(self, topic: str, partition: int, store_name='default'):
+        key = (topic, partition, store_name)
+        if key not in self._transactions:
+            store = self.state_manager.get_store(topic=topic, store_name=store_name)
+            self._transactions[key] = store.start_partition_transaction(partition)
+        return self._transactions[key]
+
+    def commit(self) -> None:
+        for transaction in self._transactions.values():
+            transaction.prepare(processed_offset=None)
+            transaction.flush()
+        self._transactions = {}
+
+
+def make_reader(
+    broker: str,
+    input_topic: str,
+    output_topic: str,
+    late_topic: str,
+    consumer_group: str,
+    aggregation: str,
+    wire_format: str,
+    params: dict,
+):
+    from trades_to_candles import CandleLength, MultiTimeframeStreamReader
+
+    return MultiTimeframeStreamReader(
+        kafka_broker_address=broker,
+        kafka_input_topic=input_topic,
+        kafka_output_topic=output_topic,
+        kafka_consumer_group=consumer_group,
+        candle_configs=[
+            CandleLength(seconds, f'{seconds}sec')
+            for seconds in params['candle_seconds']
+        ],
+        data_source='historical',
+        emit_incomplete_candles=params['emit_incomplete'],
+        trades_wire_format=wire_format,
+        candle_aggregation=aggregation,
+        indicators=Indicators() if params['indicators'] else None,
+        allowed_lateness_seconds=params['allowed_lateness_seconds'],
+        kafka_late_topic=late_topic,
+        incomplete_candle_interval_seconds=params['incomplete_candle_interval_seconds'],
+    )
+
+
+def replay_in_memory(
+    messages: List[TradeMessage],
+    aggregation: str,
+    wire_format: str,
+    params: dict,
+) -> Tuple[Outputs, List[float], List[float]]:
+    """
+    Feeds the messages to the dataframe of the service one by one, like the
+    application does, and returns the produced candles and late trades, the processing
+    time of every message and the latency of every candle.
+    """
+    import trades_to_candles
+
+    # No broker: local state without changelog topics
+    application = functools.partial(
+        Application, use_changelog_topics=False, state_dir=tempfile.mkdtemp()
+    )
+    with mock.patch.object(trades_to_candles, 'Application', application):
+        reader = make_reader(
+            'localhost:9092',
+            'replay_trades',
+            'replay_candles',
+            'replay_late_trades',
+            'replay',
+            aggregation,
+            wire_format,
+            params,
+        )
+
+    app = reader._app
+    producer = InMemoryProducer()
+    app._processing_context.producer = producer
+    checkpoint = InMemoryCheckpoint(app._state_manager)
+    app._processing_context._checkpoint = checkpoint
+
+    reader.build_dataframe()
+    executor = app._dataframe_registry.compose_all()[reader.input_topic.name]
+    app._state_manager.on_partition_assign(reader.input_topic.name, 0, 0)
+
+    processing_seconds = []
+    latencies = []
+    for offset, message in enumerate(messages):
+        produced = len(producer.messages)
+        start = time.perf_counter()
+
+        rows = reader.input_topic.row_deserialize(
+            Message(reader.input_topic.name, offset, message)
+        )
+        for row in rows if isinstance(rows, list) else [rows]:
+            context = copy_context()
+            context.run(set_message_context, row.context)
+            context.run(executor, row.value, row.key, row.timestamp, row.headers)
+
+        processing_seconds.append(time.perf_counter() - start)
+        latencies += [
+            produced_at - start
+            for topic, _, produced_at in producer.messages[produced:]
+            if topic == reader.output_topic.name
+        ]
+        if (offset + 1) % params['commit_every'] == 0:
+            checkpoint.commit()
+
+    # The end of the input, as in a historical run
+    reader._flush_partition(0)
+    checkpoint.commit()
+
+    candles = [
+        value
+        for topic, value, _ in producer.messages
+        if topic == reader.output_topic.name
+    ]
+    late_trades = [
+        value
+        for topic, value, _ in producer.messages
+        if topic == reader.late_topic.name
+    ]
+    return (candles, late_trades), processing_seconds, latencies
+
+
+def read_topic(broker: str, topic: str) -> List[bytes]:
+    """Reads the values of a topic from the beginning up to its current end"""
+    consumer = Consumer(
+        {'bootstrap.servers': broker, 'group.id': f'replay-benchmark-{uuid.uuid4()}'}
+    )
+    try:
+        partitions = consumer.list_topics(topic, timeout=30).topics[topic].partitions
+        ends = {}
+        for partition in partitions:
+            low, high = consumer.get_watermark_offsets(TopicPartition(topic, partition))
+            if high > low:
+                ends[partition] = high
+        consumer.assign([TopicPartition(topic, p, OFFSET_BEGINNING) for p in ends])
+
+        messages = []
+        while ends:
+            for message in consumer.consume(num_messages=10000, timeout=30):
+                if message.error():
+                    raise RuntimeError(message.error())
+                messages.append(message.value())
+                if message.offset() >= ends.get(message.partition(), 0) - 1:
+                    ends.pop(message.partition(), None)
+        return messages
+    finally:
+        consumer.close()
+
+
+def replay_broker(
+    broker: str,
+    messages: List[TradeMessage],
+    aggregation: str,
+    wire_format: str,
+    params: dict,
+) -> Tuple[Outputs, float]:
+    """
+    Produces the messages to a fresh topic (with a single partition, to keep their
+    order), runs the service in historical mode until its end and reads back the
+    candles and late trades. Returns them and the seconds the service ran.
+    """
+    run_id = uuid.uuid4().hex[:8]
+    input_topic = f'replay_benchmark_trades_{run_id}'
+    output_topic = f'replay_benchmark_candles_{run_id}'
+    late_topic = f'replay_benchmark_late_trades_{run_id}'
+
+    app = Application(broker_address=broker)
+    topic = app.topic(
+        name=input_topic, config=TopicConfig(num_partitions=1, replication_factor=1)
+    )
+    with app.get_producer() as producer:
+        for key, value, timestamp_ms in messages:
+            producer.produce(
+                topic=topic.name, key=key, value=value, timestamp=timestamp_ms
+            )
+
+    reader = make_reader(
+        broker,
+        input_topic,
+        output_topic,
+        late_topic,
+        f'replay_benchmark_{run_id}',
+        aggregation,
+        wire_format,
+        params,
+    )
+    start = time.perf_counter()
+    reader.run()
+    seconds = time.perf_counter() - start
+
+    return (read_topic(broker, output_topic), read_topic(broker, late_topic)), seconds
+
+
+def equal(candle: dict, reference: dict, skipped_fields: List[str] = ()) -> bool:
+    if candle.keys() != reference.keys():
+        return False
+    for field, value in candle.items():
+        if field in skipped_fields:
+            continue
+        expected = reference[field]
+        if isinstance(value, float) and isinstance(expected, float):
+            if not math.isclose(value, expected, rel_tol=1e-9, abs_tol=1e-12):
+                return False
+        elif value != expected:
+            return False
+    return True
+
+
+def check_candles(
+    candles: Dict[CandleKey, dict],
+    trades: List[dict],
+    late_trades: List[dict],
+    params: dict,
+) -> dict:
+    """
+    Compares the latest version of every emitted candle with the reference candles of
+    the batch engine, computed from the trades that were not late.
+
+    Incomplete candles with an allowed lateness are the exception for the indicators:
+    a window is folded into the indicator state once the next window starts, and a
+    trade that still makes it into the window afterwards changes its final close but
+    not the indicators computed from it. Their OHLCV is compared as usual.
+    """
+    skipped_fields = []
+    if (
+        params['indicators']
+        and params['emit_incomplete']
+        and params['allowed_lateness_seconds']
+    ):
+        skipped_fields = INDICATOR_FIELDS
+
+    late = {
+        (t['pair'], t['timestamp_ms'], t['price'], t['volume']) for t in late_trades
+    }
+    accepted = [
+        t
+        for t in trades
+        if (t['pair'], t['timestamp_ms'], t['price'], t['volume']) not in late
+    ]
+
+    pair_codes = PairCodes()
+    chunk = (
+        np.array([pair_codes.code(t['pair']) for t in accepted], dtype=np.int32),
+        np.array([t['timestamp_ms'] for t in accepted], dtype=np.int64),
+        np.array([t['price'] for t in accepted], dtype=np.float64),
+        np.array([t['volume'] for t in accepted], dtype=np.float64),
+        np.array([SIDE_CODES.get(t['side'], 0) for t in accepted], dtype=np.int8),
+    )
+    reference = {
+        (c['pair'], c['candle_seconds'], c['window_start_ms']): c
+        for c in compute_candles(
+            [chunk],
+            pair_codes.pairs,
+            params['candle_seconds'],
+            Indicators() if params['indicators'] else None,
+        )
+    }
+    mismatched = [
+        key
+        for key in candles
+        if key in reference and not equal(candles[key], reference[key], skipped_fields)
+    ]
+    missing = [key for key in reference if key not in candles]
+    unexpected = [key for key in candles if key not in reference]
+
+    result = {
+        'correct': not (mismatched or missing or unexpected),
+        'candles': len(candles),
+        'reference_candles': len(reference),
+        'late_trades': len(late_trades),
+        'mismatched': len(mismatched),
+        'missing': len(missing),
+        'unexpected': len(unexpected),
+        'skipped_fields': skipped_fields,
+    }
+    if mismatched:
+        key = mismatched[0]
+        result['first_mismatch'] = {
+            field: [value, reference[key].get(field)]
+            for field, value in candles[key].items()
+            if not equal({field: value}, {field: reference[key].get(field)})
+        }
+        result['first_mismatch']['key'] = list(key)
+    return result
+
+
+def run_scenario(
+    aggregation: str,
+    wire_format: str,
+    dataset: Optional[Path],
+    params: dict,
+    broker: Optional[str],
+) -> dict:
+    """
+    Runs a single scenario and returns its measurements. Meant to run in a fresh
+    process.
+    """
+    # One log line per candle (or late trade) would dominate the measurements
+    logger.remove()
+    logger.add(sys.stderr, level='ERROR')
+
+    if dataset is not None:
+        trades = load_trades(dataset)
+    else:
+        trades = make_trades(
+            params['trades'], params['pairs'], params['seed'], params['jitter_ms']
+        )
+    messages = to_messages(trades, wire_format, params['batch_size'])
+
+    rss_before_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+
+    latencies_ms = None
+    processing_ms = None
+    if broker is None:
+        outputs, processing_seconds, latencies = replay_in_memory(
+            messages, aggregation, wire_format, params
+        )
+        processing_ms = np.array(processing_seconds) * 1000
+        latencies_ms = np.array(latencies) * 1000
+        seconds = time.perf_counter() - start
+    else:
+        outputs, seconds = replay_broker(
+            broker, messages, aggregation, wire_format, params
+        )
+
+    usage_after = resource.getrusage(resource.RUSAGE_SELF)
+    cpu_seconds = (usage_after.ru_utime - usage_before.ru_utime) + (
+        usage_after.ru_stime - usage_before.ru_stime
+    )
+
+    # Latest version of every candle
+    candle_values, late_values = outputs
+    candles: Dict[CandleKey, dict] = {}
+    for value in candle_values:
+        candle = loads(value)
+        candles[
+            (candle['pair'], candle['candle_seconds'], candle['window_start_ms'])
+        ] = candle
+    late_trades = [loads(value) for value in late_values]
+
+    def percentiles(values: Optional[np.ndarray]) -> Optional[dict]:
+        if values is None or not len(values):
+            return None
+        return {
+            'p50': round(float(np.percentile(values, 50)), 4),
+            'p99': round(float(np.percentile(values, 99)), 4),
+            'max': round(float(values.max()), 4),
+        }
+
+    n_trades = len(trades)
+    return {
+        'aggregation': aggregation,
+        'wire_format': wire_format,
+        'messages': len(messages),
+        'trades': n_trades,
+        'candle_messages': len(candle_values),
+        'seconds': round(seconds, 4),
+        'messages_per_sec': round(len(messages) / seconds, 1),
+        'trades_per_sec': round(n_trades / seconds, 1),
+        'processing_ms': percentiles(processing_ms),
+        'latency_ms': percentiles(latencies_ms),
+        'cpu_seconds': round(cpu_seconds, 4),
+        'cpu_utilization': round(cpu_seconds / seconds, 3),
+        'rss_before_mb': round(rss_before_mb, 1),
+        'peak_rss_mb': round(usage_after.ru_maxrss / 1024, 1),
+        'check': check_candles(candles, trades, late_trades, params),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(results: List[dict], baseline_path: Path) -> None:
+    """
+    Prints the change in throughput against a previous results file.
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    by_key = {(r['aggregation'], r['wire_format']): r for r in baseline['results']}
+    print(f'\nCompared to {baseline["commit"]} ({baseline_path}):')
+    for result in results:
+        key = (result['aggregation'], result['wire_format'])
+        if key not in by_key:
+            continue
+        change = result['trades_per_sec'] / by_key[key]['trades_per_sec'] - 1
+        print(f'{key[0]:>12} {key[1]:>8}: {change:+.1%} trades/sec')
+
+
+def main(
+    aggregations: List[str],
+    wire_formats: List[str],
+    dataset: Optional[Path],
+    params: dict,
+    broker: Optional[str],
+    output: Optional[Path],
+    baseline: Optional[Path],
+) -> bool:
+    results = []
+    for aggregation in aggregations:
+        for wire_format in wire_formats:
+            with ProcessPoolExecutor(
+                max_workers=1, mp_context=get_context('spawn')
+            ) as pool:
+                result = pool.submit(
+                    run_scenario, aggregation, wire_format, dataset, params, broker
+                ).result()
+            results.append(result)
+
+            latency = result['latency_ms']
+            check = result['check']
+            print(
+                f'{aggregation:>12} {wire_format:>8}: '
+                f'{result["trades_per_sec"]:>10,.0f} trades/sec, '
+                f'{result["messages_per_sec"]:>10,.0f} msgs/sec, '
+                + (
+                    f'latency p50 {latency["p50"]:.3f} ms p99 {latency["p99"]:.3f} ms, '
+                    if latency
+                    else ''
+                )
+                + f'peak rss {result["peak_rss_mb"]:.0f} MB, '
+                f'{"correct" if check["correct"] else "INCORRECT"} '
+                f'({check["candles"]} candles, {check["mismatched"]} mismatched, '
+                f'{check["missing"]} missing, {check["unexpected"]} unexpected)'
+            )
+
+    commit = git_commit()
+    report = {
+        'commit': commit,
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': {
+            **params,
+            'dataset': str(dataset) if dataset else 'synthetic',
+            'broker': broker or 'in-memory',
+        },
+        'results': results,
+    }
+
+    output = output or RESULTS_DIR / f'replay-{commit}.json'
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'\nResults written to {output}')
+
+    if baseline is not None:
+        compare(results, baseline)
+
+    return all(result['check']['correct'] for result in results)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument(
+        '--aggregations', nargs='+', choices=AGGREGATIONS, default=AGGREGATIONS
+    )
+    parser.add_argument(
+        '--wire-formats', nargs='+', choices=WIRE_FORMATS, default=WIRE_FORMATS
+    )
+    parser.add_argument(
+        '--dataset', type=Path, default=None, help='JSONL file of trades'
+    )
+    parser.add_argument('--trades', type=int, default=200_000)
+    parser.add_argument('--pairs', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument(
+        '--jitter-ms', type=int, default=1000, help='how far trades are out of order'
+    )
+    parser.add_argument(
+        '--candle-seconds', type=int, nargs='+', default=[5, 10, 30, 60, 180]
+    )
+    parser.add_argument('--allowed-lateness-seconds', type=int, default=1)
+    parser.add_argument('--emit-incomplete', action='store_true')
+    parser.add_argument('--incomplete-candle-interval-seconds', type=float, default=1.0)
+    parser.add_argument(
+        '--indicators', action=argparse.BooleanOptionalAction, default=True
+    )
+    parser.add_argument(
+        '--batch-size', type=int, default=100, help='trades per columnar message'
+    )
+    parser.add_argument(
+        '--commit-every', type=int, default=1000, help='messages per checkpoint'
+    )
+    parser.add_argument('--broker', default=None, help='e.g. localhost:19092')
+    parser.add_argument('--output', type=Path, default=None)
+    parser.add_argument('--compare', type=Path, default=None, dest='baseline')
+    args = parser.parse_args()
+
+    correct = main(
+        aggregations=args.aggregations,
+        wire_formats=args.wire_formats,
+        dataset=args.dataset,
+        params={
+            'trades': args.trades,
+            'pairs': args.pairs,
+            'seed': args.seed,
+            'jitter_ms': args.jitter_ms,
+            'candle_seconds': args.candle_seconds,
+            'allowed_lateness_seconds': args.allowed_lateness_seconds,
+            'emit_incomplete': args.emit_incomplete,
+            'incomplete_candle_interval_seconds': args.incomplete_candle_interval_seconds,
+            'indicators': args.indicators,
+            'batch_size': args.batch_size,
+            'commit_every': args.commit_every,
+        },
+        broker=args.broker,
+        output=args.output,
+        baseline=args.baseline,
+    )
+    sys.exit(0 if correct else 1)
@@ -0,0 +1,288 @@
+"""
+Scaling benchmark of the candles service across replicas, against a local broker.
+
+Fills a fresh trades topic with `--partitions` partitions with synthetic trades of
+`--pairs` pairs (spread round-robin over the partitions, so every replica gets the
+same load), then runs `MultiTimeframeStreamReader` in historical mode with 1, 2, 4,
+... replicas, every replica in its own process (and working directory, for its state
+store) and all in the same consumer group. A run is timed until the group committed the
+end of every partition. Reported are trades/sec per replica count and the speedup over
+a single replica. The results are written as JSON.
+
+Needs a running broker, e.g. the redpanda of docker-compose/redpanda.yaml.
+
+Usage (from services/candles):
+    uv run python -m benchmarks.scaling_benchmark --broker localhost:19092 --replicas 1 2 4
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+from multiprocessing import get_context
+from pathlib import Path
+from typing import List, Optional
+
+from confluent_kafka import Consumer, TopicPartition
+from loguru import logger
+from quixstreams import Application
+from quixstreams.models import TopicConfig
+from quixstreams.utils.json import dumps
+
+RESULTS_DIR = Path(__file__).parent / 'results'
+
+
+def produce_trades(
+    broker: str,
+    topic_name: str,
+    n_trades: int,
+    n_pairs: int,
+    n_partitions: int,
+    seed: int,
+) -> None:
+    """
+    Produces `n_trades` trades (in the format of the trades_ingestion service), with a
+    random walk price per pair and increasing timestamps.
+    """
+    rng = random.Random(seed)
+    pairs = [f'PAIR{i}/USD' for i in range(n_pairs)]
+    prices = [rng.uniform(10, 1000) for _ in pairs]
+    timestamp_ms = 1_700_000_000_000
+
+    app = Application(broker_address=broker)
+    topic = app.topic(
+        name=topic_name,
+        value_serializer='json',
+        config=TopicConfig(num_partitions=n_partitions, replication_factor=1),
+    )
+    with app.get_producer() as producer:
+        for i in range(n_trades):
+            index = i % n_pairs
+            timestamp_ms += rng.randint(0, 20)
+            prices[index] *= 1 + rng.gauss(0, 0.0005)
+            trade = {
+                'pair': pairs[index],
+                'price': prices[index],
+                'volume': rng.random(),
+                'timestamp_ms': timestamp_ms,
+                'trade_id': i // n_pairs,
+                'side': 'buy' if rng.random() < 0.5 else 'sell',
+            }
+            producer.produce(
+                topic=topic.name,
+                key=pairs[index].replace('/', '-').encode(),
+                value=dumps(trade),
+                partition=index % n_partitions,
+            )
+    logger.info(f'Produced {n_trades} trades of {n_pairs} pairs to {topic_name}')
+
+
+def run_replica(
+    broker: str,
+    input_topic: str,
+    output_topic: str,
+    consumer_group: str,
+    candle_seconds: List[int],
+) -> None:
+    """One replica of the candles service, until its partitions are done"""
+    # Every replica keeps its state store in its own working directory
+    os.chdir(tempfile.mkdtemp(prefix='candles-replica-'))
+    logger.remove()
+    logger.add(sys.stderr, level='WARNING')
+
+    from indicators import Indicators
+    from trades_to_candles import CandleLength, MultiTimeframeStreamReader
+
+    MultiTimeframeStreamReader(
+        kafka_broker_address=broker,
+        kafka_input_topic=input_topic,
+        kafka_output_topic=output_topic,
+        kafka_consumer_group=consumer_group,
+        candle_configs=[CandleLength(s, f'{s}sec') for s in candle_seconds],
+        data_source='historical',
+        emit_incomplete_candles=False,
+        candle_aggregation='cascade',
+        indicators=Indicators(),
+    ).run()
+
+
+def group_done(broker: str, topic: str, consumer_group: str, ends: dict) -> bool:
+    consumer = Consumer({'bootstrap.servers': broker, 'group.id': consumer_group})
+    try:
+        committed = consumer.committed(
+            [TopicPartition(topic, partition) for partition in ends], timeout=10
+        )
+        return all(tp.offset >= ends[tp.partition] for tp in committed)
+    finally:
+        consumer.close()
+
+
+def end_offsets(broker: str, topic: str) -> dict:
+    consumer = Consumer({'bootstrap.servers': broker, 'group.id': 'scaling-benchmark'})
+    try:
+        partitions = consumer.list_topics(topic).topics[topic].partitions
+        return {
+            partition: consumer.get_watermark_offsets(TopicPartition(topic, partition))[
+                1
+            ]
+            for partition in partitions
+        }
+    finally:
+        consumer.close()
+
+
+def run_replicas(
+    broker: str,
+    input_topic: str,
+    n_replicas: int,
+    candle_seconds: List[int],
+    run_id: str,
+    timeout_seconds: float,
+) -> float:
+    """
+    Runs `n_replicas` replicas in one consumer group and returns the seconds until the
+    group processed the whole topic.
+    """
+    consumer_group = f'scaling_benchmark_{run_id}_{n_replicas}'
+    ends = end_offsets(broker, input_topic)
+
+    context = get_context('spawn')
+    replicas = [
+        context.Process(
+            target=run_replica,
+            args=(
+                broker,
+                input_topic,
+                f'{input_topic}_candles_{n_replicas}',
+                consumer_group,
+                candle_seconds,
+            ),
+        )
+        for _ in range(n_replicas)
+    ]
+
+    start = time.perf_counter()
+    for replica in replicas:
+        replica.start()
+    try:
+        while not group_done(broker, input_topic, consumer_group, ends):
+            if time.perf_counter() - start > timeout_seconds:
+                raise TimeoutError(f'{n_replicas} replicas did not finish in time')
+            time.sleep(0.5)
+        return time.perf_counter() - start
+    finally:
+        # Replicas left without partitions never see the end of one
+        for replica in replicas:
+            replica.join(timeout=10)
+            if replica.is_alive():
+                replica.terminate()
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def main(
+    broker: str,
+    n_trades: int,
+    n_pairs: int,
+    n_partitions: int,
+    replica_counts: List[int],
+    candle_seconds: List[int],
+    seed: int,
+    timeout_seconds: float,
+    output: Optional[Path],
+) -> None:
+    if max(replica_counts) > n_partitions:
+        raise ValueError('There cannot be more replicas than partitions')
+
+    run_id = uuid.uuid4().hex[:8]
+    input_topic = f'scaling_benchmark_trades_{run_id}'
+    produce_trades(broker, input_topic, n_trades, n_pairs, n_partitions, seed)
+
+    results = []
+    for n_replicas in replica_counts:
+        seconds = run_replicas(
+            broker, input_topic, n_replicas, candle_seconds, run_id, timeout_seconds
+        )
+        result = {
+            'replicas': n_replicas,
+            'seconds': round(seconds, 3),
+            'trades_per_sec': round(n_trades / seconds, 1),
+        }
+        result['speedup'] = round(
+            result['trades_per_sec'] / results[0]['trades_per_sec'] if results else 1.0,
+            2,
+        )
+        results.append(result)
+        print(
+            f'{n_replicas:>3} replicas: {result["trades_per_sec"]:>12,.0f} trades/sec, '
+            f'{seconds:.1f} s, speedup {result["speedup"]:.2f}x'
+        )
+
+    commit = git_commit()
+    report = {
+        'commit': commit,
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'params': {
+            'broker': broker,
+            'trades': n_trades,
+            'pairs': n_pairs,
+            'partitions': n_partitions,
+            'candle_seconds': candle_seconds,
+            'seed': seed,
+        },
+        'results': results,
+    }
+
+    output = output or RESULTS_DIR / f'scaling-{commit}.json'
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'\nResults written to {output}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--broker', default='localhost:19092')
+    parser.add_argument('--trades', type=int, default=1_000_000)
+    parser.add_argument('--pairs', type=int, default=16)
+    parser.add_argument('--partitions', type=int, default=8)
+    parser.add_argument('--replicas', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument(
+        '--candle-seconds', type=int, nargs='+', default=[5, 10, 30, 60, 180]
+    )
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--timeout', type=float, default=1800, dest='timeout_seconds')
+    parser.add_argument('--output', type=Path, default=None)
+    args = parser.parse_args()
+
+    main(
+        broker=args.broker,
+        n_trades=args.trades,
+        n_pairs=args.pairs,
+        n_partitions=args.partitions,
+        replica_counts=args.replicas,
+        candle_seconds=args.candle_seconds,
+        seed=args.seed,
+        timeout_seconds=args.timeout_seconds,
+        output=args.output,
+    )
@@ -0,0 +1,76 @@
+"""
+Decoder for the columnar trades wire format produced by the trades_ingestion service
+(`trades_ingestion/api/columnar.py`).
+
+Layout (little-endian):
+    header  magic b'KTB2' | uint16 pair length | uint32 number of trades
+    pair    utf-8 encoded pair name
+    columns int64 timestamp_ms[n] | float64 price[n] | float64 volume[n] | int8 side[n]
+
+The side is 1 for buys, -1 for sells and 0 if unknown. Version 1 (b'KTB1') has no
+side column, its trades are decoded with an unknown side.
+"""
+
+import struct
+import sys
+from array import array
+from typing import List, Tuple
+
+MAGIC_V1 = b'KTB1'
+MAGIC = b'KTB2'
+HEADER = struct.Struct('<4sHI')
+SIDES = {1: 'buy', -1: 'sell'}
+
+
+def _column(typecode: str, value: bytes, offset: int, n: int) -> array:
+    column = array(typecode)
+    column.frombytes(value[offset : offset + n * column.itemsize])
+    if sys.byteorder == 'big':
+        column.byteswap()
+    return column
+
+
+def decode_trade_columns(value: bytes) -> Tuple[str, array, array, array, array]:
+    """
+    Decodes a columnar micro-batch message into its pair and the timestamp_ms, price,
+    volume and side columns.
+    """
+    magic, pair_length, n = HEADER.unpack_from(value)
+    if magic not in (MAGIC, MAGIC_V1):
+        raise ValueError(f'Not a columnar trades message (magic={magic!r})')
+
+    offset = HEADER.size
+    pair = value[offset : offset + pair_length].decode()
+    offset += pair_length
+
+    timestamps_ms = _column('q', value, offset, n)
+    prices = _column('d', value, offset + 8 * n, n)
+    volumes = _column('d', value, offset + 16 * n, n)
+    if magic == MAGIC:
+        sides = _column('b', value, offset + 24 * n, n)
+    else:
+        sides = array('b', bytes(n))
+
+    return pair, timestamps_ms, prices, volumes, sides
+
+
+def decode_trades(value: bytes) -> List[dict]:
+    """
+    Explodes a columnar micro-batch message into one trade dict per trade, with the
+    fields the candles aggregation uses (`pair`, `price`, `volume`, `timestamp_ms`,
+    `side`).
+    """
+    pair, timestamps_ms, prices, volumes, sides = decode_trade_columns(value)
+
+    return [
+        {
+            'pair': pair,
+            'price': price,
+            'volume': volume,
+            'timestamp_ms': timestamp_ms,
+            'side': SIDES.get(side),
+        }
+        for timestamp_ms, price, volume, side in zip(
+            timestamps_ms, prices, volumes, sides, strict=True
+        )
+    ]
@@ -17,9 +17,29 @@ class Config(BaseSettings):
     kafka_input_topic: str
     kafka_output_topic: str
     kafka_consumer_group: str
+    kafka_output_topic_partitions: Optional[int] = None
+    kafka_topic_replication_factor: Optional[int] = 1
     candle_seconds: List[int]
     emit_incomplete_candles: Optional[bool] = True
+    incomplete_candle_interval_seconds: Optional[float] = 1.0
     data_source: Literal['live', 'historical', 'test']
+    trades_wire_format: Literal['json', 'columnar'] = 'json'
+    candle_aggregation: Literal['independent', 'cascade'] = 'independent'
+    candle_engine: Literal['stream', 'batch'] = 'stream'
+    trades_archive_dir: Optional[str] = None
+    batch_chunk_size: Optional[int] = 100000
+    indicators: Optional[bool] = True
+    sma_period: Optional[int] = 20
+    ema_period: Optional[int] = 20
+    rsi_period: Optional[int] = 14
+    volatility_period: Optional[int] = 20
+    allowed_lateness_seconds: Optional[int] = 0
+    idle_pair_timeout_seconds: Optional[int] = 3600
+    kafka_late_topic: Optional[str] = None
+    metrics_port: Optional[int] = None
+    metrics_interval_seconds: Optional[float] = 15.0
+    kafka_snapshot_topic: Optional[str] = None
+    snapshot_history_candles: Optional[int] = 100
 
 
 candles_config = Config()
@@ -0,0 +1,199 @@
+"""
+Incremental technical indicators over the sequence of candles of a (pair, candle_seconds).
+
+The indicator state is a small JSON-serializable dict, so it can live in the quixstreams
+state store next to the window state (and is checkpointed with it). The last `period`
+closes and returns are kept in ring buffers with their running sums, so an update takes
+constant time, independent of the periods and of the length of the history.
+
+Indicators (None until enough candles were seen):
+- sma:        simple moving average of the close over `sma_period` candles
+- ema:        exponential moving average of the close, alpha = 2 / (`ema_period` + 1)
+- rsi:        relative strength index with Wilder's smoothing over `rsi_period` candles
+- volatility: standard deviation of the close-to-close log returns over
+              `volatility_period` candles
+"""
+
+import math
+from typing import Optional
+
+INDICATOR_FIELDS = ['sma', 'ema', 'rsi', 'volatility']
+
+
+class Indicators:
+    def __init__(
+        self,
+        sma_period: int = 20,
+        ema_period: int = 20,
+        rsi_period: int = 14,
+        volatility_period: int = 20,
+    ):
+        self.sma_period = sma_period
+        self.ema_period = ema_period
+        self.rsi_period = rsi_period
+        self.volatility_period = volatility_period
+
+    @staticmethod
+    def initial_state() -> dict:
+        return {
+            # Ring buffers of the last closes and log returns (oldest at `*_index` once
+            # full) with their running sums, so an update does not iterate over them
+            'closes': [],
+            'closes_index': 0,
+            'closes_sum': 0.0,
+            'returns': [],
+            'returns_index': 0,
+            'returns_sum': 0.0,
+            'returns_sum_sq': 0.0,
+            'ema': None,
+            'prev_close': None,
+            'n_changes': 0,
+            'avg_gain': 0.0,
+            'avg_loss': 0.0,
+        }
+
+    def update(self, state: dict, close: float) -> dict:
+        """
+        Adds the close of the next candle to the state (in place) and returns it.
+        """
+        step = self._step(state, close)
+
+        replaced = self._push(state, 'closes', close, self.sma_period)
+        state['closes_sum'] = step['closes_sum']
+        if replaced and state['closes_index'] == 0:
+            # Once per round of the ring buffer, so rounding errors do not add up
+            state['closes_sum'] = math.fsum(state['closes'])
+
+        if step['log_return'] is not None:
+            replaced = self._push(
+                state, 'returns', step['log_return'], self.volatility_period
+            )
+            state['returns_sum'] = step['returns_sum']
+            state['returns_sum_sq'] = step['returns_sum_sq']
+            if replaced and state['returns_index'] == 0:
+                state['returns_sum'] = math.fsum(state['returns'])
+                state['returns_sum_sq'] = math.fsum(r * r for r in state['returns'])
+
+        for key in ['ema', 'n_changes', 'avg_gain', 'avg_loss']:
+            state[key] = step[key]
+        state['prev_close'] = close
+        return state
+
+    def values(self, state: dict, close: Optional[float] = None) -> dict:
+        """
+        Returns the indicator values of a state or, with `close`, the values the state
+        would have after `update(state, close)` without changing it (for the repeated
+        updates of an incomplete candle).
+        """
+        if close is not None:
+            step = self._step(state, close)
+        else:
+            step = dict(
+                state, n_closes=len(state['closes']), n_returns=len(state['returns'])
+            )
+
+        return {
+            'sma': step['closes_sum'] / step['n_closes']
+            if step['n_closes'] == self.sma_period
+            else None,
+            'ema': step['ema'],
+            'rsi': self._rsi(step),
+            'volatility': self._std(
+                step['n_returns'], step['returns_sum'], step['returns_sum_sq']
+            )
+            if step['n_returns'] == self.volatility_period
+            else None,
+        }
+
+    def _step(self, state: dict, close: float) -> dict:
+        """
+        Returns the sums, counts and smoothed values of the state after adding `close`
+        (and the log return it adds, if any), in constant time.
+        """
+        prev_close = state['prev_close']
+
+        closes = state['closes']
+        n_closes = len(closes)
+        closes_sum = state['closes_sum'] + close
+        if n_closes == self.sma_period:
+            closes_sum -= closes[state['closes_index']]
+        else:
+            n_closes += 1
+
+        alpha = 2 / (self.ema_period + 1)
+        ema = (
+            close
+            if state['ema'] is None
+            else alpha * close + (1 - alpha) * state['ema']
+        )
+
+        returns = state['returns']
+        n_returns = len(returns)
+        returns_sum = state['returns_sum']
+        returns_sum_sq = state['returns_sum_sq']
+        log_return = None
+        n_changes = state['n_changes']
+        avg_gain = state['avg_gain']
+        avg_loss = state['avg_loss']
+        if prev_close is not None:
+            if prev_close > 0 and close > 0:
+                log_return = math.log(close / prev_close)
+                returns_sum += log_return
+                returns_sum_sq += log_return * log_return
+                if n_returns == self.volatility_period:
+                    replaced = returns[state['returns_index']]
+                    returns_sum -= replaced
+                    returns_sum_sq -= replaced * replaced
+                else:
+                    n_returns += 1
+
+            # Wilder's smoothing, seeded with the plain average of the first changes
+            change = close - prev_close
+            gain, loss = max(change, 0.0), max(-change, 0.0)
+            n_changes += 1
+            weight = min(n_changes, self.rsi_period)
+            avg_gain += (gain - avg_gain) / weight
+            avg_loss += (loss - avg_loss) / weight
+
+        return {
+            'n_closes': n_closes,
+            'closes_sum': closes_sum,
+            'n_returns': n_returns,
+            'returns_sum': returns_sum,
+            'returns_sum_sq': returns_sum_sq,
+            'log_return': log_return,
+            'ema': ema,
+            'n_changes': n_changes,
+            'avg_gain': avg_gain,
+            'avg_loss': avg_loss,
+        }
+
+    def _rsi(self, state: dict) -> Optional[float]:
+        if state['n_changes'] < self.rsi_period:
+            return None
+        avg_gain, avg_loss = state['avg_gain'], state['avg_loss']
+        if avg_loss == 0:
+            return 100.0 if avg_gain > 0 else 50.0
+        return 100 - 100 / (1 + avg_gain / avg_loss)
+
+    @staticmethod
+    def _std(n: int, total: float, total_sq: float) -> Optional[float]:
+        if n < 2:
+            return None
+        variance = (total_sq - total * total / n) / (n - 1)
+        return math.sqrt(max(variance, 0.0))
+
+    @staticmethod
+    def _push(state: dict, name: str, value: float, period: int) -> bool:
+        """
+        Adds a value to the ring buffer `name` of at most `period` values, and returns
+        whether it replaced the oldest one.
+        """
+        values = state[name]
+        if len(values) < period:
+            values.append(value)
+            return False
+        index = state[f'{name}_index']
+        values[index] = value
+        state[f'{name}_index'] = (index + 1) % period
+        return True
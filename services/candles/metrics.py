@@ -0,0 +1,165 @@
+"""
+Prometheus metrics of the candles service, served in the Prometheus text format on
+`http://<host>:<METRICS_PORT>/metrics`.
+
+- candles_input_trades_total{partition}: trades consumed (rate() gives trades/sec)
+- candles_window_inputs_total{candle_seconds}: trades (or base candles, for cascaded
+  timeframes) aggregated into the windows of a timeframe
+- candles_emitted_total{candle_seconds}: candles pushed to the output topic
+- candles_late_trades_total / candles_evicted_windows_total
+- candles_emit_lag_seconds{candle_seconds}: wall-clock time of the emit minus the event
+  time of the latest trade in the candle
+- candles_consumer_lag_messages{partition}: end of the partition minus the committed
+  offset of the consumer group
+- candles_state_store_bytes{store, partition}: size of the state store on disk
+- candles_stage_seconds_total{stage}: time spent deserializing the trades, in the window
+  reducers and serializing the candles
+"""
+
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from loguru import logger
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+from quixstreams.models import (
+    JSONDeserializer,
+    JSONSerializer,
+    SerializationContext,
+)
+
+INPUT_TRADES = Counter(
+    'candles_input_trades_total', 'Trades consumed from the input topic', ['partition']
+)
+WINDOW_INPUTS = Counter(
+    'candles_window_inputs_total',
+    'Values aggregated into the windows of a timeframe',
+    ['candle_seconds'],
+)
+EMITTED_CANDLES = Counter(
+    'candles_emitted_total', 'Candles pushed to the output topic', ['candle_seconds']
+)
+LATE_TRADES = Counter(
+    'candles_late_trades_total', 'Trades that arrived after their window closed'
+)
+EVICTED_WINDOWS = Counter(
+    'candles_evicted_windows_total', 'Windows of idle pairs closed by the eviction'
+)
+EMIT_LAG = Histogram(
+    'candles_emit_lag_seconds',
+    'Wall-clock time of the emit minus the event time of the latest trade in the candle',
+    ['candle_seconds'],
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 180, 600, 1800, 3600, float('inf')),
+)
+CONSUMER_LAG = Gauge(
+    'candles_consumer_lag_messages',
+    'End offset of the input partition minus the committed offset',
+    ['partition'],
+)
+STATE_STORE_BYTES = Gauge(
+    'candles_state_store_bytes',
+    'Size of the state store on disk',
+    ['store', 'partition'],
+)
+STAGE_SECONDS = Counter(
+    'candles_stage_seconds_total',
+    'Time spent in a processing stage',
+    ['stage'],
+)
+
+
+class TimedJSONDeserializer(JSONDeserializer):
+    """JSON deserializer of the trades that adds up the time it takes"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._seconds = STAGE_SECONDS.labels(stage='deserialize')
+
+    def __call__(self, value: bytes, ctx: SerializationContext) -> Any:
+        start = time.perf_counter()
+        result = super().__call__(value, ctx)
+        self._seconds.inc(time.perf_counter() - start)
+        return result
+
+
+class TimedJSONSerializer(JSONSerializer):
+    """JSON serializer of the candles that adds up the time it takes"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._seconds = STAGE_SECONDS.labels(stage='serialize')
+
+    def __call__(self, value: Any, ctx: SerializationContext) -> bytes:
+        start = time.perf_counter()
+        result = super().__call__(value, ctx)
+        self._seconds.inc(time.perf_counter() - start)
+        return result
+
+
+def timed(func: Callable, stage: str, calls: Optional[Counter] = None) -> Callable:
+    """
+    Wraps `func` to add up the time spent in it under `stage` (and to count its calls
+    in `calls`, e.g. a labelled child of WINDOW_INPUTS).
+    """
+    seconds = STAGE_SECONDS.labels(stage=stage)
+
+    def wrapper(*args):
+        if calls is not None:
+            calls.inc()
+        start = time.perf_counter()
+        result = func(*args)
+        seconds.inc(time.perf_counter() - start)
+        return result
+
+    return wrapper
+
+
+class MetricsServer:
+    """
+    Serves the metrics over HTTP and refreshes the consumer lag and state store size
+    gauges in a background thread, every `interval_seconds`.
+    """
+
+    def __init__(
+        self,
+        port: int,
+        get_partition_offsets: Callable[[], Dict[int, Tuple[int, int]]],
+        state_dir: Path,
+        interval_seconds: float = 15.0,
+    ):
+        self.port = port
+        self.get_partition_offsets = get_partition_offsets
+        self.state_dir = Path(state_dir)
+        self.interval_seconds = interval_seconds
+
+    def start(self) -> None:
+        start_http_server(self.port)
+        logger.info(f'Serving metrics on port {self.port}')
+        threading.Thread(target=self._run, name='candles-metrics', daemon=True).start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.collect()
+            except Exception as e:
+                logger.warning(f'Failed to collect the metrics: {e}')
+            time.sleep(self.interval_seconds)
+
+    def collect(self) -> None:
+        for partition, (committed, end) in self.get_partition_offsets().items():
+            CONSUMER_LAG.labels(partition=partition).set(max(end - committed, 0))
+
+        # <state_dir>/<consumer group>/<store>/<topic>/<partition>/
+        for partition_dir in self.state_dir.glob('*/*/*/*'):
+            if not partition_dir.is_dir():
+                continue
+            size = sum(
+                os.path.getsize(os.path.join(root, name))
+                for root, _, names in os.walk(partition_dir)
+                for name in names
+            )
+            STATE_STORE_BYTES.labels(
+                store=partition_dir.parent.parent.name, partition=partition_dir.name
+            ).set(size)
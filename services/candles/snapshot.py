@@ -0,0 +1,101 @@
+"""
+Materializes the compacted candle snapshot topic (see `KAFKA_SNAPSHOT_TOPIC`) into a
+dict, for consumers that need the recent candles of every pair and timeframe on start
+instead of replaying the whole candles topic.
+
+The topic is keyed by `pair|candle_seconds|window_start_ms` and holds the latest
+version of the last `SNAPSHOT_HISTORY_CANDLES` candles of every (pair, candle_seconds);
+older candles are deleted with tombstones.
+
+Usage:
+    uv run python snapshot.py
+"""
+
+import uuid
+from typing import Dict, List, Tuple
+
+from confluent_kafka import OFFSET_BEGINNING, Consumer, TopicPartition
+from loguru import logger
+from quixstreams.utils.json import loads
+
+
+def read_snapshot(
+    kafka_broker_address: str, kafka_snapshot_topic: str, timeout_seconds: float = 30
+) -> Dict[Tuple[str, int], List[dict]]:
+    """
+    Reads the snapshot topic from the beginning up to its current end, and returns
+    the candles per (pair, candle_seconds), sorted by window start.
+    """
+    consumer = Consumer(
+        {
+            'bootstrap.servers': kafka_broker_address,
+            # Reads without committing, the group only exists for the assignment
+            'group.id': f'candles-snapshot-{uuid.uuid4().hex[:8]}',
+            'enable.auto.commit': False,
+        }
+    )
+    try:
+        metadata = consumer.list_topics(kafka_snapshot_topic, timeout=timeout_seconds)
+        partitions = metadata.topics[kafka_snapshot_topic].partitions
+
+        ends = {}
+        for partition in partitions:
+            low, high = consumer.get_watermark_offsets(
+                TopicPartition(kafka_snapshot_topic, partition),
+                timeout=timeout_seconds,
+            )
+            if high > low:
+                ends[partition] = high
+        consumer.assign(
+            [
+                TopicPartition(kafka_snapshot_topic, partition, OFFSET_BEGINNING)
+                for partition in ends
+            ]
+        )
+
+        candles: Dict[str, dict] = {}
+        while ends:
+            messages = consumer.consume(num_messages=10000, timeout=timeout_seconds)
+            if not messages:
+                raise TimeoutError(
+                    f'No messages from {kafka_snapshot_topic} before its end'
+                )
+            for message in messages:
+                if message.error():
+                    raise RuntimeError(message.error())
+
+                key = message.key().decode()
+                if message.value() is None:
+                    candles.pop(key, None)
+                else:
+                    candles[key] = loads(message.value())
+
+                partition = message.partition()
+                if partition in ends and message.offset() >= ends[partition] - 1:
+                    del ends[partition]
+    finally:
+        consumer.close()
+
+    snapshot: Dict[Tuple[str, int], List[dict]] = {}
+    for candle in candles.values():
+        snapshot.setdefault((candle['pair'], candle['candle_seconds']), []).append(
+            candle
+        )
+    for history in snapshot.values():
+        history.sort(key=lambda candle: candle['window_start_ms'])
+    return snapshot
+
+
+if __name__ == '__main__':
+    from config.config import candles_config
+
+    if not candles_config.kafka_snapshot_topic:
+        raise ValueError('KAFKA_SNAPSHOT_TOPIC is not set')
+
+    snapshot = read_snapshot(
+        candles_config.kafka_broker_address, candles_config.kafka_snapshot_topic
+    )
+    for (pair, candle_seconds), history in sorted(snapshot.items()):
+        logger.info(
+            f'{pair} {candle_seconds}s: {len(history)} candles, latest {history[-1]}'
+        )
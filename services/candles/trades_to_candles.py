@@ -1,11 +1,24 @@
+import bisect
+import time
 from datetime import timedelta
-from typing import Any, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from dataclasses import dataclass
+from confluent_kafka import Consumer, TopicPartition
 from loguru import logger
 from quixstreams import Application
+from quixstreams.context import message_context
 from quixstreams.dataframe.dataframe import StreamingDataFrame
-from quixstreams.models import TimestampType
-import time
+from quixstreams.dataframe.windows.base import Window, WindowResult
+from quixstreams.models import TimestampType, Topic, TopicConfig
+from quixstreams.models.topics import TopicManager
+from quixstreams.state import State
+
+import metrics
+from columnar import decode_trades
+from indicators import Indicators
+
+# Segments of the snapshot topic roll every hour, so compaction keeps it small
+SNAPSHOT_SEGMENT_MS = 60 * 60 * 1000
 
 
 @dataclass
@@ -33,34 +46,130 @@ class MultiTimeframeStreamReader:
         candle_configs: List[CandleLength],
         data_source: str,
         emit_incomplete_candles: bool,
-        inactivity_timeout_seconds: int = 60  # Default 60 seconds timeout
+        trades_wire_format: str = 'json',
+        candle_aggregation: str = 'independent',
+        indicators: Optional[Indicators] = None,
+        allowed_lateness_seconds: int = 0,
+        idle_pair_timeout_seconds: int = 0,
+        kafka_late_topic: Optional[str] = None,
+        incomplete_candle_interval_seconds: float = 0,
+        output_topic_partitions: Optional[int] = None,
+        topic_replication_factor: int = 1,
+        metrics_port: Optional[int] = None,
+        metrics_interval_seconds: float = 15.0,
+        kafka_snapshot_topic: Optional[str] = None,
+        snapshot_history_candles: int = 100,
     ):
         self.candle_configs = candle_configs
         self.data_source = data_source
         self.emit_incomplete_candles = emit_incomplete_candles
-        self.inactivity_timeout_seconds = inactivity_timeout_seconds
-        self.last_message_time = None
+        self.trades_wire_format = trades_wire_format
+        self.candle_aggregation = candle_aggregation
+        self.indicators = indicators
+        self.kafka_broker_address = kafka_broker_address
+        self.kafka_consumer_group = kafka_consumer_group
+        self.allowed_lateness_ms = allowed_lateness_seconds * 1000
+        self.idle_pair_timeout_ms = idle_pair_timeout_seconds * 1000
+        self.incomplete_candle_interval_ms = int(
+            incomplete_candle_interval_seconds * 1000
+        )
+
+        # Lateness is decided on the smallest window, the larger ones close later
+        self._base_window_ms = min(c.window_seconds for c in candle_configs) * 1000
+        self._max_window_ms = max(c.window_seconds for c in candle_configs) * 1000
+
+        # Windows aggregated from the trades (and whether they feed the cascade
+        # rollups) and the rollup windows, to evict the windows of idle pairs
+        self._trade_windows: List[Tuple[Window, CandleLength, bool]] = []
+        self._rollup_windows: List[Tuple[Window, CandleLength]] = []
+
+        # Latest trade time of the active pairs and the partition time, per partition.
+        # Also tracked in historical runs, to flush the windows of all pairs at the end.
+        self._track_pairs = bool(self.idle_pair_timeout_ms) or data_source == 'historical'
+        self._pair_activity: Dict[int, Dict[str, int]] = {}
+        self._partition_time_ms: Dict[int, int] = {}
+        self._last_eviction_ms: Dict[int, int] = {}
+
+        self.late_trades = 0
+        self.evicted_windows = 0
+        self._input_trades: Dict[int, Any] = {}
+
+        self.snapshot_history_candles = snapshot_history_candles
+        self.metrics_port = metrics_port
+        self.metrics_interval_seconds = metrics_interval_seconds
+
+        # Historical runs stop once these offsets (partition -> end offset) are reached
+        self._end_offsets: Dict[int, int] = {}
         
         # Initialize the Quix Streams application
         self._app = Application(
             broker_address=kafka_broker_address,
             consumer_group=kafka_consumer_group,
             auto_offset_reset='latest' if data_source == 'live' else 'earliest',
+            on_message_processed=self._on_message_processed,
         )
 
         # Define input and output topics
-        self.input_topic = self._app.topic(
-            name=kafka_input_topic,
-            key_deserializer='string',
-            value_deserializer='json',
-            timestamp_extractor=self.custom_ts_extractor,
-        )
+        if trades_wire_format == 'columnar':
+            # Micro-batches of trades, exploded into single trades in `run`
+            self.input_topic = self._app.topic(
+                name=kafka_input_topic,
+                key_deserializer='string',
+                value_deserializer='bytes',
+            )
+        else:
+            self.input_topic = self._app.topic(
+                name=kafka_input_topic,
+                key_deserializer='string',
+                value_deserializer=metrics.TimedJSONDeserializer(),
+                timestamp_extractor=self.custom_ts_extractor,
+            )
+
+        # Partitions of the output topics, if they get created (they are keyed by pair)
+        output_config = None
+        if output_topic_partitions:
+            output_config = TopicConfig(
+                num_partitions=output_topic_partitions,
+                replication_factor=topic_replication_factor,
+            )
         
         self.output_topic = self._app.topic(
             name=kafka_output_topic,
-            value_serializer='json',
+            value_serializer=metrics.TimedJSONSerializer(),
+            config=output_config,
         )
 
+        # Side output for the trades that arrived after their window closed
+        self.late_topic = None
+        if kafka_late_topic:
+            self.late_topic = self._app.topic(
+                name=kafka_late_topic,
+                value_serializer='json',
+                config=output_config,
+            )
+
+        # Compacted topic with the latest version of the recent candles of every
+        # (pair, candle_seconds), for consumers that only need the current state. It
+        # needs its own config for the compaction, so without a partition count it
+        # gets the default of the application.
+        self.snapshot_topic = None
+        if kafka_snapshot_topic:
+            self.snapshot_topic = self._app.topic(
+                name=kafka_snapshot_topic,
+                key_serializer='string',
+                value_serializer='json',
+                config=TopicConfig(
+                    num_partitions=output_topic_partitions
+                    or TopicManager.default_num_partitions,
+                    replication_factor=topic_replication_factor,
+                    extra_config={
+                        'cleanup.policy': 'compact',
+                        'segment.ms': str(SNAPSHOT_SEGMENT_MS),
+                        'min.cleanable.dirty.ratio': '0.1',
+                    },
+                ),
+            )
+
     @staticmethod
     def _init_candle(trade: dict) -> dict:
         return {
@@ -70,112 +179,691 @@ class MultiTimeframeStreamReader:
             'close': trade['price'],
             'volume': trade['volume'],
             'timestamp_ms': trade['timestamp_ms'],
+            'open_timestamp_ms': trade['timestamp_ms'],
             'pair': trade['pair'],
+            'trade_count': 1,
+            'buy_volume': trade['volume'] if trade.get('side') == 'buy' else 0.0,
+            'sell_volume': trade['volume'] if trade.get('side') == 'sell' else 0.0,
+            'notional': trade['price'] * trade['volume'],
         }
 
     @staticmethod
     def _update_candle(candle: dict, trade: dict) -> dict:
-        candle['close'] = trade['price']
+        # Open and close follow the event time, late trades can arrive out of order
+        if trade['timestamp_ms'] >= candle['timestamp_ms']:
+            candle['close'] = trade['price']
+            candle['timestamp_ms'] = trade['timestamp_ms']
+        if trade['timestamp_ms'] < candle['open_timestamp_ms']:
+            candle['open'] = trade['price']
+            candle['open_timestamp_ms'] = trade['timestamp_ms']
         candle['high'] = max(candle['high'], trade['price'])
         candle['low'] = min(candle['low'], trade['price'])
         candle['volume'] += trade['volume']
-        candle['timestamp_ms'] = trade['timestamp_ms']
         candle['pair'] = trade['pair']
+        candle['trade_count'] += 1
+        if trade.get('side') == 'buy':
+            candle['buy_volume'] += trade['volume']
+        elif trade.get('side') == 'sell':
+            candle['sell_volume'] += trade['volume']
+        candle['notional'] += trade['price'] * trade['volume']
         return candle
 
+    @staticmethod
+    def _init_rollup(window: dict) -> dict:
+        return dict(window['value'])
+
+    @staticmethod
+    def _update_rollup(rollup: dict, window: dict) -> dict:
+        candle = window['value']
+        rollup['close'] = candle['close']
+        rollup['high'] = max(rollup['high'], candle['high'])
+        rollup['low'] = min(rollup['low'], candle['low'])
+        rollup['volume'] += candle['volume']
+        rollup['timestamp_ms'] = candle['timestamp_ms']
+        rollup['pair'] = candle['pair']
+        rollup['trade_count'] += candle['trade_count']
+        rollup['buy_volume'] += candle['buy_volume']
+        rollup['sell_volume'] += candle['sell_volume']
+        rollup['notional'] += candle['notional']
+        return rollup
+
     def process_timeframe(self, streaming_df: StreamingDataFrame, window_length: CandleLength):
         """Process a single timeframe and output candles"""
         
         # Aggregation of trades into candles using tumbling windows
-        candle_df = (
-            streaming_df.tumbling_window(timedelta(seconds=window_length.window_seconds))
+        window = (
+            streaming_df.tumbling_window(
+                timedelta(seconds=window_length.window_seconds),
+                grace_ms=self.allowed_lateness_ms,
+            )
             .reduce(
-                reducer=self._update_candle,
-                initializer=self._init_candle
+                reducer=self._instrument(self._update_candle, window_length),
+                initializer=self._instrument(self._init_candle, window_length),
             )
         )
+        self._trade_windows.append((window, window_length, False))
 
         # Check if we want to include only complete candles or also partial ones
         if self.emit_incomplete_candles:
-            candle_df = candle_df.current()  # Partial
+            candle_df = window.current()  # Partial
         else:
-            candle_df = candle_df.final()  # Complete
-
-        # Extract fields from the dataframe
-        candle_df['open'] = candle_df['value']['open']
-        candle_df['high'] = candle_df['value']['high']
-        candle_df['low'] = candle_df['value']['low']
-        candle_df['close'] = candle_df['value']['close']
-        candle_df['volume'] = candle_df['value']['volume']
-        candle_df['timestamp_ms'] = candle_df['value']['timestamp_ms']
-        candle_df['pair'] = candle_df['value']['pair']
-        candle_df['window_start_ms'] = candle_df['start']
-        candle_df['window_end_ms'] = candle_df['end']
-
-        # Keep only the relevant columns
-        candle_df = candle_df[
-            [
-                'pair',
-                'timestamp_ms',
-                'open',
-                'high',
-                'low',
-                'close',
-                'volume',
-                'window_start_ms',
-                'window_end_ms',
-            ]
-        ]
+            candle_df = window.final()  # Complete
+
+        candle_df = self._window_to_candle(candle_df, window_length)
+        if self.emit_incomplete_candles and self.incomplete_candle_interval_ms:
+            candle_df = candle_df.apply(self._coalesce, stateful=True, expand=True)
+        self._output_candles(candle_df)
+
+    @staticmethod
+    def _instrument(func: Callable, window_length: CandleLength) -> Callable:
+        """Count the values going into the windows of a timeframe and time the reducer"""
+        return metrics.timed(
+            func,
+            stage='reduce',
+            calls=metrics.WINDOW_INPUTS.labels(
+                candle_seconds=window_length.window_seconds
+            ),
+        )
+
+    def _window_to_candle(
+        self, candle_df: StreamingDataFrame, window_length: CandleLength
+    ) -> StreamingDataFrame:
+        """Turn the window results into the flat candles of the output topic"""
+        return candle_df.apply(lambda window: self._to_candle(window, window_length))
+
+    def _to_candle(self, window: WindowResult, window_length: CandleLength) -> dict:
+        candle = window['value']
+        return {
+            'pair': candle['pair'],
+            'timestamp_ms': candle['timestamp_ms'],
+            'open': candle['open'],
+            'high': candle['high'],
+            'low': candle['low'],
+            'close': candle['close'],
+            'volume': candle['volume'],
+            'trade_count': candle['trade_count'],
+            'buy_volume': candle['buy_volume'],
+            'sell_volume': candle['sell_volume'],
+            'vwap': self._vwap(candle),
+            'window_start_ms': window['start'],
+            'window_end_ms': window['end'],
+            'candle_seconds': window_length.window_seconds,
+        }
+
+    @staticmethod
+    def _vwap(candle: dict) -> float:
+        if candle['volume'] > 0:
+            return candle['notional'] / candle['volume']
+        return candle['close']
+
+    def _add_indicators(self, candle: dict, state: State) -> dict:
+        """
+        Attach the indicators of the candle's (pair, candle_seconds) to the candle.
 
-        # Add the window seconds
-        candle_df['candle_seconds'] = window_length.window_seconds
+        The indicator state only includes completed candles. A candle is folded into it
+        once a candle of a later window arrives, so the repeated updates of an incomplete
+        candle all see the same state.
+        """
+        key = f'indicators_{candle["candle_seconds"]}'
+        stored = state.get(key) or {
+            'state': self.indicators.initial_state(),
+            'pending': None,
+        }
+
+        pending = stored['pending']
+        if pending is not None and candle['window_start_ms'] > pending['window_start_ms']:
+            stored['state'] = self.indicators.update(stored['state'], pending['close'])
+            pending = None
+
+        if pending is None or candle['window_start_ms'] == pending['window_start_ms']:
+            stored['pending'] = {
+                'window_start_ms': candle['window_start_ms'],
+                'close': candle['close'],
+            }
+            state.set(key, stored)
+            values = self.indicators.values(stored['state'], candle['close'])
+        else:
+            # Late candle of a window that was already folded into the state
+            values = self.indicators.values(stored['state'])
+
+        candle.update(values)
+        return candle
+
+    def _coalesce(self, candle: dict, state: State) -> List[dict]:
+        """
+        Emit at most one update of an incomplete candle per interval (of event time) and
+        (pair, candle_seconds), plus its final version once the next window started.
+
+        The latest update that was held back is kept in the state store, and is emitted
+        as the final candle when the first update of a later window arrives. Updates of
+        older windows (late trades within the allowed lateness) are corrections and are
+        always emitted.
+        """
+        key = f'coalesce_{candle["candle_seconds"]}'
+        stored = state.get(key)
+
+        if stored is None or candle['window_start_ms'] > stored['window_start_ms']:
+            candles = [stored['pending']] if stored and stored['pending'] else []
+            state.set(
+                key,
+                {
+                    'window_start_ms': candle['window_start_ms'],
+                    'emitted_ms': candle['timestamp_ms'],
+                    'pending': None,
+                },
+            )
+            return candles + [candle]
+
+        if candle['window_start_ms'] < stored['window_start_ms']:
+            return [candle]
+
+        interval_ms = self.incomplete_candle_interval_ms
+        if candle['timestamp_ms'] - stored['emitted_ms'] >= interval_ms:
+            stored['emitted_ms'] = candle['timestamp_ms']
+            stored['pending'] = None
+            state.set(key, stored)
+            return [candle]
+
+        stored['pending'] = candle
+        state.set(key, stored)
+        return []
+
+    def _output_candles(self, candle_df: StreamingDataFrame) -> None:
+        if self.indicators is not None:
+            candle_df = candle_df.apply(self._add_indicators, stateful=True)
 
         # Log candles
-        candle_df = candle_df.update(lambda value: logger.info(f'Candle: {value}'))
-        
-        # Add inactivity checking to the stream
-        candle_df = candle_df.update(self.check_inactivity)
+        candle_df = candle_df.update(self._log_candle)
+
+        if self.snapshot_topic is not None:
+            candle_df = candle_df.update(self._publish_snapshot, stateful=True)
 
         # Push to output topic
         candle_df.to_topic(self.output_topic)
 
+    @staticmethod
+    def _log_candle(candle: dict) -> None:
+        logger.info(f'Candle: {candle}')
+
+        candle_seconds = candle['candle_seconds']
+        metrics.EMITTED_CANDLES.labels(candle_seconds=candle_seconds).inc()
+        metrics.EMIT_LAG.labels(candle_seconds=candle_seconds).observe(
+            time.time() - candle['timestamp_ms'] / 1000
+        )
+
+    @staticmethod
+    def snapshot_key(pair: str, candle_seconds: int, window_start_ms: int) -> str:
+        return f'{pair}|{candle_seconds}|{window_start_ms}'
+
+    def _publish_snapshot(self, candle: dict, state: State) -> None:
+        """
+        Publish the candle to the compacted snapshot topic, and delete (with a
+        tombstone) the candles of the (pair, candle_seconds) that dropped out of the
+        last `snapshot_history_candles` windows.
+
+        Updates of a candle (incomplete candles, late corrections) share its key, so
+        compaction keeps the latest version. The published windows are kept in the
+        state store, so gaps between windows do not leave keys behind.
+        """
+        pair = candle['pair']
+        candle_seconds = candle['candle_seconds']
+        window_start_ms = candle['window_start_ms']
+
+        key = f'snapshot_{candle_seconds}'
+        window_starts: List[int] = state.get(key, [])
+
+        if window_start_ms not in window_starts:
+            if (
+                len(window_starts) >= self.snapshot_history_candles
+                and window_start_ms < window_starts[0]
+            ):
+                # Correction of a candle that already dropped out of the history
+                return
+            bisect.insort(window_starts, window_start_ms)
+
+            for expired_ms in window_starts[: -self.snapshot_history_candles]:
+                self._produce(
+                    self.snapshot_topic,
+                    None,
+                    self.snapshot_key(pair, candle_seconds, expired_ms),
+                    window_start_ms,
+                )
+            del window_starts[: -self.snapshot_history_candles]
+            state.set(key, window_starts)
+
+        self._produce(
+            self.snapshot_topic,
+            candle,
+            self.snapshot_key(pair, candle_seconds, window_start_ms),
+            window_start_ms,
+        )
+
     def process_all_timeframes(self, streaming_df: StreamingDataFrame):
         """Process all timeframes in parallel"""
+        streaming_df = self._split_late_trades(streaming_df)
+
+        if self.candle_aggregation == 'cascade':
+            self.process_cascade(streaming_df)
+            return
+
         for config in self.candle_configs:
             self.process_timeframe(streaming_df, config)
+
+    def process_cascade(self, streaming_df: StreamingDataFrame):
+        """
+        Only the smallest timeframe is aggregated from the trades. Every larger timeframe
+        that is a multiple of it is rolled up from the completed base candles, so every
+        trade updates a single window instead of one window per timeframe.
+
+        Timeframes that are not a multiple of the base, and all timeframes when
+        incomplete candles are emitted (the rollup needs completed base candles), are
+        aggregated from the trades as usual.
+        """
+        if self.emit_incomplete_candles:
+            logger.warning(
+                'Cascading aggregation needs complete candles, aggregating every timeframe from the trades'
+            )
+            for config in self.candle_configs:
+                self.process_timeframe(streaming_df, config)
+            return
+
+        base, *others = sorted(self.candle_configs, key=lambda c: c.window_seconds)
+
+        # Base candles, straight from the trades
+        base_window = streaming_df.tumbling_window(
+            timedelta(seconds=base.window_seconds), grace_ms=self.allowed_lateness_ms
+        ).reduce(
+            reducer=self._instrument(self._update_candle, base),
+            initializer=self._instrument(self._init_candle, base),
+        )
+        self._trade_windows.append((base_window, base, True))
+        base_df = base_window.final()
+
+        # Completed base windows as the input of the larger timeframes, in event time
+        rollup_df = base_df.set_timestamp(
+            lambda value, key, timestamp, headers: value['start']
+        )
+
+        base_df = self._window_to_candle(base_df, base)
+        self._output_candles(base_df)
+
+        for config in others:
+            if config.window_seconds % base.window_seconds:
+                logger.warning(
+                    f'{config.window_seconds}s is not a multiple of {base.window_seconds}s, aggregating it from the trades'
+                )
+                self.process_timeframe(streaming_df, config)
+                continue
+
+            rollup_window = rollup_df.tumbling_window(
+                timedelta(seconds=config.window_seconds), name='rollup'
+            ).reduce(
+                reducer=self._instrument(self._update_rollup, config),
+                initializer=self._instrument(self._init_rollup, config),
+            )
+            self._rollup_windows.append((rollup_window, config))
+            candle_df = rollup_window.final()
+            candle_df = self._window_to_candle(candle_df, config)
+            self._output_candles(candle_df)
     
-    def check_inactivity(self, value: dict) -> None:
-        """Update the last message time and check for inactivity"""
-        current_time = time.time()
-        self.last_message_time = current_time
-        
-    def is_inactive(self) -> bool:
-        """Check if the stream has been inactive"""
-        if self.last_message_time is None:
-            return False
-            
-        current_time = time.time()
-        inactive_duration = current_time - self.last_message_time
-        
-        if inactive_duration > self.inactivity_timeout_seconds:
-            logger.warning(f"Stream inactive for {inactive_duration:.2f} seconds. Stopping processing.")
+    def _split_late_trades(self, streaming_df: StreamingDataFrame) -> StreamingDataFrame:
+        """
+        Separate the late trades from the trades that go into the windows.
+
+        Every pair has its own event-time watermark: the time of its latest trade (or
+        the partition time, once its windows were evicted as idle). A trade is late
+        once its smallest window ended more than the allowed lateness before the
+        watermark of its pair. Late trades go to the late topic (if configured)
+        instead of being dropped silently by the windows.
+        """
+        streaming_df = streaming_df.apply(
+            self._check_lateness, stateful=True, metadata=True
+        )
+
+        late_df = streaming_df.filter(lambda trade: 'late_by_ms' in trade)
+        late_df = late_df.update(lambda trade: logger.warning(f'Late trade: {trade}'))
+        if self.late_topic is not None:
+            late_df.to_topic(self.late_topic)
+
+        return streaming_df.filter(lambda trade: 'late_by_ms' not in trade)
+
+    def _check_lateness(
+        self, trade: dict, key: Any, timestamp: int, headers: Any, state: State
+    ) -> dict:
+        """Mark late trades and advance the watermark of the pair"""
+        partition = message_context().partition
+        input_trades = self._input_trades.get(partition)
+        if input_trades is None:
+            input_trades = self._input_trades[partition] = (
+                metrics.INPUT_TRADES.labels(partition=partition)
+            )
+        input_trades.inc()
+
+        watermark_ms = state.get('watermark_ms')
+        window_end_ms = timestamp - timestamp % self._base_window_ms + self._base_window_ms
+        if (
+            watermark_ms is not None
+            and window_end_ms <= watermark_ms - self.allowed_lateness_ms
+        ):
+            trade['late_by_ms'] = watermark_ms - self.allowed_lateness_ms - timestamp
+            self.late_trades += 1
+            metrics.LATE_TRADES.inc()
+            return trade
+
+        if watermark_ms is None or timestamp > watermark_ms:
+            state.set('watermark_ms', timestamp)
+
+        if self._track_pairs:
+            self._track_activity(key, timestamp)
+
+        return trade
+
+    def _track_activity(self, key: str, timestamp: int) -> None:
+        """
+        Keep track of the latest trade of every pair, and evict the windows of the
+        pairs that went idle while the partition time moved on (with an idle timeout).
+        """
+        partition = message_context().partition
+
+        activity = self._pair_activity.get(partition)
+        if activity is None:
+            # First message of the partition since the start (or an assignment)
+            activity = self._pair_activity[partition] = self._partition_state(
+                partition
+            ).get('pair_activity', {})
+            self._partition_time_ms[partition] = max(activity.values(), default=0)
+            self._last_eviction_ms[partition] = timestamp
+
+        if key not in activity:
+            # Stored right away, so the windows of the pair are found after a restart
+            activity[key] = timestamp
+            self._partition_state(partition).set('pair_activity', activity)
+        elif timestamp > activity[key]:
+            activity[key] = timestamp
+        if timestamp > self._partition_time_ms[partition]:
+            self._partition_time_ms[partition] = timestamp
+
+        # Look for idle pairs every tenth of the idle timeout (of event time)
+        partition_time_ms = self._partition_time_ms[partition]
+        if (
+            self.idle_pair_timeout_ms
+            and partition_time_ms - self._last_eviction_ms[partition]
+            >= self.idle_pair_timeout_ms // 10
+        ):
+            self._evict_idle_pairs(partition, partition_time_ms)
+            self._last_eviction_ms[partition] = partition_time_ms
+
+    def _partition_state(self, partition: int, key: Any = '__partition__') -> State:
+        """Default store state of a key of the partition, outside of its own message"""
+        transaction = self._app._processing_context.checkpoint.get_store_transaction(
+            topic=self.input_topic.name, partition=partition
+        )
+        return transaction.as_state(prefix=key)
+
+    def _window_state(self, partition: int, key: Any, window: Window) -> State:
+        transaction = self._app._processing_context.checkpoint.get_store_transaction(
+            topic=self.input_topic.name, partition=partition, store_name=window.name
+        )
+        return transaction.as_state(prefix=key)
+
+    def _evict_idle_pairs(self, partition: int, partition_time_ms: int) -> None:
+        """
+        Close the windows of the pairs without trades for longer than the idle timeout,
+        as if their watermark had followed the partition time, and emit their candles.
+
+        A pair is forgotten once all windows its trades could be in are closed, so
+        the tracked pairs (and the window state) only grow with the active pairs.
+        """
+        activity = self._merged_pair_activity(partition)
+        close_ms = partition_time_ms - self.allowed_lateness_ms
+
+        idle_pairs = [
+            key
+            for key, latest_ms in activity.items()
+            if latest_ms < partition_time_ms - self.idle_pair_timeout_ms
+        ]
+        evicted_windows = self.evicted_windows
+        for key in idle_pairs:
+            self._evict_pair(partition, key, partition_time_ms, close_ms)
+            if activity[key] + self._max_window_ms <= close_ms:
+                del activity[key]
+
+        self._partition_state(partition).set('pair_activity', activity)
+
+        if self.evicted_windows > evicted_windows:
+            logger.info(
+                f'Evicted {self.evicted_windows - evicted_windows} windows of '
+                f'{len(idle_pairs)} idle pairs in partition {partition}, '
+                f'tracking {len(activity)} pairs'
+            )
+
+    def _merged_pair_activity(self, partition: int) -> Dict[str, int]:
+        """
+        Another replica may have owned the partition in the meantime. Pairs it
+        evicted are evicted again (a no-op), and the pairs it saw are merged in.
+        """
+        activity = self._pair_activity.setdefault(partition, {})
+        stored = self._partition_state(partition).get('pair_activity', {})
+        for key, latest_ms in stored.items():
+            if latest_ms > activity.get(key, 0):
+                activity[key] = latest_ms
+        return activity
+
+    def _flush_partition(self, partition: int) -> None:
+        """
+        Close every window of the partition at the end of a historical run and emit
+        their candles (and rollups), so a backfill also outputs its last candles.
+        Trades of a later run that fall into these windows are late.
+        """
+        activity = self._merged_pair_activity(partition)
+        partition_time_ms = max(activity.values(), default=0)
+
+        # No window of the partition starts after its latest trade
+        close_ms = partition_time_ms + self._max_window_ms
+
+        evicted_windows = self.evicted_windows
+        for key in activity:
+            self._evict_pair(partition, key, partition_time_ms, close_ms)
+        activity.clear()
+        self._partition_state(partition).set('pair_activity', activity)
+
+        logger.info(
+            f'Flushed the last {self.evicted_windows - evicted_windows} windows of '
+            f'partition {partition}'
+        )
+
+    def _evict_pair(
+        self, partition: int, key: str, partition_time_ms: int, close_ms: int
+    ) -> None:
+        state = self._partition_state(partition, key)
+
+        # Trades of the evicted windows are late from now on
+        if (state.get('watermark_ms') or 0) < partition_time_ms:
+            state.set('watermark_ms', partition_time_ms)
+
+        base_windows: List[WindowResult] = []
+        for window, window_length, feeds_rollups in self._trade_windows:
+            window_state = self._window_state(partition, key, window)
+            for (start, end), value in window_state.expire_windows(
+                max_start_time=close_ms - window_length.window_seconds * 1000
+            ):
+                result = WindowResult(start=start, end=end, value=value)
+                self._emit_evicted(result, window_length, key, state)
+                if feeds_rollups:
+                    base_windows.append(result)
+
+                # The final candle is out, drop the update held back by `_coalesce`
+                state.delete(f'coalesce_{window_length.window_seconds}')
+
+        for window, window_length in self._rollup_windows:
+            window_state = self._window_state(partition, key, window)
+
+            # The evicted base candles still have to be rolled up
+            closed: List[WindowResult] = []
+            for result in base_windows:
+                _, expired = window.process_window(
+                    value=result,
+                    key=key,
+                    timestamp_ms=result['start'],
+                    state=window_state,
+                )
+                closed += expired
+            closed += [
+                WindowResult(start=start, end=end, value=value)
+                for (start, end), value in window_state.expire_windows(
+                    max_start_time=close_ms - window_length.window_seconds * 1000
+                )
+            ]
+            for result in closed:
+                self._emit_evicted(result, window_length, key, state)
+
+    def _emit_evicted(
+        self, window: WindowResult, window_length: CandleLength, key: str, state: State
+    ) -> None:
+        candle = self._to_candle(window, window_length)
+        if self.indicators is not None:
+            candle = self._add_indicators(candle, state)
+        self._log_candle(candle)
+
+        self._produce(self.output_topic, candle, key, window['start'])
+        if self.snapshot_topic is not None:
+            self._publish_snapshot(candle, state)
+        self.evicted_windows += 1
+        metrics.EVICTED_WINDOWS.inc()
+
+    def _produce(
+        self, topic: Topic, value: Optional[dict], key: str, timestamp: int
+    ) -> None:
+        """
+        Produce a message within the checkpoint of the current message (a tombstone
+        if `value` is None)
+        """
+        message = topic.serialize(key=key, value=value, timestamp_ms=timestamp)
+        self._app._processing_context.producer.produce(
+            topic=topic.name,
+            key=message.key,
+            value=message.value if value is not None else None,
+            timestamp=timestamp,
+        )
+
+    def partition_offsets(self) -> Dict[int, Tuple[int, int]]:
+        """
+        Returns the position of the consumer group (the committed offset, or the
+        beginning without one) and the end (high watermark) of every partition of the
+        input topic.
+        """
+        consumer = Consumer(
+            {
+                'bootstrap.servers': self.kafka_broker_address,
+                'group.id': self.kafka_consumer_group,
+                'enable.auto.commit': False,
+            }
+        )
+        try:
+            topic = self.input_topic.name
+            partitions = consumer.list_topics(topic).topics[topic].partitions
+            committed = consumer.committed(
+                [TopicPartition(topic, partition) for partition in partitions],
+                timeout=30,
+            )
+
+            offsets = {}
+            for tp in committed:
+                low, high = consumer.get_watermark_offsets(
+                    TopicPartition(topic, tp.partition)
+                )
+                # Without a committed offset the group starts at the beginning
+                offsets[tp.partition] = (tp.offset if tp.offset >= 0 else low, high)
+            return offsets
+        finally:
+            consumer.close()
+
+    def snapshot_end_offsets(self) -> Dict[int, int]:
+        """
+        Returns the current end (high watermark) of every partition of the input topic
+        that the consumer group has not fully processed yet.
+        """
+        return {
+            partition: high
+            for partition, (position, high) in self.partition_offsets().items()
+            if position < high
+        }
+
+    def _on_message_processed(self, topic: str, partition: int, offset: int) -> None:
+        """Stop a historical run once every assigned partition reached its end offset"""
+        if partition not in self._end_offsets or topic != self.input_topic.name:
+            return
+
+        if offset >= self._end_offsets[partition] - 1:
+            del self._end_offsets[partition]
+            logger.info(f'Reached the end of partition {partition}')
+
+            # Part of the checkpoint of this message, like the candles it emitted
+            self._flush_partition(partition)
+
+            if self._assigned_partitions_done():
+                logger.info('Reached the end of the assigned partitions, stopping')
+                # Stops after this message, commits the checkpoint and flushes the producer
+                self._app.stop()
+
+    def _assigned_partitions_done(self) -> bool:
+        """
+        With several replicas, every replica stops once its own partitions are done.
+        Partitions handed over by a replica that already stopped were committed at
+        their end, so they count as done without a single message.
+        """
+        consumer = self._app._consumer
+        assigned = [
+            tp
+            for tp in consumer.assignment()
+            if tp.topic == self.input_topic.name and tp.partition in self._end_offsets
+        ]
+        if not assigned:
             return True
-            
-        return False
+
+        committed = consumer.committed(assigned, timeout=30)
+        return all(tp.offset >= self._end_offsets[tp.partition] for tp in committed)
+
+    def build_dataframe(self) -> StreamingDataFrame:
+        """Define the processing of the input topic, from the trades to the candles"""
+        streaming_df = self._app.dataframe(topic=self.input_topic)
+        if self.trades_wire_format == 'columnar':
+            # Explode every micro-batch into single trades and use the trade time
+            # as event time (like `custom_ts_extractor` does for json messages)
+            streaming_df = streaming_df.apply(
+                metrics.timed(decode_trades, stage='deserialize'), expand=True
+            )
+            streaming_df = streaming_df.set_timestamp(
+                lambda value, key, timestamp, headers: value['timestamp_ms']
+            )
+        self.process_all_timeframes(streaming_df)
+        return streaming_df
 
     def run(self) -> None:
         """Main processing loop with different behavior for live/historical"""
         try:
-            streaming_df = self._app.dataframe(topic=self.input_topic)
-            self.process_all_timeframes(streaming_df)
+            if self.metrics_port:
+                metrics.MetricsServer(
+                    port=self.metrics_port,
+                    get_partition_offsets=self.partition_offsets,
+                    state_dir=self._app.config.state_dir,
+                    interval_seconds=self.metrics_interval_seconds,
+                ).start()
+
+            self.build_dataframe()
             
             if self.data_source == 'historical':
-                # Historical processing with inactivity monitoring
-                logger.info("Starting historical data processing...")
-                while not self.is_inactive():
-                    self._app.run()  # Process with timeout
-                    time.sleep(0.1)  # Small delay to prevent CPU spinning
-                logger.warning("Historical processing complete - stopping manually")
+                # Historical processing up to the end of the input topic at start time.
+                # Windows still open at the end of a partition are closed and emitted
+                # (see `_flush_partition`).
+                self._end_offsets = self.snapshot_end_offsets()
+                if not self._end_offsets:
+                    logger.info('No new trades in the input topic, nothing to do')
+                    return
+
+                logger.info(f'Starting historical data processing up to offsets {self._end_offsets}')
+                self._app.run()
+                logger.info('Historical processing complete')
             else:
                 # Live processing - continuous stream
                 logger.info("Starting live data processing...")
@@ -195,15 +883,55 @@ if __name__ == "__main__":
         for sec in candles_config.candle_seconds
     ]
     
-    reader = MultiTimeframeStreamReader(
-        kafka_broker_address=candles_config.kafka_broker_address,
-        kafka_input_topic=candles_config.kafka_input_topic,
-        kafka_output_topic=candles_config.kafka_output_topic,
-        kafka_consumer_group=candles_config.kafka_consumer_group,
-        candle_configs=window_lengths,
-        data_source=candles_config.data_source,
-        emit_incomplete_candles=candles_config.emit_incomplete_candles,
-        inactivity_timeout_seconds=60  # Adjust this value based on your needs
-    )
+    indicators = None
+    if candles_config.indicators:
+        indicators = Indicators(
+            sma_period=candles_config.sma_period,
+            ema_period=candles_config.ema_period,
+            rsi_period=candles_config.rsi_period,
+            volatility_period=candles_config.volatility_period,
+        )
+
+    if candles_config.candle_engine == 'batch':
+        # Historical backfills only: all candles at once with the vectorized engine
+        if candles_config.data_source != 'historical':
+            raise ValueError('The batch candle engine only supports historical data')
+
+        from batch_candles import run_batch_engine
+
+        run_batch_engine(
+            kafka_broker_address=candles_config.kafka_broker_address,
+            kafka_input_topic=candles_config.kafka_input_topic,
+            kafka_output_topic=candles_config.kafka_output_topic,
+            kafka_consumer_group=candles_config.kafka_consumer_group,
+            candle_seconds=candles_config.candle_seconds,
+            trades_wire_format=candles_config.trades_wire_format,
+            trades_archive_dir=candles_config.trades_archive_dir,
+            chunk_size=candles_config.batch_chunk_size,
+            indicators=indicators,
+        )
+    else:
+        reader = MultiTimeframeStreamReader(
+            kafka_broker_address=candles_config.kafka_broker_address,
+            kafka_input_topic=candles_config.kafka_input_topic,
+            kafka_output_topic=candles_config.kafka_output_topic,
+            kafka_consumer_group=candles_config.kafka_consumer_group,
+            candle_configs=window_lengths,
+            data_source=candles_config.data_source,
+            emit_incomplete_candles=candles_config.emit_incomplete_candles,
+            trades_wire_format=candles_config.trades_wire_format,
+            candle_aggregation=candles_config.candle_aggregation,
+            indicators=indicators,
+            allowed_lateness_seconds=candles_config.allowed_lateness_seconds,
+            idle_pair_timeout_seconds=candles_config.idle_pair_timeout_seconds,
+            kafka_late_topic=candles_config.kafka_late_topic,
+            incomplete_candle_interval_seconds=candles_config.incomplete_candle_interval_seconds,
+            output_topic_partitions=candles_config.kafka_output_topic_partitions,
+            topic_replication_factor=candles_config.kafka_topic_replication_factor,
+            metrics_port=candles_config.metrics_port,
+            metrics_interval_seconds=candles_config.metrics_interval_seconds,
+            kafka_snapshot_topic=candles_config.kafka_snapshot_topic,
+            snapshot_history_candles=candles_config.snapshot_history_candles,
+        )
     
-    reader.run()
\ No newline at end of file
+        reader.run()
\ No newline at end of file
@@ -26,6 +26,10 @@ class HopsworksSettingsConfig(BaseSettings):
     feature_view_name: str
     feature_view_version: int
 
+    feature_store_backend: Literal['hopsworks', 'parquet'] = 'hopsworks'
+    offline_store_dir: Optional[str] = '../../data/offline_store/candles'
+    online_store_path: Optional[str] = None
+
     data_source: Literal['live', 'historical', 'test']
 
 
@@ -38,8 +42,9 @@ class HopsworksCredentialsConfig(BaseSettings):
         env_file_encoding='utf-8',
     )
 
-    api_key: str
-    project_name: str
+    # Only needed with FEATURE_STORE_BACKEND=hopsworks
+    api_key: Optional[str] = None
+    project_name: Optional[str] = None
 
 
 hopsworksCredentialsConfig = HopsworksCredentialsConfig()
@@ -7,6 +7,7 @@ from config.config import hopsworksCredentialsConfig, hopsworksSettingsConfig
 from loguru import logger
 from utils.date_converter import convert_timestamp_ms_todatetime
 from utils.feature_reader import FeatureReader
+from utils.parquet_reader import ParquetFeatureReader
 
 # Set page config
 st.set_page_config(
@@ -17,6 +18,13 @@ st.set_page_config(
 # Initialize FeatureReader with caching
 @st.cache_resource
 def init_feature_reader():
+    if hopsworksSettingsConfig.feature_store_backend == 'parquet':
+        # Local offline store of the feature_store service, no Hopsworks login needed
+        return ParquetFeatureReader(
+            offline_store_dir=hopsworksSettingsConfig.offline_store_dir,
+            online_store_path=hopsworksSettingsConfig.online_store_path,
+        )
+
     return FeatureReader(
         hopsworks_project_name=hopsworksCredentialsConfig.project_name,
         hopsworks_api_key=hopsworksCredentialsConfig.api_key,
@@ -24,12 +32,15 @@ def init_feature_reader():
         feature_group_version=hopsworksSettingsConfig.feature_group_version,
         feature_view_name=hopsworksSettingsConfig.feature_view_name,
         feature_view_version=hopsworksSettingsConfig.feature_view_version,
+        online_store_path=hopsworksSettingsConfig.online_store_path,
     )
 
 
 # Get initial historical data with caching
 @st.cache_data(ttl=3600)  # Cache for 1 hour
-def get_initial_data(_reader: FeatureReader, days: int) -> pd.DataFrame:
+def get_initial_data(
+    _reader: FeatureReader | ParquetFeatureReader, days: int
+) -> pd.DataFrame:
     return _reader.get_data(n_days=days)
 
 
@@ -128,7 +139,15 @@ try:
     if real_time_toggle:
         logger.info('Real-Time Updates have been triggered')
         with st.spinner('Fetching latest data...'):
-            new_data = reader.get_data(n_days=1)
+            if reader.online_reader is not None:
+                # Latest candles of the displayed pair, without materialization delay
+                new_data = reader.get_latest_data(
+                    pair=pair_to_be_displayed,
+                    candle_seconds=candle_seconds_to_be_displayed,
+                    n=refresh_interval // candle_seconds_to_be_displayed + 2,
+                )
+            else:
+                new_data = reader.get_data(n_days=1)
             if not new_data.empty:
                 # Add human readable timestamps to the new data
                 new_data = convert_timestamp_ms_todatetime(
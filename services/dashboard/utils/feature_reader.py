@@ -1,4 +1,6 @@
+import sqlite3
 from datetime import datetime, timedelta
+from typing import Optional
 
 import hopsworks
 import pandas as pd
@@ -6,6 +8,7 @@ from hsfs.feature_group import FeatureGroup
 from hsfs.feature_store import FeatureStore
 from hsfs.feature_view import FeatureView
 from loguru import logger
+from utils.online_reader import OnlineStoreReader
 
 
 class FeatureReader:
@@ -25,6 +28,7 @@ class FeatureReader:
         feature_group_version: int,
         feature_view_name: str,
         feature_view_version: int,
+        online_store_path: Optional[str] = None,
     ):
         self.feature_group_name = feature_group_name
         self.feature_view_name = feature_view_name
@@ -46,6 +50,11 @@ class FeatureReader:
             feature_view_version,
         )
 
+        # Local online store of the latest candles (if the feature_store service keeps one)
+        self.online_reader = (
+            OnlineStoreReader(online_store_path) if online_store_path else None
+        )
+
     def _get_feature_group(self, name: str, version: int) -> FeatureGroup:
         """
         Returns a feature group object given its name and version
@@ -95,6 +104,23 @@ class FeatureReader:
 
         return data
 
+    def get_latest_data(
+        self, pair: str, candle_seconds: int, n: int = 1
+    ) -> pd.DataFrame:
+        """
+        Returns the last `n` candles of the pair from the online store, or from the
+        last day of data of the feature view if there is none (or it is not created yet).
+        """
+        if self.online_reader is not None:
+            try:
+                return self.online_reader.get_latest_data(pair, candle_seconds, n=n)
+            except sqlite3.OperationalError as e:
+                logger.warning(f'Online store not readable, falling back: {e}')
+
+        data = self.get_data(n_days=1)
+        data = data[(data['pair'] == pair) & (data['candle_seconds'] == candle_seconds)]
+        return data.sort_values(by='window_start_ms').tail(n)
+
 
 if __name__ == '__main__':
     import time
@@ -0,0 +1,59 @@
+import json
+import sqlite3
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+
+
+class OnlineStoreReader:
+    """
+    Reads the latest candles from the local online store of the feature_store service
+    (a SQLite database, see services/feature_store/utils/online_store.py). Lookups by
+    pair and candle seconds take well under a millisecond, without the materialization
+    delay of the offline feature view.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # Read-only, and only once the feature_store service created the database
+        if self._connection is None:
+            self._connection = sqlite3.connect(
+                f'file:{self.path}?mode=ro', uri=True, check_same_thread=False
+            )
+        return self._connection
+
+    def get_latest_data(
+        self, pair: str, candle_seconds: int, n: int = 1
+    ) -> pd.DataFrame:
+        """Returns the last `n` candles of the pair, oldest first"""
+        rows = self._connect().execute(
+            'SELECT candle FROM candles WHERE pair = ? AND candle_seconds = ? '
+            'ORDER BY window_start_ms DESC LIMIT ?',
+            (pair, candle_seconds, n),
+        )
+        return pd.DataFrame([json.loads(candle) for (candle,) in rows][::-1])
+
+    def get_range_data(
+        self,
+        pair: str,
+        candle_seconds: int,
+        start_ms: Optional[int] = None,
+        end_ms: Optional[int] = None,
+    ) -> pd.DataFrame:
+        """Returns the candles of the pair with a window start in [start_ms, end_ms)"""
+        rows = self._connect().execute(
+            'SELECT candle FROM candles WHERE pair = ? AND candle_seconds = ? '
+            'AND window_start_ms >= ? AND window_start_ms < ? '
+            'ORDER BY window_start_ms',
+            (
+                pair,
+                candle_seconds,
+                start_ms if start_ms is not None else -(2**63),
+                end_ms if end_ms is not None else 2**63 - 1,
+            ),
+        )
+        return pd.DataFrame([json.loads(candle) for (candle,) in rows])
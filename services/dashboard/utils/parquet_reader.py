@@ -0,0 +1,145 @@
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from loguru import logger
+from utils.online_reader import OnlineStoreReader
+
+# Layout of the local offline store written by the feature_store service
+# (see services/feature_store/utils/parquet_store.py)
+PARTITIONING = ds.partitioning(
+    pa.schema(
+        [
+            ('pair', pa.string()),
+            ('candle_seconds', pa.int64()),
+            ('date', pa.string()),
+        ]
+    ),
+    flavor='hive',
+)
+
+# Columns of the files, so files written with and without indicators read the same
+FILE_SCHEMA = pa.schema(
+    [
+        ('timestamp_ms', pa.int64()),
+        ('open', pa.float64()),
+        ('high', pa.float64()),
+        ('low', pa.float64()),
+        ('close', pa.float64()),
+        ('volume', pa.float64()),
+        ('trade_count', pa.int64()),
+        ('buy_volume', pa.float64()),
+        ('sell_volume', pa.float64()),
+        ('vwap', pa.float64()),
+        ('window_start_ms', pa.int64()),
+        ('window_end_ms', pa.int64()),
+        ('sma', pa.float64()),
+        ('ema', pa.float64()),
+        ('rsi', pa.float64()),
+        ('volatility', pa.float64()),
+    ]
+)
+
+
+class ParquetFeatureReader:
+    """
+    Reads the candles from the local Parquet dataset of the feature_store service
+    (FEATURE_STORE_BACKEND=parquet), with the same `get_data` as `FeatureReader`.
+
+    The time range and the pairs are pushed down to the dataset: partitions of other
+    pairs and dates are not opened, and the row groups of the files are filtered on
+    their `timestamp_ms` statistics.
+
+    Until a partition is compacted, its files can hold several versions of a window.
+    Like the compaction, the reader keeps the version with the latest `timestamp_ms`
+    (and of the latest file, on a tie).
+    """
+
+    def __init__(self, offline_store_dir: str, online_store_path: Optional[str] = None):
+        self.offline_store_dir = Path(offline_store_dir)
+
+        # Local online store of the latest candles (if the feature_store service keeps one)
+        self.online_reader = (
+            OnlineStoreReader(online_store_path) if online_store_path else None
+        )
+
+    def get_data(
+        self,
+        n_days: int,
+        pairs: Optional[List[str]] = None,
+        candle_seconds: Optional[List[int]] = None,
+    ) -> pd.DataFrame:
+        """
+        Returns the candles of the last `n_days` days, optionally only of `pairs` and
+        `candle_seconds`.
+        """
+        logger.info(f'Getting data going back {n_days} days')
+        end_time = datetime.now(tz=timezone.utc)
+        start_time = end_time - timedelta(days=n_days)
+
+        schema = pa.unify_schemas([FILE_SCHEMA, PARTITIONING.schema])
+        columns = [name for name in schema.names if name != 'date']
+        if not self.offline_store_dir.exists():
+            logger.warning(f'No candles at {self.offline_store_dir} yet')
+            return schema.empty_table().select(columns).to_pandas()
+
+        dataset = ds.dataset(
+            self.offline_store_dir,
+            schema=schema,
+            format='parquet',
+            partitioning=PARTITIONING,
+        )
+
+        # The partitions are dated by the window start, which can be up to a window
+        # before the event time of the candle
+        filter = (
+            (ds.field('date') >= f'{start_time - timedelta(days=1):%Y-%m-%d}')
+            & (ds.field('date') <= f'{end_time:%Y-%m-%d}')
+            & (ds.field('timestamp_ms') >= int(start_time.timestamp() * 1000))
+            & (ds.field('timestamp_ms') <= int(end_time.timestamp() * 1000))
+        )
+        if pairs is not None:
+            filter &= ds.field('pair').isin(pairs)
+        if candle_seconds is not None:
+            filter &= ds.field('candle_seconds').isin(candle_seconds)
+
+        # Tagged with their file, the names of which sort in write order
+        batches = dataset.scanner(columns=columns, filter=filter).scan_batches()
+        data = pd.concat(
+            [
+                tagged.record_batch.to_pandas().assign(_file=tagged.fragment.path)
+                for tagged in batches
+            ]
+            or [schema.empty_table().select(columns).to_pandas().assign(_file='')],
+            ignore_index=True,
+        )
+
+        return (
+            data.sort_values(by=['timestamp_ms', '_file'], kind='stable')
+            .drop_duplicates(
+                subset=['pair', 'candle_seconds', 'window_start_ms'], keep='last'
+            )
+            .drop(columns='_file')
+            .sort_values(by=['pair', 'candle_seconds', 'window_start_ms'])
+            .reset_index(drop=True)
+        )
+
+    def get_latest_data(
+        self, pair: str, candle_seconds: int, n: int = 1
+    ) -> pd.DataFrame:
+        """
+        Returns the last `n` candles of the pair from the online store, or from the
+        last day of data of the dataset if there is none (or it is not created yet).
+        """
+        if self.online_reader is not None:
+            try:
+                return self.online_reader.get_latest_data(pair, candle_seconds, n=n)
+            except sqlite3.OperationalError as e:
+                logger.warning(f'Online store not readable, falling back: {e}')
+
+        data = self.get_data(n_days=1, pairs=[pair], candle_seconds=[candle_seconds])
+        return data.sort_values(by='window_start_ms').tail(n)
@@ -0,0 +1,119 @@
+"""
+Micro-benchmark of the lookups of the local online store.
+
+Fills a fresh SQLite online store with the last `--history-candles` candles of every
+(pair, candle_seconds), as the sink would, and reports the p50/p99 latency of point
+lookups (the latest candle), of the last `--n` candles and of a time range of `--n`
+windows, plus the upsert throughput.
+
+Usage (from services/feature_store):
+    uv run python -m benchmarks.online_store_benchmark --pairs 8 --history-candles 1000
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+from utils.online_store import SQLiteOnlineStore
+
+CANDLE_SECONDS = [5, 10, 30, 60, 180]
+
+
+def make_candles(pair: str, candle_seconds: int, n: int) -> list[dict]:
+    start_ms = 1_700_000_000_000
+    close = random.uniform(10, 1000)
+    return [
+        {
+            'pair': pair,
+            'timestamp_ms': start_ms + (i + 1) * candle_seconds * 1000 - 1,
+            'open': close,
+            'high': close * 1.001,
+            'low': close * 0.999,
+            'close': close,
+            'volume': random.random(),
+            'trade_count': random.randrange(1, 100),
+            'vwap': close,
+            'window_start_ms': start_ms + i * candle_seconds * 1000,
+            'window_end_ms': start_ms + (i + 1) * candle_seconds * 1000,
+            'candle_seconds': candle_seconds,
+            'sma': close,
+            'ema': close,
+            'rsi': 50.0,
+            'volatility': 0.01,
+        }
+        for i in range(n)
+    ]
+
+
+def measure(lookup: Callable[[], list], repeat: int) -> dict:
+    latencies = np.empty(repeat)
+    for i in range(repeat):
+        start = time.perf_counter()
+        lookup()
+        latencies[i] = time.perf_counter() - start
+    return {
+        'p50_ms': float(np.percentile(latencies, 50)) * 1000,
+        'p99_ms': float(np.percentile(latencies, 99)) * 1000,
+    }
+
+
+def main(n_pairs: int, history_candles: int, n: int, repeat: int) -> None:
+    store = SQLiteOnlineStore(
+        str(Path(tempfile.mkdtemp()) / 'candles.sqlite'),
+        history_candles=history_candles,
+    )
+    pairs = [f'PAIR{i}/USD' for i in range(n_pairs)]
+
+    n_candles = 0
+    start = time.perf_counter()
+    for pair in pairs:
+        for candle_seconds in CANDLE_SECONDS:
+            candles = make_candles(pair, candle_seconds, history_candles)
+            for i in range(0, len(candles), 1000):
+                store.upsert(candles[i : i + 1000])
+            n_candles += len(candles)
+    seconds = time.perf_counter() - start
+    print(f'{"upsert":>10}: {n_candles / seconds:>12,.0f} candles/sec')
+
+    def random_key() -> tuple[str, int]:
+        return random.choice(pairs), random.choice(CANDLE_SECONDS)
+
+    def latest() -> list:
+        return store.latest(*random_key())
+
+    def latest_n() -> list:
+        return store.latest(*random_key(), n=n)
+
+    def window_range() -> list:
+        pair, candle_seconds = random_key()
+        start_ms = 1_700_000_000_000 + random.randrange(history_candles - n) * (
+            candle_seconds * 1000
+        )
+        return store.range(
+            pair, candle_seconds, start_ms, start_ms + n * candle_seconds * 1000
+        )
+
+    for name, lookup in [
+        ('latest', latest),
+        (f'latest {n}', latest_n),
+        (f'range {n}', window_range),
+    ]:
+        result = measure(lookup, repeat)
+        print(
+            f'{name:>10}: p50 {result["p50_ms"]:.3f} ms, p99 {result["p99_ms"]:.3f} ms'
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--pairs', type=int, default=8)
+    parser.add_argument('--history-candles', type=int, default=1000)
+    parser.add_argument('--n', type=int, default=20, help='candles per range lookup')
+    parser.add_argument('--repeat', type=int, default=10000)
+    args = parser.parse_args()
+
+    main(args.pairs, args.history_candles, args.n, args.repeat)
@@ -0,0 +1,126 @@
+"""
+Micro-benchmark of the batch construction of the feature store sink.
+
+Compares the previous path (`pd.DataFrame` from the list of candle dicts) against the
+columnar path (`candles_to_table`, an Arrow table with the fixed candle schema), with
+and without the conversion to pandas the Hopsworks insert needs. Reports rows/sec
+(best of `--repeat`) and the memory allocated for a batch: the peak of the Python
+allocations (tracemalloc, includes NumPy buffers) and the bytes the result holds in
+the Arrow memory pool.
+
+Usage (from services/feature_store):
+    uv run python -m benchmarks.table_benchmark --rows 10000 100000 1000000
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+from typing import Callable, List
+
+import pandas as pd
+import pyarrow as pa
+from utils.candle_table import candles_to_table, table_to_pandas
+
+
+def make_candles(n_rows: int, seed: int = 42) -> List[dict]:
+    """Candles as the candles service emits them, with indicators"""
+    rng = random.Random(seed)
+    pairs = ['BTC/USD', 'BTC/EUR', 'ETH/EUR', 'ETH/USD']
+    candles = []
+    for i in range(n_rows):
+        close = rng.uniform(70_000, 80_000)
+        volume = rng.random()
+        window_start_ms = 1_700_000_000_000 + (i // len(pairs)) * 60_000
+        candles.append(
+            {
+                'pair': pairs[i % len(pairs)],
+                'timestamp_ms': window_start_ms + rng.randrange(60_000),
+                'open': close * 0.999,
+                'high': close * 1.001,
+                'low': close * 0.998,
+                'close': close,
+                'volume': volume,
+                'trade_count': rng.randrange(1, 100),
+                'buy_volume': volume / 2,
+                'sell_volume': volume / 2,
+                'vwap': close,
+                'window_start_ms': window_start_ms,
+                'window_end_ms': window_start_ms + 60_000,
+                'candle_seconds': 60,
+                'sma': None if i < 80 else close,
+                'ema': None if i < 80 else close,
+                'rsi': None if i < 56 else 50.0,
+                'volatility': None if i < 80 else 0.01,
+            }
+        )
+    return candles
+
+
+def pandas_path(candles: List[dict]):
+    return pd.DataFrame(candles)
+
+
+def arrow_path(candles: List[dict]):
+    return candles_to_table(candles)
+
+
+def arrow_pandas_path(candles: List[dict]):
+    return table_to_pandas(candles_to_table(candles))
+
+
+PATHS = [
+    ('DataFrame', pandas_path),
+    ('Arrow', arrow_path),
+    ('Arrow+pandas', arrow_pandas_path),
+]
+
+
+def measure_memory(path: Callable, candles: List[dict]) -> tuple[float, float]:
+    """Returns the peak Python allocations and the Arrow pool bytes of the result in MB"""
+    pool = pa.default_memory_pool()
+    arrow_before = pool.bytes_allocated()
+    tracemalloc.start()
+    result = path(candles)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    arrow_bytes = pool.bytes_allocated() - arrow_before
+    del result
+    return peak / 2**20, arrow_bytes / 2**20
+
+
+def main(rows: List[int], repeat: int) -> None:
+    for n_rows in rows:
+        candles = make_candles(n_rows)
+        print(f'{n_rows:,} rows')
+
+        results = {}
+        for name, path in PATHS:
+            best = float('inf')
+            for _ in range(repeat):
+                start = time.perf_counter()
+                path(candles)
+                best = min(best, time.perf_counter() - start)
+            results[name] = best
+            python_mb, arrow_mb = measure_memory(path, candles)
+            print(
+                f'{name:>14}: {n_rows / best:>12,.0f} rows/sec, '
+                f'{python_mb:>8.1f} MB python peak, {arrow_mb:>8.1f} MB arrow'
+            )
+
+        print(
+            f'{"speedup":>14}: {results["DataFrame"] / results["Arrow"]:.1f}x '
+            f'(Arrow), {results["DataFrame"] / results["Arrow+pandas"]:.1f}x '
+            f'(Arrow+pandas)\n'
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument(
+        '--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    main(args.rows, args.repeat)
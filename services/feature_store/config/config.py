@@ -17,6 +17,7 @@ class HopsworksSettingsConfig(BaseSettings):
     kafka_broker_address: str
     kafka_input_topic: str
     kafka_consumer_group: str
+    kafka_commit_interval_seconds: Optional[float] = 5.0
 
     feature_group_name: str
     feature_group_version: int
@@ -24,6 +25,27 @@ class HopsworksSettingsConfig(BaseSettings):
     feature_group_event_time: str
     feature_group_materialization_interval_minutes: Optional[int] = 15
 
+    sink_max_rows: Optional[int] = 10000
+    sink_max_latency_seconds: Optional[float] = 5.0
+    sink_max_in_flight_batches: Optional[int] = 2
+
+    feature_store_backend: Literal['hopsworks', 'parquet'] = 'hopsworks'
+    offline_store_dir: Optional[str] = '../../data/offline_store/candles'
+    offline_store_compact_min_files: Optional[int] = 16
+
+    online_store_path: Optional[str] = None
+    online_store_history_candles: Optional[int] = 1000
+    online_store_port: Optional[int] = None
+
+    spill_dir: Optional[str] = None
+    spill_segment_mb: Optional[int] = 64
+    spill_max_mb: Optional[int] = 1024
+    retry_max_attempts: Optional[int] = 20
+    retry_base_backoff_seconds: Optional[float] = 1.0
+    retry_max_backoff_seconds: Optional[float] = 300.0
+
+    metrics_port: Optional[int] = None
+
     data_source: Literal['live', 'historical', 'test']
 
 
@@ -36,8 +58,9 @@ class HopsworksCredentialsConfig(BaseSettings):
         env_file_encoding='utf-8',
     )
 
-    api_key: str
-    project_name: str
+    # Only needed with FEATURE_STORE_BACKEND=hopsworks
+    api_key: Optional[str] = None
+    project_name: Optional[str] = None
 
 
 hopsworksCredentialsConfig = HopsworksCredentialsConfig()
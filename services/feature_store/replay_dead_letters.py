@@ -0,0 +1,103 @@
+"""
+Replays the batches of the dead-letter file of the spill queue to the configured
+backend (and online store).
+
+The file is first moved aside, so the running service can keep appending new dead
+letters. Batches that fail again are appended back to the dead-letter file.
+
+Usage (from services/feature_store):
+    uv run python replay_dead_letters.py --list
+    uv run python replay_dead_letters.py
+"""
+
+import argparse
+import os
+import time
+from pathlib import Path
+
+from loguru import logger
+from utils.online_store import SQLiteOnlineStore
+from utils.spill import DeadLetterFile
+
+
+def main(dead_letter_path: Path, list_only: bool) -> bool:
+    """
+    Returns True if all batches were replayed (or listed)
+    """
+    dead_letter = DeadLetterFile(str(dead_letter_path))
+    if list_only:
+        for record in dead_letter.read():
+            print(
+                f'{record["failed_at"]}: {len(record["candles"])} candles, '
+                f'error: {record["error"]}'
+            )
+        return True
+
+    # Including the files of an earlier replay that was interrupted
+    replaying_pattern = f'{dead_letter_path.name}.replaying-*'
+    if not dead_letter_path.exists() and not any(
+        dead_letter_path.parent.glob(replaying_pattern)
+    ):
+        logger.info(f'No dead letters at {dead_letter_path}')
+        return True
+
+    from config.config import hopsworksCredentialsConfig, hopsworksSettingsConfig
+    from run import build_sink
+
+    online_store = None
+    if hopsworksSettingsConfig.online_store_path:
+        online_store = SQLiteOnlineStore(
+            path=hopsworksSettingsConfig.online_store_path,
+            history_candles=hopsworksSettingsConfig.online_store_history_candles,
+        )
+    # Without a spill queue, so a failed write raises
+    sink = build_sink(
+        hopsworksSettingsConfig, hopsworksCredentialsConfig, online_store=online_store
+    )
+
+    if dead_letter_path.exists():
+        os.replace(
+            dead_letter_path,
+            dead_letter_path.with_name(
+                f'{dead_letter_path.name}.replaying-{time.time_ns()}'
+            ),
+        )
+
+    replayed, failed = 0, 0
+    for replaying_path in sorted(dead_letter_path.parent.glob(replaying_pattern)):
+        for record in DeadLetterFile(str(replaying_path)).read():
+            try:
+                sink.write_candles(record['candles'])
+                replayed += 1
+            except Exception as e:
+                logger.error(
+                    f'Replay of a batch of {len(record["candles"])} candles failed: {e}'
+                )
+                dead_letter.append(record['candles'], error=repr(e))
+                failed += 1
+        replaying_path.unlink()
+
+    logger.info(f'Replayed {replayed} batches, {failed} failed again')
+    return failed == 0
+
+
+if __name__ == '__main__':
+    from config.config import hopsworksSettingsConfig
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument(
+        '--path',
+        type=Path,
+        default=(
+            Path(hopsworksSettingsConfig.spill_dir) / 'dead_letter.jsonl'
+            if hopsworksSettingsConfig.spill_dir
+            else None
+        ),
+        help='dead-letter file (default: dead_letter.jsonl in SPILL_DIR)',
+    )
+    parser.add_argument('--list', action='store_true', help='only list the batches')
+    args = parser.parse_args()
+    if args.path is None:
+        parser.error('SPILL_DIR is not set, pass --path')
+
+    raise SystemExit(0 if main(args.path, args.list) else 1)
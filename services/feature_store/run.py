@@ -1,17 +1,26 @@
 
-from typing import Literal
+from typing import Literal, Optional
 
 from loguru import logger
+from prometheus_client import start_http_server
 from quixstreams import Application
-from utils.sinks import HopsworksFeatureStoreSink
+from utils.online_server import start_online_server
+from utils.online_store import SQLiteOnlineStore
+from utils.sinks import (
+    FeatureStoreSink,
+    HopsworksFeatureStoreSink,
+    ParquetFeatureStoreSink,
+)
+from utils.spill import SpillQueue
 
 
 def main(
     kafka_broker_address: str,
     kafka_input_topic: str,
     kafka_consumer_group: str,
-    output_sink: HopsworksFeatureStoreSink,
+    output_sink: FeatureStoreSink,
     data_source: Literal['live', 'historical', 'test'],
+    commit_interval_seconds: float = 5.0,
 ):
     """
     Thw service will consist of two parts:
@@ -24,15 +33,18 @@ def main(
         kafka_consumer_group: The Kafka consumer group
         output_sink: The output sink
         data_source: The data source (live, historical, test)
+        commit_interval_seconds: How often the offsets are committed (the sink waits
+            for its uploads before every commit)
     Returns:
         None
     """
-    logger.info('Uploading data in batches to the Hopsworks Feature Store...')
+    logger.info(f'Uploading data in batches with {type(output_sink).__name__}...')
 
     app = Application(
         broker_address=kafka_broker_address,
         consumer_group=kafka_consumer_group,
         auto_offset_reset='latest' if data_source == 'live' else 'earliest',
+        commit_interval=commit_interval_seconds,
     )
     input_topic = app.topic(kafka_input_topic, value_deserializer='json')
 
@@ -44,28 +56,98 @@ def main(
     app.run()
 
 
+def build_sink(
+    settings,
+    credentials,
+    online_store: Optional[SQLiteOnlineStore] = None,
+    spill_queue: Optional[SpillQueue] = None,
+) -> FeatureStoreSink:
+    """
+    Returns the sink of the configured backend (FEATURE_STORE_BACKEND)
+
+    Args:
+        settings: The settings of the service (see config.config)
+        credentials: The Hopsworks credentials (only used with the hopsworks backend)
+        online_store: The online store to keep the latest candles in, if any
+        spill_queue: The spill queue of the failed batches, if any
+    Returns:
+        The sink
+    """
+    sink_kwargs = {
+        # Flush policy of the uploads
+        'max_rows': settings.sink_max_rows,
+        'max_latency_seconds': settings.sink_max_latency_seconds,
+        'max_in_flight_batches': settings.sink_max_in_flight_batches,
+        'online_store': online_store,
+        # Retries of the failed batches
+        'spill_queue': spill_queue,
+        'retry_max_attempts': settings.retry_max_attempts,
+        'retry_base_backoff_seconds': settings.retry_base_backoff_seconds,
+        'retry_max_backoff_seconds': settings.retry_max_backoff_seconds,
+    }
+
+    if settings.feature_store_backend == 'parquet':
+        # Local Parquet dataset, no Hopsworks login needed
+        return ParquetFeatureStoreSink(
+            root=settings.offline_store_dir,
+            compact_min_files=settings.offline_store_compact_min_files,
+            **sink_kwargs,
+        )
+
+    return HopsworksFeatureStoreSink(
+        # Hopsworks credentials
+        api_key=credentials.api_key,
+        project_name=credentials.project_name,
+
+        # Feature group configuration
+        feature_group_name=settings.feature_group_name,
+        feature_group_version=settings.feature_group_version,
+        feature_group_primary_keys=settings.feature_group_primary_keys,
+        feature_group_event_time=settings.feature_group_event_time,
+        feature_group_materialization_interval_minutes=settings.feature_group_materialization_interval_minutes,
+        **sink_kwargs,
+    )
+
+
 if __name__ == '__main__':
     from config.config import hopsworksSettingsConfig, hopsworksCredentialsConfig
     
-    # Sink to save data to the feature store
-    hopsworks_sink = HopsworksFeatureStoreSink(
-        # Hopsworks credentials
-        api_key=hopsworksCredentialsConfig.api_key,
-        project_name=hopsworksCredentialsConfig.project_name,
-        
-        # Feature group configuration
-        feature_group_name=hopsworksSettingsConfig.feature_group_name,
-        feature_group_version=hopsworksSettingsConfig.feature_group_version,
-        feature_group_primary_keys=hopsworksSettingsConfig.feature_group_primary_keys,
-        feature_group_event_time=hopsworksSettingsConfig.feature_group_event_time,
-        feature_group_materialization_interval_minutes=hopsworksSettingsConfig.feature_group_materialization_interval_minutes,
+    if hopsworksSettingsConfig.metrics_port:
+        start_http_server(hopsworksSettingsConfig.metrics_port)
+        logger.info(f'Serving metrics on port {hopsworksSettingsConfig.metrics_port}')
+
+    # Local online store of the latest candles (and its query endpoint)
+    online_store = None
+    if hopsworksSettingsConfig.online_store_path:
+        online_store = SQLiteOnlineStore(
+            path=hopsworksSettingsConfig.online_store_path,
+            history_candles=hopsworksSettingsConfig.online_store_history_candles,
+        )
+        if hopsworksSettingsConfig.online_store_port:
+            start_online_server(online_store, hopsworksSettingsConfig.online_store_port)
+
+    # Local spill queue for the batches the backend failed to store
+    spill_queue = None
+    if hopsworksSettingsConfig.spill_dir:
+        spill_queue = SpillQueue(
+            directory=hopsworksSettingsConfig.spill_dir,
+            segment_bytes=hopsworksSettingsConfig.spill_segment_mb * 2**20,
+            max_bytes=hopsworksSettingsConfig.spill_max_mb * 2**20,
+        )
+
+    output_sink = build_sink(
+        hopsworksSettingsConfig,
+        hopsworksCredentialsConfig,
+        online_store=online_store,
+        spill_queue=spill_queue,
     )
 
     main(
         kafka_broker_address=hopsworksSettingsConfig.kafka_broker_address,
         kafka_input_topic=hopsworksSettingsConfig.kafka_input_topic,
         kafka_consumer_group=hopsworksSettingsConfig.kafka_consumer_group,
-        output_sink=hopsworks_sink,
+        output_sink=output_sink,
         data_source=hopsworksSettingsConfig.data_source,
+        commit_interval_seconds=hopsworksSettingsConfig.kafka_commit_interval_seconds,
     )
 
@@ -0,0 +1,100 @@
+"""
+Columnar construction of the candle batches of the sink.
+
+Instead of letting pandas infer the dtypes from a list of dicts on every batch, the
+columns of the fixed candle schema are filled into preallocated NumPy buffers and
+wrapped into a typed Arrow table without copying them again.
+"""
+
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# Columns every candle of the candles service has
+CANDLE_SCHEMA = pa.schema(
+    [
+        ('pair', pa.string()),
+        ('timestamp_ms', pa.int64()),
+        ('open', pa.float64()),
+        ('high', pa.float64()),
+        ('low', pa.float64()),
+        ('close', pa.float64()),
+        ('volume', pa.float64()),
+        ('trade_count', pa.int64()),
+        ('buy_volume', pa.float64()),
+        ('sell_volume', pa.float64()),
+        ('vwap', pa.float64()),
+        ('window_start_ms', pa.int64()),
+        ('window_end_ms', pa.int64()),
+        ('candle_seconds', pa.int64()),
+    ]
+)
+
+# Columns of the indicators (with INDICATORS=True), null until enough candles were seen
+INDICATOR_SCHEMA = pa.schema(
+    [
+        ('sma', pa.float64()),
+        ('ema', pa.float64()),
+        ('rsi', pa.float64()),
+        ('volatility', pa.float64()),
+    ]
+)
+
+
+def collapse_candles(candles: Sequence[dict]) -> list[dict]:
+    """
+    Returns the latest version of every (pair, candle_seconds, window_start_ms) of the
+    batch, in the order the windows first appear. With incomplete candles a batch
+    holds many successive versions of a window, and only the last one has to be
+    written: the earlier ones would be overwritten by it anyway.
+    """
+    latest: dict[tuple[str, int, int], dict] = {}
+    for candle in candles:
+        key = (candle['pair'], candle['candle_seconds'], candle['window_start_ms'])
+        latest[key] = candle
+    return list(latest.values())
+
+
+def candles_to_table(candles: Sequence[dict]) -> pa.Table:
+    """
+    Returns the candles as an Arrow table with the candle schema, plus the indicator
+    columns if the first candle has them. Other fields of the candles are dropped.
+    """
+    n_rows = len(candles)
+    schema = CANDLE_SCHEMA
+    if n_rows and INDICATOR_SCHEMA.names[0] in candles[0]:
+        schema = pa.unify_schemas([CANDLE_SCHEMA, INDICATOR_SCHEMA])
+
+    arrays = []
+    for field in schema:
+        name = field.name
+        if field.type == pa.string():
+            arrays.append(pa.array([c[name] for c in candles], type=field.type))
+        elif name in INDICATOR_SCHEMA.names:
+            # None becomes NaN in the buffer and null in the table
+            column = np.fromiter(
+                (np.nan if c.get(name) is None else c[name] for c in candles),
+                dtype=np.float64,
+                count=n_rows,
+            )
+            arrays.append(pa.array(column, type=field.type, from_pandas=True))
+        else:
+            column = np.fromiter(
+                (c[name] for c in candles),
+                dtype=field.type.to_pandas_dtype(),
+                count=n_rows,
+            )
+            arrays.append(pa.array(column, type=field.type))
+
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def table_to_pandas(table: pa.Table) -> pd.DataFrame:
+    """
+    Converts the table for backends that only take pandas. The numeric columns without
+    nulls are not copied, and the buffers of the table are released while converting,
+    so the table must not be used afterwards.
+    """
+    return table.to_pandas(split_blocks=True, self_destruct=True)
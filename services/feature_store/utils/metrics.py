@@ -0,0 +1,42 @@
+"""
+Prometheus metrics of the feature_store service, served in the Prometheus text format
+on `http://<host>:<METRICS_PORT>/metrics`.
+
+- feature_store_received_candles_total: candles consumed by the sink
+- feature_store_written_candles_total: candles written after collapsing the versions
+  of a window within a batch (received / written gives the collapse ratio over time)
+- feature_store_collapse_ratio: received / written candles of the latest batch
+- feature_store_spilled_batches_total: batches the backend failed to store, spilled to
+  the local spill queue for a retry
+- feature_store_spill_queue_batches / feature_store_spill_queue_bytes: batches waiting
+  in the spill queue and its size on disk
+- feature_store_dead_letter_candles_total: candles moved to the dead-letter file
+"""
+
+from prometheus_client import Counter, Gauge
+
+RECEIVED_CANDLES = Counter(
+    'feature_store_received_candles_total', 'Candles consumed by the sink'
+)
+WRITTEN_CANDLES = Counter(
+    'feature_store_written_candles_total',
+    'Candles written to the backend, after collapsing the versions of a window',
+)
+COLLAPSE_RATIO = Gauge(
+    'feature_store_collapse_ratio',
+    'Received candles per written candle of the latest batch',
+)
+SPILLED_BATCHES = Counter(
+    'feature_store_spilled_batches_total',
+    'Batches the backend failed to store, spilled for a retry',
+)
+SPILL_QUEUE_BATCHES = Gauge(
+    'feature_store_spill_queue_batches', 'Batches waiting in the spill queue'
+)
+SPILL_QUEUE_BYTES = Gauge(
+    'feature_store_spill_queue_bytes', 'Size of the spill queue on disk'
+)
+DEAD_LETTER_CANDLES = Counter(
+    'feature_store_dead_letter_candles_total',
+    'Candles moved to the dead-letter file after their retries failed',
+)
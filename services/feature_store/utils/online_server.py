@@ -0,0 +1,94 @@
+"""
+Tiny local query endpoint of the online store:
+
+    GET /candles?pair=BTC/USD&candle_seconds=60&n=10
+        the last `n` candles (default 1)
+    GET /candles?pair=BTC/USD&candle_seconds=60&start_ms=...&end_ms=...
+        the candles with a window start in [start_ms, end_ms) (either can be left out)
+    GET /keys
+        the (pair, candle_seconds) in the store
+
+The candles are returned as a JSON list, oldest first.
+
+Usage (from services/feature_store, next to a running `run.py`):
+    uv run python -m utils.online_server --port 8765
+"""
+
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from loguru import logger
+
+from utils.online_store import SQLiteOnlineStore
+
+
+def make_handler(store: SQLiteOnlineStore) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {key: values[0] for key, values in parse_qs(url.query).items()}
+            try:
+                if url.path == '/keys':
+                    self._send(200, store.keys())
+                elif url.path == '/candles':
+                    self._send(200, self._candles(params))
+                else:
+                    self._send(404, {'error': f'Unknown path {url.path}'})
+            except (KeyError, ValueError) as e:
+                self._send(400, {'error': f'Invalid query: {e}'})
+
+        @staticmethod
+        def _candles(params: dict) -> list[dict]:
+            pair, candle_seconds = params['pair'], int(params['candle_seconds'])
+            if 'start_ms' in params or 'end_ms' in params:
+                return store.range(
+                    pair,
+                    candle_seconds,
+                    start_ms=int(params['start_ms']) if 'start_ms' in params else None,
+                    end_ms=int(params['end_ms']) if 'end_ms' in params else None,
+                )
+            return store.latest(pair, candle_seconds, n=int(params.get('n', 1)))
+
+        def _send(self, status: int, body) -> None:
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            # One log line per lookup would be too much
+            pass
+
+    return Handler
+
+
+def start_online_server(store: SQLiteOnlineStore, port: int) -> ThreadingHTTPServer:
+    """Serves the online store on `port` in a background thread"""
+    server = ThreadingHTTPServer(('0.0.0.0', port), make_handler(store))
+    threading.Thread(
+        target=server.serve_forever, name='online-store-server', daemon=True
+    ).start()
+    logger.info(f'Serving the online store on port {port}')
+    return server
+
+
+if __name__ == '__main__':
+    from config.config import hopsworksSettingsConfig
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--path', default=hopsworksSettingsConfig.online_store_path)
+    parser.add_argument(
+        '--port', type=int, default=hopsworksSettingsConfig.online_store_port or 8765
+    )
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(
+        ('0.0.0.0', args.port), make_handler(SQLiteOnlineStore(args.path))
+    )
+    logger.info(f'Serving the online store at {args.path} on port {args.port}')
+    server.serve_forever()
@@ -0,0 +1,141 @@
+"""
+Embedded online store of the latest candles, in a local SQLite database.
+
+The candles are keyed by the primary keys of the feature group (`pair`,
+`candle_seconds`) plus the window start, and only the last `history_candles` windows
+of every (pair, candle_seconds) are kept. The primary key is the clustered index of
+the table (WITHOUT ROWID), so the latest candles and time ranges of a pair are
+contiguous and a lookup is a single index range scan.
+"""
+
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional, Sequence
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS candles (
+    pair TEXT NOT NULL,
+    candle_seconds INTEGER NOT NULL,
+    window_start_ms INTEGER NOT NULL,
+    timestamp_ms INTEGER NOT NULL,
+    candle TEXT NOT NULL,
+    PRIMARY KEY (pair, candle_seconds, window_start_ms)
+) WITHOUT ROWID
+"""
+
+# A newer version of a candle has the event time of a later (or the same) trade
+UPSERT = """
+INSERT INTO candles (pair, candle_seconds, window_start_ms, timestamp_ms, candle)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (pair, candle_seconds, window_start_ms) DO UPDATE SET
+    timestamp_ms = excluded.timestamp_ms,
+    candle = excluded.candle
+WHERE excluded.timestamp_ms >= candles.timestamp_ms
+"""
+
+TRIM = """
+DELETE FROM candles
+WHERE pair = ? AND candle_seconds = ? AND window_start_ms < (
+    SELECT window_start_ms FROM candles
+    WHERE pair = ? AND candle_seconds = ?
+    ORDER BY window_start_ms DESC
+    LIMIT 1 OFFSET ?
+)
+"""
+
+
+class SQLiteOnlineStore:
+    """
+    Can be used from several threads (e.g. written by the uploads of the sink and
+    read by the query endpoint): every thread gets its own connection, and with the
+    write-ahead log readers do not wait for the writer.
+    """
+
+    def __init__(self, path: str, history_candles: int = 1000):
+        self.path = Path(path)
+        self.history_candles = history_candles
+        self._local = threading.local()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        connection = self._connection()
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, isolation_level=None)
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def upsert(self, candles: Sequence[dict]) -> None:
+        """
+        Stores the candles (replacing older versions of their windows) and drops the
+        windows that fell out of the history of their pair and candle seconds.
+        """
+        connection = self._connection()
+        keys = {(c['pair'], c['candle_seconds']) for c in candles}
+        with connection:
+            connection.execute('BEGIN')
+            connection.executemany(
+                UPSERT,
+                [
+                    (
+                        c['pair'],
+                        c['candle_seconds'],
+                        c['window_start_ms'],
+                        c['timestamp_ms'],
+                        json.dumps(c),
+                    )
+                    for c in candles
+                ],
+            )
+            connection.executemany(
+                TRIM,
+                [
+                    (pair, seconds, pair, seconds, self.history_candles - 1)
+                    for pair, seconds in keys
+                ],
+            )
+
+    def latest(self, pair: str, candle_seconds: int, n: int = 1) -> list[dict]:
+        """Returns the last `n` candles of the pair, oldest first"""
+        rows = self._connection().execute(
+            'SELECT candle FROM candles WHERE pair = ? AND candle_seconds = ? '
+            'ORDER BY window_start_ms DESC LIMIT ?',
+            (pair, candle_seconds, n),
+        )
+        return [json.loads(candle) for (candle,) in rows][::-1]
+
+    def range(
+        self,
+        pair: str,
+        candle_seconds: int,
+        start_ms: Optional[int] = None,
+        end_ms: Optional[int] = None,
+    ) -> list[dict]:
+        """Returns the candles of the pair with a window start in [start_ms, end_ms)"""
+        rows = self._connection().execute(
+            'SELECT candle FROM candles WHERE pair = ? AND candle_seconds = ? '
+            'AND window_start_ms >= ? AND window_start_ms < ? '
+            'ORDER BY window_start_ms',
+            (
+                pair,
+                candle_seconds,
+                start_ms if start_ms is not None else -(2**63),
+                end_ms if end_ms is not None else 2**63 - 1,
+            ),
+        )
+        return [json.loads(candle) for (candle,) in rows]
+
+    def keys(self) -> list[tuple[str, int]]:
+        """Returns the (pair, candle_seconds) in the store"""
+        return list(
+            self._connection().execute(
+                'SELECT DISTINCT pair, candle_seconds FROM candles '
+                'ORDER BY pair, candle_seconds'
+            )
+        )
@@ -0,0 +1,108 @@
+"""
+Local offline store of the candles: a Parquet dataset partitioned by pair, candle
+seconds and (UTC) date of the window start, e.g.
+
+    <root>/pair=BTC%2FUSD/candle_seconds=60/date=2024-11-09/part-<time_ns>-0.parquet
+
+Every write adds one file per partition it touches. Once a partition holds
+`compact_min_files` files, they are merged into one file with the latest version of
+every window (the one with the latest `timestamp_ms`), sorted by window start.
+"""
+
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from loguru import logger
+
+PARTITIONING = ds.partitioning(
+    pa.schema(
+        [
+            ('pair', pa.string()),
+            ('candle_seconds', pa.int64()),
+            ('date', pa.string()),
+        ]
+    ),
+    flavor='hive',
+)
+
+
+class ParquetCandleStore:
+    def __init__(self, root: str, compact_min_files: int = 16):
+        self.root = Path(root)
+        self.compact_min_files = compact_min_files
+
+    def write(self, table: pa.Table) -> None:
+        """Appends the candles and compacts the partitions that got too many files"""
+        dates = pc.strftime(
+            pc.cast(table['window_start_ms'], pa.timestamp('ms', tz='UTC')),
+            format='%Y-%m-%d',
+        )
+        table = table.append_column('date', dates)
+
+        written: set[Path] = set()
+        ds.write_dataset(
+            table,
+            self.root,
+            format='parquet',
+            partitioning=PARTITIONING,
+            # The names sort in write order, which the compaction relies on
+            basename_template=f'part-{time.time_ns():020d}-{{i}}.parquet',
+            existing_data_behavior='overwrite_or_ignore',
+            file_visitor=lambda file: written.add(Path(file.path).parent),
+        )
+
+        for partition_dir in written:
+            if len(self._files(partition_dir)) >= self.compact_min_files:
+                self.compact(partition_dir)
+
+    def compact(self, partition_dir: Path) -> None:
+        """
+        Merges the files of a partition into one, keeping the latest version of every
+        window: the one with the latest `timestamp_ms`, so a late retry (or a replay of
+        dead letters) of an older version does not replace a newer one, like in the
+        online store. The merged file is renamed into place before the old files are
+        deleted, so a crash in between only leaves duplicates for the next compaction.
+        """
+        files = self._files(partition_dir)
+        if len(files) < 2:
+            return
+
+        table = pa.concat_tables(
+            [pq.ParquetFile(file).read() for file in files], promote_options='default'
+        )
+
+        # Files (and the rows in them) are in write order, which breaks the ties
+        table = table.append_column('_row', pa.array(range(len(table)), pa.int64()))
+        table = table.sort_by(
+            [
+                ('window_start_ms', 'ascending'),
+                ('timestamp_ms', 'ascending'),
+                ('_row', 'ascending'),
+            ]
+        ).drop_columns(['_row'])
+
+        # Last row of every window
+        window_starts = table['window_start_ms'].to_numpy()
+        is_last = np.append(window_starts[1:] != window_starts[:-1], True)
+        table = table.filter(pa.array(is_last))
+
+        name = f'part-{time.time_ns():020d}-0.parquet'
+        tmp_path = partition_dir / f'.{name}.tmp'
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, partition_dir / name)
+        for file in files:
+            file.unlink()
+
+        logger.debug(
+            f'Compacted {len(files)} files into {len(table)} candles in {partition_dir}'
+        )
+
+    @staticmethod
+    def _files(partition_dir: Path) -> list[Path]:
+        return sorted(partition_dir.glob('part-*.parquet'))
@@ -1,15 +1,172 @@
+import abc
+import threading
+import time
 from datetime import datetime, timezone
+from typing import Optional
 
 import hopsworks
-import pandas as pd
+import pyarrow as pa
 
 from loguru import logger
 from quixstreams.sinks.base import BatchingSink, SinkBatch
+from utils import metrics
+from utils.candle_table import candles_to_table, collapse_candles, table_to_pandas
+from utils.online_store import SQLiteOnlineStore
+from utils.parquet_store import ParquetCandleStore
+from utils.spill import DeadLetterFile, SpillQueue, SpillRetrier
+from utils.uploader import BackgroundUploader
 
 
-class HopsworksFeatureStoreSink(BatchingSink):
+class FeatureStoreSink(BatchingSink):
     """
-    Some sink writing data to a database
+    Base class of the sinks writing the candles to a feature store backend.
+
+    The rows of every partition are uploaded as soon as `max_rows` of them were
+    collected, or the first of them is `max_latency_seconds` old, on a background
+    thread (see `BackgroundUploader`), so the consumer keeps reading while a batch is
+    uploaded. On every checkpoint the remaining rows are uploaded and the sink waits
+    for all uploads, so the offsets are only committed once their rows are stored.
+
+    Subclasses implement `write_table`, which gets the batch as an Arrow table of the
+    candle schema (see `candles_to_table`). With an `online_store`, the latest candles
+    are also kept there once the backend stored them.
+
+    With a `spill_queue`, a batch the backend fails to store is spilled to the queue on
+    disk instead of failing the checkpoint, and written by a `SpillRetrier` with
+    backoff, so the consumer keeps draining Kafka during an outage of the backend.
+    While batches are spilled, the later ones are queued behind them to keep their
+    order. Only a full spill queue fails the checkpoint.
+    """
+
+    def __init__(
+        self,
+        max_rows: int = 10000,
+        max_latency_seconds: float = 5.0,
+        max_in_flight_batches: int = 2,
+        online_store: Optional[SQLiteOnlineStore] = None,
+        spill_queue: Optional[SpillQueue] = None,
+        dead_letter: Optional[DeadLetterFile] = None,
+        retry_max_attempts: int = 20,
+        retry_base_backoff_seconds: float = 1.0,
+        retry_max_backoff_seconds: float = 300.0,
+    ):
+        self.online_store = online_store
+        self._write_lock = threading.Lock()
+
+        # Durable retries of the batches the backend failed to store
+        self.spill_queue = spill_queue
+        self._retrier = None
+        if spill_queue is not None:
+            metrics.SPILL_QUEUE_BATCHES.set_function(lambda: len(spill_queue))
+            metrics.SPILL_QUEUE_BYTES.set_function(spill_queue.size_bytes)
+            self._retrier = SpillRetrier(
+                queue=spill_queue,
+                write=self.write_candles,
+                dead_letter=dead_letter
+                or DeadLetterFile(str(spill_queue.directory / 'dead_letter.jsonl')),
+                max_attempts=retry_max_attempts,
+                base_backoff_seconds=retry_base_backoff_seconds,
+                max_backoff_seconds=retry_max_backoff_seconds,
+                on_dead_letter=lambda candles: metrics.DEAD_LETTER_CANDLES.inc(
+                    len(candles)
+                ),
+            )
+            self._retrier.start()
+
+        # Flush policy and the uploads running in the background
+        self.max_rows = max_rows
+        self.max_latency_seconds = max_latency_seconds
+        self._batch_started_at: dict[tuple[str, int], float] = {}
+        self._uploader = BackgroundUploader(
+            self.write, max_in_flight=max_in_flight_batches
+        )
+
+        # Call constructor of the base class to make sure the batches are initialized
+        super().__init__()
+
+    def add(self, value, key, timestamp, headers, topic, partition, offset):
+        super().add(
+            value=value,
+            key=key,
+            timestamp=timestamp,
+            headers=headers,
+            topic=topic,
+            partition=partition,
+            offset=offset,
+        )
+
+        # Hand the batch over to the uploader once it is large or old enough
+        tp = (topic, partition)
+        started_at = self._batch_started_at.setdefault(tp, time.monotonic())
+        if (
+            self._batches[tp].size >= self.max_rows
+            or time.monotonic() - started_at >= self.max_latency_seconds
+        ):
+            self._submit(tp)
+
+    def flush(self, topic: str, partition: int):
+        """
+        Called before the offsets are committed: uploads the rest of the batch of the
+        partition and waits until all uploads are done. Raises if any of them failed,
+        so their offsets are not committed.
+        """
+        self._submit((topic, partition))
+        self._uploader.wait()
+
+    def on_paused(self, topic: str, partition: int):
+        super().on_paused(topic=topic, partition=partition)
+        self._batch_started_at.pop((topic, partition), None)
+
+    def _submit(self, tp: tuple[str, int]):
+        batch = self._batches.pop(tp, None)
+        self._batch_started_at.pop(tp, None)
+        if batch is not None and batch.size:
+            self._uploader.submit(batch)
+
+    def write(self, batch: SinkBatch):
+        """Uploads a batch to the backend (on the thread of the uploader)"""
+        # Only the latest version of every window of the batch is written
+        candles = collapse_candles([item.value for item in batch])
+        metrics.RECEIVED_CANDLES.inc(batch.size)
+        metrics.WRITTEN_CANDLES.inc(len(candles))
+        metrics.COLLAPSE_RATIO.set(batch.size / len(candles))
+
+        if self.spill_queue is None:
+            self.write_candles(candles)
+            return
+
+        if len(self.spill_queue):
+            # Keep the order behind the batches waiting for a retry
+            self._spill(candles)
+            return
+        try:
+            self.write_candles(candles)
+        except Exception as e:
+            logger.error(f'Failed to write {len(candles)} candles, spilling them: {e}')
+            self._spill(candles)
+
+    def write_candles(self, candles: list[dict]):
+        """Writes the candles to the backend and the online store, or raises"""
+        with self._write_lock:
+            self.write_table(candles_to_table(candles))
+
+            if self.online_store is not None:
+                self.online_store.upsert(candles)
+
+    def _spill(self, candles: list[dict]):
+        # Raises SpillQueueFull, which fails the checkpoint like before
+        self.spill_queue.append(candles)
+        metrics.SPILLED_BATCHES.inc()
+        self._retrier.notify()
+
+    @abc.abstractmethod
+    def write_table(self, table: pa.Table):
+        """Stores the candles of the table in the backend, or raises"""
+
+
+class HopsworksFeatureStoreSink(FeatureStoreSink):
+    """
+    Sink writing the candles to a Hopsworks feature group
     """
 
     def __init__(
@@ -21,6 +178,7 @@ class HopsworksFeatureStoreSink(BatchingSink):
         feature_group_primary_keys: list[str],
         feature_group_event_time: str,
         feature_group_materialization_interval_minutes: int = 5,
+        **kwargs,
     ):
         """
         Establish a connection to the Hopsworks Feature Store
@@ -53,12 +211,27 @@ class HopsworksFeatureStoreSink(BatchingSink):
         except Exception as e:
             logger.error(f'Failed to schedule materialization job: {e}')
 
-        # Call constructor of the base class to make sure the batches are initialized
-        super().__init__()
+        # Set up the batching and the background uploads (see `FeatureStoreSink`)
+        super().__init__(**kwargs)
 
-    def write(self, batch: SinkBatch):
-        # Transform the batch into a pandas DataFrame
-        data = [item.value for item in batch]
-        data = pd.DataFrame(data)
+    def write_table(self, table: pa.Table):
+        # The insert of the feature group only takes pandas
+        self._feature_group.insert(table_to_pandas(table))
+
+
+class ParquetFeatureStoreSink(FeatureStoreSink):
+    """
+    Sink writing the candles to a local, partitioned Parquet dataset (see
+    `ParquetCandleStore`), for local development without a Hopsworks login
+    """
+
+    def __init__(self, root: str, compact_min_files: int = 16, **kwargs):
+        self.root = root
+        self._store = ParquetCandleStore(root, compact_min_files=compact_min_files)
+        logger.info(f'Writing the candles to the Parquet dataset at {root}')
+
+        # Set up the batching and the background uploads (see `FeatureStoreSink`)
+        super().__init__(**kwargs)
 
-        self._feature_group.insert(data)
\ No newline at end of file
+    def write_table(self, table: pa.Table):
+        self._store.write(table)
@@ -0,0 +1,260 @@
+"""
+Durable local spill queue of the batches the sink could not write.
+
+The batches are appended as JSON lines to segment files (`segment-<seq>.jsonl`) of at
+most `segment_bytes` each, and read back in order from a cursor that is persisted after
+every acknowledged batch. A segment is deleted once it was read completely, and the
+segments together may hold at most `max_bytes`. A `SpillRetrier` writes the batches of
+the queue with exponential backoff, and moves a batch that still fails after
+`max_attempts` attempts to the dead-letter file (replayed with
+`replay_dead_letters.py`).
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+from loguru import logger
+
+
+class SpillQueueFull(Exception):
+    """The spill queue reached its maximum size on disk"""
+
+
+class SpillQueue:
+    def __init__(
+        self,
+        directory: str,
+        segment_bytes: int = 64 * 2**20,
+        max_bytes: int = 2**30,
+    ):
+        self.directory = Path(directory)
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._segments = sorted(
+            int(path.stem.split('-')[1])
+            for path in self.directory.glob('segment-*.jsonl')
+        )
+        self._cursor = self._read_cursor()
+        self._segments = [seq for seq in self._segments if seq >= self._cursor[0]]
+        if not self._segments:
+            self._segments = [self._cursor[0]]
+            self._segment_path(self._cursor[0]).touch()
+        self._truncate_partial_record()
+        self._pending = self._count_pending()
+        self._head: Optional[tuple[list[dict], int]] = None
+        if self._pending:
+            logger.warning(f'{self._pending} batches left in the spill queue')
+
+    def __len__(self) -> int:
+        return self._pending
+
+    def size_bytes(self) -> int:
+        with self._lock:
+            return self._size_bytes()
+
+    def _size_bytes(self) -> int:
+        return sum(self._segment_path(seq).stat().st_size for seq in self._segments)
+
+    def append(self, candles: list[dict]) -> None:
+        """Appends a batch, and syncs it to disk before returning"""
+        record = (json.dumps(candles) + '\n').encode()
+        with self._lock:
+            if self._size_bytes() + len(record) > self.max_bytes:
+                raise SpillQueueFull(
+                    f'Spill queue at {self.directory} is full ({self.max_bytes} bytes)'
+                )
+            tail = self._segments[-1]
+            if self._segment_path(tail).stat().st_size >= self.segment_bytes:
+                tail += 1
+                self._segments.append(tail)
+            with open(self._segment_path(tail), 'ab') as f:
+                f.write(record)
+                f.flush()
+                os.fsync(f.fileno())
+            self._pending += 1
+
+    def peek(self) -> Optional[list[dict]]:
+        """Returns the oldest batch without removing it, or None if the queue is empty"""
+        with self._lock:
+            if self._head is None:
+                self._head = self._read_head()
+            return self._head[0] if self._head is not None else None
+
+    def ack(self) -> None:
+        """Removes the batch returned by `peek`"""
+        with self._lock:
+            if self._head is None:
+                return
+            self._cursor = (self._cursor[0], self._head[1])
+            self._head = None
+            self._pending -= 1
+            self._write_cursor()
+
+    def _read_head(self) -> Optional[tuple[list[dict], int]]:
+        while True:
+            seq, offset = self._cursor
+            with open(self._segment_path(seq), 'rb') as f:
+                f.seek(offset)
+                line = f.readline()
+            if line.endswith(b'\n'):
+                return json.loads(line), offset + len(line)
+            if seq == self._segments[-1]:
+                return None
+
+            # Segment read completely: continue with the next one
+            self._segments.pop(0)
+            self._cursor = (self._segments[0], 0)
+            self._write_cursor()
+            self._segment_path(seq).unlink()
+
+    def _count_pending(self) -> int:
+        pending = 0
+        for seq in self._segments:
+            with open(self._segment_path(seq), 'rb') as f:
+                if seq == self._cursor[0]:
+                    f.seek(self._cursor[1])
+                pending += sum(1 for _ in f)
+        return pending
+
+    def _truncate_partial_record(self) -> None:
+        """Drops a record that was only partially written before a crash"""
+        path = self._segment_path(self._segments[-1])
+        data = path.read_bytes()
+        if data and not data.endswith(b'\n'):
+            with open(path, 'r+b') as f:
+                f.truncate(data.rfind(b'\n') + 1)
+
+    def _segment_path(self, seq: int) -> Path:
+        return self.directory / f'segment-{seq:010d}.jsonl'
+
+    def _read_cursor(self) -> tuple[int, int]:
+        path = self.directory / 'cursor.json'
+        if not path.exists():
+            return (self._segments[0] if self._segments else 0, 0)
+        cursor = json.loads(path.read_text())
+        return cursor['segment'], cursor['offset']
+
+    def _write_cursor(self) -> None:
+        path = self.directory / 'cursor.json'
+        tmp_path = path.with_suffix('.tmp')
+        tmp_path.write_text(
+            json.dumps({'segment': self._cursor[0], 'offset': self._cursor[1]})
+        )
+        os.replace(tmp_path, path)
+
+
+class DeadLetterFile:
+    """
+    Append-only JSON lines file of the batches that could not be written, with the
+    error of their last attempt.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def append(self, candles: list[dict], error: str) -> None:
+        record = {
+            'failed_at': datetime.now(tz=timezone.utc).isoformat(),
+            'error': error,
+            'candles': candles,
+        }
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def read(self) -> Iterator[dict]:
+        if not self.path.exists():
+            return
+        with open(self.path) as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+class SpillRetrier:
+    """
+    Writes the batches of the spill queue in order on a background thread. After a
+    failed attempt it waits with exponential backoff and full jitter (up to
+    `max_backoff_seconds`) before retrying the same batch, so the order of the
+    batches is kept. A batch that failed `max_attempts` times goes to the dead-letter
+    file.
+    """
+
+    def __init__(
+        self,
+        queue: SpillQueue,
+        write: Callable[[list[dict]], None],
+        dead_letter: DeadLetterFile,
+        max_attempts: int = 20,
+        base_backoff_seconds: float = 1.0,
+        max_backoff_seconds: float = 300.0,
+        on_dead_letter: Optional[Callable[[list[dict]], None]] = None,
+    ):
+        self.queue = queue
+        self.write = write
+        self.dead_letter = dead_letter
+        self.max_attempts = max_attempts
+        self.base_backoff_seconds = base_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.on_dead_letter = on_dead_letter
+        self._wakeup = threading.Event()
+
+    def start(self) -> None:
+        threading.Thread(target=self._run, name='spill-retrier', daemon=True).start()
+
+    def notify(self) -> None:
+        """Wakes up the retrier after a batch was appended to the queue"""
+        self._wakeup.set()
+
+    def _run(self) -> None:
+        failures = 0
+        while True:
+            candles = self.queue.peek()
+            if candles is None:
+                self._wakeup.wait(timeout=1.0)
+                self._wakeup.clear()
+                continue
+
+            try:
+                self.write(candles)
+            except Exception as e:
+                failures += 1
+                if failures >= self.max_attempts:
+                    logger.error(
+                        f'Moving a batch of {len(candles)} candles to the dead-letter '
+                        f'file after {failures} failed attempts: {e}'
+                    )
+                    self.dead_letter.append(candles, error=repr(e))
+                    if self.on_dead_letter is not None:
+                        self.on_dead_letter(candles)
+                    self.queue.ack()
+                    failures = 0
+                    continue
+
+                backoff = min(
+                    self.max_backoff_seconds,
+                    self.base_backoff_seconds * 2 ** (failures - 1),
+                )
+                delay = random.uniform(0, backoff)
+                logger.warning(
+                    f'Retry {failures}/{self.max_attempts} of a spilled batch failed '
+                    f'({e}), next attempt in {delay:.1f}s'
+                )
+                time.sleep(delay)
+                continue
+
+            self.queue.ack()
+            failures = 0
+            if not len(self.queue):
+                logger.info('Spill queue drained')
@@ -0,0 +1,57 @@
+import queue
+import threading
+from typing import Any, Callable
+
+from loguru import logger
+
+
+class BackgroundUploader:
+    """
+    Runs uploads on a background thread, in the order they were submitted.
+
+    At most `max_in_flight` uploads are queued or running at a time: `submit` blocks
+    while that many are pending, so a slow backend throttles the caller instead of
+    piling up batches in memory.
+    """
+
+    def __init__(
+        self,
+        upload: Callable[[Any], None],
+        max_in_flight: int = 2,
+        name: str = 'feature-store-uploader',
+    ):
+        self._upload = upload
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._queue: queue.Queue = queue.Queue()
+        self._errors: list[Exception] = []
+        self._lock = threading.Lock()
+        threading.Thread(target=self._run, name=name, daemon=True).start()
+
+    def submit(self, item: Any) -> None:
+        """Queues `item` for upload, blocking while `max_in_flight` are pending"""
+        self._slots.acquire()
+        self._queue.put(item)
+
+    def wait(self) -> None:
+        """
+        Blocks until all submitted uploads finished, and raises the first error of the
+        uploads that failed since the last call.
+        """
+        self._queue.join()
+        with self._lock:
+            errors, self._errors = self._errors, []
+        if errors:
+            raise errors[0]
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                self._upload(item)
+            except Exception as e:
+                logger.error(f'Upload failed: {e}')
+                with self._lock:
+                    self._errors.append(e)
+            finally:
+                self._slots.release()
+                self._queue.task_done()
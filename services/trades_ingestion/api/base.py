@@ -2,6 +2,7 @@ from abc import ABC, abstractmethod
 from typing import List
 
 from .trade import Trade
+from .trade_batch import TradeBatch
 
 
 class TradesAPI(ABC):
@@ -12,3 +13,25 @@ class TradesAPI(ABC):
     @abstractmethod
     def is_done(self) -> bool:
         pass
+
+    def get_trade_batch(self) -> TradeBatch:
+        """
+        Returns the next trades as a columnar TradeBatch. APIs with a faster decoding
+        path than building Trade objects override this.
+        """
+        return TradeBatch.from_trades(self.get_trades())
+
+    @property
+    def tracks_delivery(self) -> bool:
+        """
+        Whether the API checkpoints its progress and has to be told (with
+        `on_delivered`) once the trades it returned were delivered to Kafka.
+        """
+        return False
+
+    def on_delivered(self) -> None:
+        """
+        Called once every trade returned so far was delivered to Kafka.
+        """
+        # Nothing to do for APIs that do not track their progress
+        return None
@@ -0,0 +1,52 @@
+"""
+Columnar wire format for micro-batches of trades of a single pair.
+
+Layout (little-endian):
+    header  magic b'KTB2' | uint16 pair length | uint32 number of trades
+    pair    utf-8 encoded pair name
+    columns int64 timestamp_ms[n] | float64 price[n] | float64 volume[n] | int8 side[n]
+
+The side is 1 for buys, -1 for sells and 0 if unknown. Version 1 (b'KTB1') is the
+same layout without the side column.
+
+The candles service has the matching decoder (`candles/columnar.py`).
+"""
+
+import struct
+import sys
+from array import array
+from typing import List
+
+MAGIC = b'KTB2'
+HEADER = struct.Struct('<4sHI')
+SIDE_CODES = {'buy': 1, 'sell': -1}
+
+
+def _column_bytes(typecode: str, values: List) -> bytes:
+    column = array(typecode, values)
+    if sys.byteorder == 'big':
+        column.byteswap()
+    return column.tobytes()
+
+
+def encode_trades(
+    pair: str,
+    timestamps_ms: List[int],
+    prices: List[float],
+    volumes: List[float],
+    sides: List[int],
+) -> bytes:
+    """
+    Packs the trades of a single pair into one columnar message.
+    """
+    encoded_pair = pair.encode()
+    return b''.join(
+        (
+            HEADER.pack(MAGIC, len(encoded_pair), len(timestamps_ms)),
+            encoded_pair,
+            _column_bytes('q', timestamps_ms),
+            _column_bytes('d', prices),
+            _column_bytes('d', volumes),
+            _column_bytes('b', sides),
+        )
+    )
@@ -0,0 +1,148 @@
+from collections import deque
+from typing import Deque, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from loguru import logger
+
+from .base import TradesAPI
+from .gap_refill import GapRefiller
+from .trade import Trade
+from .trade_batch import TradeBatch
+
+
+class TradeGap(NamedTuple):
+    """
+    Trade ids missing from the stream of a pair: everything strictly between
+    `after_id` and `before_id`, traded between `since_ms` and `until_ms`.
+    """
+
+    pair: str
+    after_id: int
+    before_id: int
+    since_ms: int
+    until_ms: int
+
+    @property
+    def n_missing(self) -> int:
+        return self.before_id - self.after_id - 1
+
+
+class TradeDeduplicator:
+    """
+    Drops trades whose trade id was already seen and detects gaps in the (per pair
+    sequential) trade ids.
+
+    The ids seen are kept in a sliding window of the last `window_size` ids per pair, so
+    memory stays bounded no matter how long the service runs. Trades without an id are
+    passed through.
+    """
+
+    def __init__(self, window_size: int = 100_000):
+        self.window_size = window_size
+
+        self._seen: Dict[str, Set[int]] = {}
+        self._window: Dict[str, Deque[int]] = {}
+        # Highest trade id (and its timestamp) seen per pair
+        self._last: Dict[str, Tuple[int, int]] = {}
+
+        self.duplicates = 0
+        self.gaps = 0
+
+    def filter(self, batch: TradeBatch) -> Tuple[TradeBatch, List[TradeGap]]:
+        """
+        Returns the batch without the duplicate trades, together with the gaps it opened.
+        """
+        keep = []
+        gaps = []
+
+        for i, (pair, trade_id, timestamp_ms) in enumerate(
+            zip(batch.pairs, batch.trade_ids, batch.timestamps_ms, strict=True)
+        ):
+            if trade_id is None:
+                keep.append(i)
+                continue
+
+            seen = self._seen.get(pair)
+            if seen is None:
+                seen = self._seen[pair] = set()
+                self._window[pair] = deque()
+
+            if trade_id in seen:
+                self.duplicates += 1
+                continue
+
+            seen.add(trade_id)
+            window = self._window[pair]
+            window.append(trade_id)
+            if len(window) > self.window_size:
+                seen.discard(window.popleft())
+
+            # Only trades ahead of the highest id so far can open a gap, older ones
+            # are late arrivals (or the refill of a gap)
+            last = self._last.get(pair)
+            if last is None or trade_id > last[0]:
+                if last is not None and trade_id > last[0] + 1:
+                    gaps.append(
+                        TradeGap(pair, last[0], trade_id, last[1], timestamp_ms)
+                    )
+                self._last[pair] = (trade_id, timestamp_ms)
+
+            keep.append(i)
+
+        self.gaps += len(gaps)
+
+        if len(keep) == len(batch):
+            return batch, gaps
+        return batch.select(keep), gaps
+
+
+class DedupTradesAPI(TradesAPI):
+    """
+    Wraps a trades API and removes duplicate trades (e.g. after a reconnect) before
+    they are produced. Gaps in the trade ids are refilled from the REST API, if a
+    `refiller` is given.
+    """
+
+    def __init__(
+        self,
+        api: TradesAPI,
+        deduplicator: TradeDeduplicator,
+        refiller: Optional[GapRefiller] = None,
+    ):
+        self.api = api
+        self.deduplicator = deduplicator
+        self.refiller = refiller
+
+    def get_trades(self) -> List[Trade]:
+        return self.get_trade_batch().to_trades()
+
+    def get_trade_batch(self) -> TradeBatch:
+        batch = self.api.get_trade_batch()
+
+        # Refilled trades go through the deduplicator as well, in case the live
+        # stream delivered them after all
+        if self.refiller is not None:
+            refilled = self.refiller.drain()
+            if len(refilled):
+                batch.extend(refilled)
+
+        batch, gaps = self.deduplicator.filter(batch)
+
+        for gap in gaps:
+            logger.warning(
+                f'Missing {gap.n_missing} trades for pair {gap.pair} '
+                f'(trade ids {gap.after_id + 1} to {gap.before_id - 1})'
+            )
+            if self.refiller is not None:
+                self.refiller.submit(gap)
+
+        return batch
+
+    def is_done(self) -> bool:
+        return self.api.is_done()
+
+    @property
+    def tracks_delivery(self) -> bool:
+        return self.api.tracks_delivery
+
+    def on_delivered(self) -> None:
+        self.api.on_delivered()
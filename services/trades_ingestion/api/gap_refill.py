@@ -0,0 +1,97 @@
+import queue
+import threading
+from typing import TYPE_CHECKING, Optional
+
+from loguru import logger
+
+from .rate_limiter import TokenBucket
+from .rest import KrakenRestAPISinglePair
+from .trade_batch import TradeBatch
+
+if TYPE_CHECKING:
+    from .dedup import TradeGap
+
+
+class GapRefiller:
+    """
+    Fetches the trades of missing trade id ranges from the Kraken REST API in a
+    background thread, so the live stream is never blocked by a refill.
+
+    Gaps are requested by their time range and the response is narrowed down to the
+    missing trade ids. Gaps larger than `max_gap_trades` (e.g. after a long outage)
+    are left to a historical backfill, and at most `max_pending_gaps` gaps are queued.
+    """
+
+    def __init__(
+        self,
+        rate_limiter: Optional[TokenBucket] = None,
+        max_gap_trades: int = 10_000,
+        max_pending_gaps: int = 100,
+    ):
+        self.rate_limiter = rate_limiter or TokenBucket(rate_per_second=1.0)
+        self.max_gap_trades = max_gap_trades
+
+        self._gaps: queue.Queue = queue.Queue(maxsize=max_pending_gaps)
+        self._refilled: queue.Queue = queue.Queue()
+        self._worker = threading.Thread(
+            target=self._run, name='kraken-gap-refill', daemon=True
+        )
+        self._worker.start()
+
+    def submit(self, gap: 'TradeGap') -> None:
+        if gap.n_missing > self.max_gap_trades:
+            logger.warning(
+                f'Not refilling {gap.n_missing} missing trades for pair {gap.pair}, '
+                f'the gap is larger than {self.max_gap_trades} trades'
+            )
+            return
+
+        try:
+            self._gaps.put_nowait(gap)
+        except queue.Full:
+            logger.warning(
+                f'Too many pending gaps, dropping the gap of pair {gap.pair}'
+            )
+
+    def drain(self) -> TradeBatch:
+        """
+        Returns the trades refilled since the last call (without blocking).
+        """
+        batch = TradeBatch()
+        while True:
+            try:
+                batch.extend(self._refilled.get_nowait())
+            except queue.Empty:
+                return batch
+
+    def _run(self) -> None:
+        while True:
+            gap = self._gaps.get()
+            try:
+                self._refilled.put(self._refill(gap))
+            except Exception as e:
+                logger.error(f'Failed to refill the gap of pair {gap.pair}: {e}')
+
+    def _refill(self, gap: 'TradeGap') -> TradeBatch:
+        # Pad the time range by a millisecond, the trade ids do the exact cut
+        api = KrakenRestAPISinglePair(
+            pair=gap.pair,
+            last_n_days=0,
+            rate_limiter=self.rate_limiter,
+            since_ns=(gap.since_ms - 1) * 1_000_000,
+            until_ns=(gap.until_ms + 1) * 1_000_000,
+        )
+
+        trades = []
+        while not api.is_done():
+            trades += [
+                trade
+                for trade in api.get_trades()
+                if trade.trade_id is not None
+                and gap.after_id < trade.trade_id < gap.before_id
+            ]
+
+        logger.info(
+            f'Refilled {len(trades)} of {gap.n_missing} missing trades for pair {gap.pair}'
+        )
+        return TradeBatch.from_trades(trades)
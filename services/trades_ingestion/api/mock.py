@@ -1,44 +1,166 @@
-from datetime import datetime
-from time import sleep
-import random
-from typing import List
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
 
-from .trade import Trade
 from .base import TradesAPI
+from .trade import Trade
+from .trade_batch import TradeBatch
 
 
 class KrakenMockAPI(TradesAPI):
-    def __init__(self, pair: str):
-        self.pair = pair
+    """
+    Synthetic market that generates Kraken-like trades for many pairs.
+
+    Every call to `get_trade_batch` generates the trades of the next `interval_seconds`
+    of simulated time for all pairs at once with numpy:
+    - arrivals are a Poisson process with `trades_per_second` per pair, which switches
+      into bursts of `burst_multiplier` times the rate with `burst_probability`
+    - prices follow a geometric random walk per pair
+    - event timestamps are monotonic, unless out-of-order or duplicate trades are
+      injected on purpose
+    - trade ids are sequential per pair, duplicates repeat the id of the original
+
+    With `realtime=True` the simulated clock is paced to the wall clock, otherwise
+    trades are generated as fast as possible (for benchmarking downstream services).
+    """
+
+    def __init__(
+        self,
+        pairs: List[str],
+        trades_per_second: float = 10.0,
+        interval_seconds: float = 0.1,
+        start_prices: Optional[Dict[str, float]] = None,
+        volatility: float = 1e-4,
+        burst_probability: float = 0.05,
+        burst_multiplier: float = 10.0,
+        out_of_order_fraction: float = 0.0,
+        max_lateness_ms: int = 1_000,
+        duplicate_fraction: float = 0.0,
+        realtime: bool = True,
+        duration_seconds: Optional[float] = None,
+        seed: Optional[int] = None,
+    ):
+        self.pairs = pairs
+        self.trades_per_second = trades_per_second
+        self.interval_seconds = interval_seconds
+        self.volatility = volatility
+        self.burst_probability = burst_probability
+        self.burst_multiplier = burst_multiplier
+        self.out_of_order_fraction = out_of_order_fraction
+        self.max_lateness_ms = max_lateness_ms
+        self.duplicate_fraction = duplicate_fraction
+        self.realtime = realtime
+        self.duration_seconds = duration_seconds
+
+        self._rng = np.random.default_rng(seed)
+        self._pairs = np.array(pairs, dtype=object)
+        self._prices = np.array(
+            [(start_prices or {}).get(pair, 100.0) for pair in pairs], dtype=np.float64
+        )
+
+        # Next trade id per pair (Kraken trade ids are sequential per pair)
+        self._next_trade_ids = np.ones(len(pairs), dtype=np.int64)
+
+        # Simulated clock (in ms since epoch), starts now
+        self._start_ms = time.time_ns() // 1_000_000
+        self._clock_ms = self._start_ms
+        self._wall_start = time.monotonic()
 
     def get_trades(self) -> List[Trade]:
         """
-        Returns a list of mock trades to resemble the Kraken API.
+        Returns the mock trades of the next interval as Trade objects.
         """
-        
-        # Mock trades
-        mock_trades = [
-            Trade(
-                pair=self.pair,
-                price=random.randint(1, 100) + random.uniform(0, 1),
-                volume=random.randint(1, 100),
-                timestamp=datetime(2023, 9, 25, 7, 49, 37, 708706),
-                timestamp_ms=172719357708706,
-            ),
-            Trade(
-                pair=self.pair,
-                price=random.randint(1, 100) + random.uniform(0, 1),
-                volume=random.randint(1, 100),
-                timestamp=datetime(2023, 9, 25, 7, 49, 37, 708706),
-                timestamp_ms=172719357708706,
-            ),
-        ]
+        return self.get_trade_batch().to_trades()
+
+    def get_trade_batch(self) -> TradeBatch:
+        """
+        Generates the trades of the next interval for all pairs as a TradeBatch.
+        """
+        interval_ms = int(self.interval_seconds * 1000)
+        if self.realtime:
+            self._wait_for_wall_clock(self._clock_ms + interval_ms)
+
+        rng = self._rng
+        n_pairs = len(self.pairs)
+
+        # Number of trades per pair, some pairs are in a burst during this interval
+        rates = np.full(n_pairs, self.trades_per_second * self.interval_seconds)
+        rates[rng.random(n_pairs) < self.burst_probability] *= self.burst_multiplier
+        counts = rng.poisson(rates)
+        n = int(counts.sum())
+
+        # Trades grouped by pair, each group sorted by its arrival time in the interval
+        pair_index = np.repeat(np.arange(n_pairs), counts)
+        offsets_ms = rng.integers(0, interval_ms, size=n)
+        grouped = np.lexsort((offsets_ms, pair_index))
+        offsets_ms = offsets_ms[grouped]
+
+        # Geometric random walk per pair: cumulative log returns within each group
+        cumulative = np.cumsum(rng.normal(0.0, self.volatility, size=n))
+        ends = np.cumsum(counts)
+        group_base = np.concatenate([[0.0], cumulative])[ends - counts]
+        cumulative -= np.repeat(group_base, counts)
+        prices = self._prices[pair_index] * np.exp(cumulative)
+
+        # The next interval continues from the last price of every pair
+        traded = counts > 0
+        self._prices[traded] = prices[ends[traded] - 1]
 
-        # Simulate the API call taking some time
-        sleep(1)
+        # Sequential trade ids per pair, in order of arrival
+        trade_ids = self._next_trade_ids[pair_index] + (
+            np.arange(n) - np.repeat(ends - counts, counts)
+        )
+        self._next_trade_ids += counts
+
+        # Sort all trades by arrival time, so the event timestamps are monotonic
+        order = np.argsort(offsets_ms, kind='stable')
+        pair_index = pair_index[order]
+        trade_ids = trade_ids[order]
+        timestamps_ms = self._clock_ms + offsets_ms[order]
+        prices = np.round(prices[order], 5)
+        volumes = np.round(rng.lognormal(mean=-3.0, sigma=1.0, size=n), 8)
+        is_buy = rng.random(n) < 0.5
+
+        # Optional out-of-order and duplicate trades
+        if self.out_of_order_fraction > 0 and n:
+            late = rng.random(n) < self.out_of_order_fraction
+            timestamps_ms[late] -= rng.integers(
+                1, self.max_lateness_ms + 1, size=int(late.sum())
+            )
+        if self.duplicate_fraction > 0 and n:
+            duplicates = np.flatnonzero(rng.random(n) < self.duplicate_fraction)
+            keep = np.sort(np.concatenate([np.arange(n), duplicates]))
+            pair_index, timestamps_ms = pair_index[keep], timestamps_ms[keep]
+            trade_ids, is_buy = trade_ids[keep], is_buy[keep]
+            prices, volumes = prices[keep], volumes[keep]
+
+        self._clock_ms += interval_ms
+
+        batch = TradeBatch()
+        batch.pairs = self._pairs[pair_index].tolist()
+        batch.prices = prices.tolist()
+        batch.volumes = volumes.tolist()
+        batch.timestamps_ms = timestamps_ms.tolist()
+        batch.trade_ids = trade_ids.tolist()
+        batch.sides = np.where(is_buy, 'buy', 'sell').tolist()
+        batch.timestamps = [
+            timestamp + 'Z'
+            for timestamp in np.datetime_as_string(
+                timestamps_ms.astype('datetime64[ms]'), unit='us'
+            ).tolist()
+        ]
+        return batch
 
-        return mock_trades
-    
     def is_done(self) -> bool:
-        # The mock API is never done, unless stopped manually
-        return False
+        # The mock API is never done, unless stopped manually or a duration is set
+        if self.duration_seconds is None:
+            return False
+        return self._clock_ms - self._start_ms >= self.duration_seconds * 1000
+
+    def _wait_for_wall_clock(self, clock_ms: int) -> None:
+        wait_seconds = (clock_ms - self._start_ms) / 1000 - (
+            time.monotonic() - self._wall_start
+        )
+        if wait_seconds > 0:
+            time.sleep(wait_seconds)
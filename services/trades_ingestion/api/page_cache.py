@@ -0,0 +1,145 @@
+import bisect
+import gzip
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+from loguru import logger
+
+
+class PageCache:
+    """
+    On-disk cache of Kraken REST trade pages.
+
+    Every page is stored as gzip compressed JSON under
+    `{directory}/{pair}/{since_ns}-{last_ns}.json.gz`. Kraken's trade history does not
+    change, so a page holds all the trades in (since_ns, last_ns] for good, and any
+    cursor inside that range can be served from it (not only the exact `since` the page
+    was requested with).
+    """
+
+    def __init__(self, directory: Union[str, Path]):
+        self.directory = Path(directory)
+        # Sorted (since_ns, last_ns) ranges of the cached pages per pair
+        self._ranges: Dict[str, List[tuple]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, pair: str, since_ns: int) -> Optional[dict]:
+        """
+        Returns the cached page covering `since_ns` as {'trades': [...], 'last': ...}, or
+        None on a cache miss.
+        """
+        with self._lock:
+            ranges = self._load_ranges(pair)
+            i = bisect.bisect_right(ranges, (since_ns, float('inf'))) - 1
+            if i < 0 or not ranges[i][0] <= since_ns < ranges[i][1]:
+                return None
+            page_since_ns, page_last_ns = ranges[i]
+
+        path = self._pair_dir(pair) / f'{page_since_ns}-{page_last_ns}.json.gz'
+        try:
+            with gzip.open(path, 'rt') as f:
+                trades = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f'Ignoring unreadable cached page {path}: {e}')
+            return None
+
+        # Only keep the trades after the cursor, if we start in the middle of the page.
+        # The trade times are float seconds, hence the 1us tolerance for rounding errors
+        if since_ns != page_since_ns:
+            trades = [
+                trade
+                for trade in trades
+                if int(float(trade[2]) * 1e9) > since_ns + 1_000
+            ]
+
+        return {'trades': trades, 'last': str(page_last_ns)}
+
+    def put(self, pair: str, since_ns: int, last_ns: int, trades: List[list]) -> None:
+        if last_ns <= since_ns:
+            return
+
+        pair_dir = self._pair_dir(pair)
+        pair_dir.mkdir(parents=True, exist_ok=True)
+
+        # Write to a temporary file first, so a crash never leaves a partial page
+        path = pair_dir / f'{since_ns}-{last_ns}.json.gz'
+        tmp_path = path.with_suffix('.tmp')
+        with gzip.open(tmp_path, 'wt') as f:
+            json.dump(trades, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            bisect.insort(self._load_ranges(pair), (since_ns, last_ns))
+
+    def _pair_dir(self, pair: str) -> Path:
+        return self.directory / pair.replace('/', '-')
+
+    def _load_ranges(self, pair: str) -> List[tuple]:
+        if pair not in self._ranges:
+            ranges = []
+            pair_dir = self._pair_dir(pair)
+            if pair_dir.exists():
+                for path in pair_dir.glob('*.json.gz'):
+                    since_ns, last_ns = path.name.removesuffix('.json.gz').split('-')
+                    ranges.append((int(since_ns), int(last_ns)))
+            self._ranges[pair] = sorted(ranges)
+        return self._ranges[pair]
+
+
+class BackfillCheckpoint:
+    """
+    Per-pair cursor of a backfill, persisted as JSON, so a restarted backfill resumes
+    where it stopped instead of starting over.
+
+    Only unfinished backfills of the same range (`last_n_days`) are resumed. Pairs that
+    were completed, or that were backfilled over another range, start a fresh backfill
+    (the page cache still serves the pages fetched before).
+
+    E.g. content:
+        {"BTC/USD": {"cursor_ns": 1731155565415951500, "until_ns": ..., "done": false,
+                     "last_n_days": 30}}
+    """
+
+    def __init__(self, path: Union[str, Path], last_n_days: int):
+        self.path = Path(path)
+        self.last_n_days = last_n_days
+        self._state: Dict[str, dict] = {}
+
+        if self.path.exists():
+            with open(self.path) as f:
+                stored = json.load(f)
+            for pair, state in stored.items():
+                if state.get('done'):
+                    logger.info(f'Backfill of {pair} was completed, starting a new one')
+                elif state.get('last_n_days') != last_n_days:
+                    logger.info(
+                        f'Backfill of {pair} was over {state.get("last_n_days")} days, '
+                        f'starting a new one over {last_n_days} days'
+                    )
+                else:
+                    logger.info(
+                        f'Resuming backfill of {pair} from checkpoint {self.path} '
+                        f'at cursor {state["cursor_ns"]}'
+                    )
+                    self._state[pair] = state
+
+    def get(self, pair: str) -> Optional[dict]:
+        return self._state.get(pair)
+
+    def save(self, pair: str, cursor_ns: int, until_ns: int, done: bool) -> None:
+        self._state[pair] = {
+            'cursor_ns': cursor_ns,
+            'until_ns': until_ns,
+            'done': done,
+            'last_n_days': self.last_n_days,
+        }
+
+        # Atomic replace, so a crash never leaves a corrupt checkpoint
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self._state, f)
+        os.replace(tmp_path, self.path)
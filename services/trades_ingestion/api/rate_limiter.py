@@ -0,0 +1,44 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by all the clients hitting the same API.
+
+    Tokens are refilled continuously at `rate_per_second` up to `capacity`. Every
+    request takes one token and blocks until one is available.
+    """
+
+    def __init__(self, rate_per_second: float, capacity: int = 1):
+        if rate_per_second <= 0:
+            raise ValueError(f'rate_per_second must be positive, got {rate_per_second}')
+
+        self.rate_per_second = rate_per_second
+        self.capacity = max(1, capacity)
+
+        self._tokens = float(self.capacity)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """
+        Blocks until a token is available and takes it.
+        """
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_seconds = (1 - self._tokens) / self.rate_per_second
+
+            time.sleep(wait_seconds)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity,
+            self._tokens + (now - self._last_refill) * self.rate_per_second,
+        )
+        self._last_refill = now
@@ -0,0 +1,202 @@
+"""
+Recording of raw Kraken Websocket frames.
+
+A recording is a directory of gzip compressed segments plus a seek index:
+    segment-000000.frames.gz   records of (uint64 receive time in ns | uint32 length | frame)
+    segment-000001.frames.gz
+    index.jsonl                one line per finished segment with its time range
+
+The index lets a replay jump straight to the segment that contains a given time, so
+seeking only has to decompress a single segment.
+"""
+
+import atexit
+import gzip
+import json
+import struct
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple, Union
+
+from loguru import logger
+
+from .base import TradesAPI
+from .trade import Trade
+from .trade_batch import TradeBatch
+from .websocket import KrakenWebsocketAPI
+
+RECORD_HEADER = struct.Struct('<QI')
+INDEX_FILE = 'index.jsonl'
+
+
+def read_index(directory: Union[str, Path]) -> List[dict]:
+    """
+    Returns the index entries of a recording, ordered by time (the index is in the
+    order the segments were closed, and a segment indexed after a crash comes last).
+    """
+    index_path = Path(directory) / INDEX_FILE
+    if not index_path.exists():
+        return []
+
+    with open(index_path) as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    return sorted(entries, key=lambda entry: entry['first_ns'])
+
+
+def read_segment(path: Union[str, Path]) -> Iterator[Tuple[int, str]]:
+    """
+    Yields the (receive time in ns, frame) records of a segment. A truncated last
+    record (e.g. after a crash) ends the segment.
+    """
+    with gzip.open(path, 'rb') as f:
+        while True:
+            try:
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    return
+                received_ns, length = RECORD_HEADER.unpack(header)
+                frame = f.read(length)
+            except EOFError:
+                # The gzip stream of a segment that was open during a crash has no end
+                logger.warning(f'Segment {path} ends without a gzip end marker')
+                return
+            if len(frame) < length:
+                logger.warning(f'Truncated record at the end of segment {path}')
+                return
+            yield received_ns, frame.decode()
+
+
+class FrameRecorder:
+    """
+    Appends raw frames to time based segments of a recording directory.
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, Path],
+        segment_seconds: int = 300,
+        compression_level: int = 6,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_seconds = segment_seconds
+        self.compression_level = compression_level
+
+        # Continue numbering after the segments of a previous run, including a segment
+        # that was still open when it crashed (so it has no index line yet)
+        segments = sorted(self.directory.glob('segment-*.frames.gz'))
+        self._next_segment = (
+            int(segments[-1].name.split('.')[0].split('-')[1]) + 1 if segments else 0
+        )
+        self._index_unindexed_segments(segments)
+
+        self._file: Optional[gzip.GzipFile] = None
+        self._segment_name: Optional[str] = None
+        self._first_ns: Optional[int] = None
+        self._last_ns: Optional[int] = None
+        self._n_frames = 0
+
+        # Make sure the open segment gets into the index on a normal shutdown
+        atexit.register(self.close)
+
+    def write(self, received_ns: int, frame: str) -> None:
+        if self._file is not None and (
+            received_ns - self._first_ns >= self.segment_seconds * 1_000_000_000
+        ):
+            self._close_segment()
+
+        if self._file is None:
+            self._open_segment(received_ns)
+
+        data = frame.encode()
+        self._file.write(RECORD_HEADER.pack(received_ns, len(data)))
+        self._file.write(data)
+        self._last_ns = received_ns
+        self._n_frames += 1
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._close_segment()
+
+    def _open_segment(self, received_ns: int) -> None:
+        self._segment_name = f'segment-{self._next_segment:06d}.frames.gz'
+        self._next_segment += 1
+        self._file = gzip.open(
+            self.directory / self._segment_name,
+            'wb',
+            compresslevel=self.compression_level,
+        )
+        self._first_ns = received_ns
+        self._n_frames = 0
+
+    def _close_segment(self) -> None:
+        self._file.close()
+        self._file = None
+        self._write_index_entry(
+            self._segment_name, self._first_ns, self._last_ns, self._n_frames
+        )
+        logger.info(f'Closed segment {self._segment_name} with {self._n_frames} frames')
+
+    def _index_unindexed_segments(self, segments: List[Path]) -> None:
+        """
+        Adds the index line of a segment a previous run did not close, e.g. after a
+        crash, so its frames (up to a truncated last record) can still be replayed.
+        """
+        indexed = {entry['segment'] for entry in read_index(self.directory)}
+        for path in segments:
+            if path.name in indexed:
+                continue
+            first_ns, last_ns, n_frames = None, None, 0
+            for received_ns, _ in read_segment(path):
+                if first_ns is None:
+                    first_ns = received_ns
+                last_ns = received_ns
+                n_frames += 1
+            if n_frames:
+                self._write_index_entry(path.name, first_ns, last_ns, n_frames)
+                logger.info(f'Indexed segment {path.name} with {n_frames} frames')
+
+    def _write_index_entry(
+        self, segment: str, first_ns: int, last_ns: int, n_frames: int
+    ) -> None:
+        with open(self.directory / INDEX_FILE, 'a') as f:
+            f.write(
+                json.dumps(
+                    {
+                        'segment': segment,
+                        'first_ns': first_ns,
+                        'last_ns': last_ns,
+                        'n_frames': n_frames,
+                    }
+                )
+                + '\n'
+            )
+
+
+class RecordingTradesAPI(TradesAPI):
+    """
+    Wraps a websocket API (anything with `get_frames`) and records every raw frame it
+    receives before decoding it.
+    """
+
+    def __init__(self, api: TradesAPI, recorder: FrameRecorder):
+        self.api = api
+        self.recorder = recorder
+
+    def get_trades(self) -> List[Trade]:
+        trades = []
+        for frame in self._record_frames():
+            trades += KrakenWebsocketAPI.parse_trades_message(frame)
+        return trades
+
+    def get_trade_batch(self) -> TradeBatch:
+        return TradeBatch.from_kraken_websocket_messages(self._record_frames())
+
+    def is_done(self) -> bool:
+        return self.api.is_done()
+
+    def _record_frames(self) -> List[str]:
+        frames = []
+        for received_ns, frame in self.api.get_frames():
+            self.recorder.write(received_ns, frame)
+            frames.append(frame)
+        return frames
@@ -0,0 +1,107 @@
+import time
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple, Union
+
+from .base import TradesAPI
+from .recording import read_index, read_segment
+from .trade import Trade
+from .trade_batch import TradeBatch
+from .websocket import KrakenWebsocketAPI
+
+
+class ReplayTradesAPI(TradesAPI):
+    """
+    Plays a recording back as a TradesAPI.
+
+    `speed` is the playback speed relative to the recorded receive times (1.0 = real
+    time, 10.0 = ten times faster, None = as fast as possible). `seek` jumps to a time
+    offset from the start of the recording.
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, Path],
+        speed: Optional[float] = 1.0,
+        start_offset_seconds: float = 0.0,
+        max_frames_per_batch: int = 1_000,
+    ):
+        self.directory = Path(directory)
+        self.speed = speed
+        self.max_frames_per_batch = max_frames_per_batch
+
+        self._index = read_index(self.directory)
+        if not self._index:
+            raise ValueError(f'No recording found in {self.directory}')
+        self._start_ns = self._index[0]['first_ns']
+
+        self.seek(start_offset_seconds)
+
+    def seek(self, offset_seconds: float) -> None:
+        """
+        Continues the replay at `offset_seconds` after the start of the recording.
+        """
+        target_ns = self._start_ns + int(offset_seconds * 1_000_000_000)
+
+        # Only the segments that end at or after the target are relevant
+        segments = [entry for entry in self._index if entry['last_ns'] >= target_ns]
+        self._records = self._iter_records(segments, target_ns)
+        self._next_record = next(self._records, None)
+
+        # The replay clock starts now, at the target time
+        self._clock_start_ns = target_ns
+        self._wall_start = time.monotonic()
+
+    def get_frames(self) -> List[Tuple[int, str]]:
+        """
+        Returns the next recorded frames that are due according to the playback speed,
+        waiting for the first one if necessary.
+        """
+        if self._next_record is None:
+            return []
+
+        self._wait_until_due(self._next_record[0])
+
+        frames = []
+        while self._next_record is not None and len(frames) < self.max_frames_per_batch:
+            if frames and not self._is_due(self._next_record[0]):
+                break
+            frames.append(self._next_record)
+            self._next_record = next(self._records, None)
+
+        return frames
+
+    def get_trades(self) -> List[Trade]:
+        trades = []
+        for _, frame in self.get_frames():
+            trades += KrakenWebsocketAPI.parse_trades_message(frame)
+        return trades
+
+    def get_trade_batch(self) -> TradeBatch:
+        return TradeBatch.from_kraken_websocket_messages(
+            frame for _, frame in self.get_frames()
+        )
+
+    def is_done(self) -> bool:
+        return self._next_record is None
+
+    def _iter_records(
+        self, segments: List[dict], target_ns: int
+    ) -> Iterator[Tuple[int, str]]:
+        for entry in segments:
+            for received_ns, frame in read_segment(self.directory / entry['segment']):
+                if received_ns >= target_ns:
+                    yield received_ns, frame
+
+    def _seconds_until_due(self, received_ns: int) -> float:
+        if not self.speed:
+            return 0.0
+        replay_seconds = (received_ns - self._clock_start_ns) / 1e9 / self.speed
+        return replay_seconds - (time.monotonic() - self._wall_start)
+
+    def _is_due(self, received_ns: int) -> bool:
+        return self._seconds_until_due(received_ns) <= 0
+
+    def _wait_until_due(self, received_ns: int) -> None:
+        wait_seconds = self._seconds_until_due(received_ns)
+        if wait_seconds > 0:
+            time.sleep(wait_seconds)
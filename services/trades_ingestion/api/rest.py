@@ -1,46 +1,205 @@
+import heapq
 import json
+import queue
+import threading
 import time
-from typing import List
+from collections import deque
+from typing import Deque, Dict, List, Optional
 
 import requests
 from loguru import logger
 
 from .base import TradesAPI
+from .page_cache import BackfillCheckpoint, PageCache
+from .rate_limiter import TokenBucket
 from .trade import Trade
 
 
 class KrakenRestAPI(TradesAPI):
-    def __init__(self, pairs: List[str], last_n_days: int):
+    def __init__(
+        self,
+        pairs: List[str],
+        last_n_days: int,
+        requests_per_second: float = 1.0,
+        burst: int = 1,
+        max_buffered_pages: int = 10,
+        page_cache: Optional[PageCache] = None,
+        checkpoint: Optional[BackfillCheckpoint] = None,
+    ):
         self.pairs = pairs
         self.last_n_days = last_n_days
+        self.checkpoint = checkpoint
+
+        # One token bucket shared by all pairs, so the backfill as a whole respects
+        # the Kraken rate limit no matter how many pairs are fetched concurrently
+        self._rate_limiter = TokenBucket(rate_per_second=requests_per_second, capacity=burst)
+
+        # Resume every pair from its checkpoint, if there is one
+        states = {
+            pair: (checkpoint.get(pair) if checkpoint else None) or {} for pair in pairs
+        }
 
         self.apis = [
-            KrakenRestAPISinglePair(pair=pair, last_n_days=last_n_days)
+            KrakenRestAPISinglePair(
+                pair=pair,
+                last_n_days=last_n_days,
+                rate_limiter=self._rate_limiter,
+                page_cache=page_cache,
+                since_ns=states[pair].get('cursor_ns'),
+                until_ns=states[pair].get('until_ns'),
+            )
             for pair in self.pairs
         ]
+        self._apis_by_pair = {api.pair: api for api in self.apis}
+
+        # Pages fetched by the background workers (bounded, so a fast pair cannot
+        # run arbitrarily far ahead of a slow one)
+        self._pages: Dict[str, queue.Queue] = {
+            api.pair: queue.Queue(maxsize=max_buffered_pages) for api in self.apis
+        }
+        # Trades received but not yet emitted, sorted by timestamp per pair
+        self._buffers: Dict[str, Deque[Trade]] = {api.pair: deque() for api in self.apis}
+        # Pairs whose worker has fetched its last page (or that were already completed
+        # according to the checkpoint)
+        self._exhausted: set = {pair for pair in pairs if states[pair].get('done')}
+        self._workers: List[threading.Thread] = []
+
+        # Per pair: number of trades received and emitted so far, and the
+        # (received count, cursor) at the end of every page not fully emitted yet.
+        # Once the emitted trades were delivered (`on_delivered`), a pair is
+        # checkpointed at the cursor of its last fully emitted page.
+        self._received: Dict[str, int] = dict.fromkeys(pairs, 0)
+        self._emitted: Dict[str, int] = dict.fromkeys(pairs, 0)
+        self._page_ends: Dict[str, Deque[tuple]] = {pair: deque() for pair in pairs}
 
     def get_trades(self) -> List[Trade]:
         """
-        Get trades for each pair, sort them by timestamp and return the trades.
+        Get trades for all pairs (fetched concurrently in the background) and return
+        them merged by timestamp.
+
+        Only trades up to the watermark, i.e. the smallest last-fetched timestamp over
+        all pairs still being fetched, are returned. That way the output is globally
+        sorted across calls, not just within a single call.
         """
-        trades = []
-        for api in self.apis:
-            if not api.is_done():
-                trades += api.get_trades()
+        self._start_workers()
 
-        # Sort the trades by timestamp
-        trades.sort(key=lambda x: x.timestamp_ms)
-        
-        return trades
+        # Every pair still being fetched needs at least one buffered trade, otherwise
+        # we cannot tell how far it is safe to advance the merge
+        for pair, buffer in self._buffers.items():
+            while not buffer and pair not in self._exhausted:
+                self._receive_page(pair)
+
+        pending = [
+            buffer[-1].timestamp_ms
+            for pair, buffer in self._buffers.items()
+            if pair not in self._exhausted
+        ]
+        watermark = min(pending) if pending else float('inf')
+
+        # Cut every pair's buffer at the watermark into an already sorted run
+        runs = []
+        for pair, buffer in self._buffers.items():
+            run = []
+            while buffer and buffer[0].timestamp_ms <= watermark:
+                run.append(buffer.popleft())
+            if run:
+                runs.append(run)
+            self._emitted[pair] += len(run)
+
+        # Streaming k-way merge of the sorted runs
+        return list(heapq.merge(*runs, key=lambda trade: trade.timestamp_ms))
 
     def is_done(self) -> bool:
         """
-        We are done when all the APIs are done.
+        We are done when all the APIs are done and every fetched trade was returned.
+        """
+        return len(self._exhausted) == len(self.apis) and not any(self._buffers.values())
+
+    @property
+    def tracks_delivery(self) -> bool:
+        return self.checkpoint is not None
+
+    def on_delivered(self) -> None:
+        """
+        Every trade emitted so far is on the topic, so the checkpoints can move past
+        them. Checkpointing on emission instead would skip the trades still waiting in
+        the producer queue if the process crashed.
         """
+        for pair in self.pairs:
+            self._update_checkpoint(pair)
+
+    def _start_workers(self) -> None:
+        if self._workers:
+            return
+
         for api in self.apis:
-            if not api.is_done():
-                return False
-        return True
+            if api.pair in self._exhausted:
+                continue
+            worker = threading.Thread(
+                target=self._fetch_pages,
+                args=(api,),
+                name=f'kraken-rest-{api.pair}',
+                daemon=True,
+            )
+            worker.start()
+            self._workers.append(worker)
+
+    def _fetch_pages(self, api: 'KrakenRestAPISinglePair') -> None:
+        """
+        Worker loop: fetches the pages of a single pair (together with the cursor of
+        the next page) until it is done. A `None` marks the end of the pair, an
+        exception is forwarded to the consumer.
+        """
+        pages = self._pages[api.pair]
+        try:
+            while not api.is_done():
+                trades = api.get_trades()
+                pages.put((trades, api.cursor_ns))
+        except Exception as e:
+            pages.put(e)
+            return
+        pages.put(None)
+
+    def _receive_page(self, pair: str) -> None:
+        page = self._pages[pair].get()
+
+        if page is None:
+            self._exhausted.add(pair)
+        elif isinstance(page, Exception):
+            logger.error(f'Failed to backfill trades for pair {pair}: {page}')
+            raise page
+        else:
+            trades, cursor_ns = page
+            self._buffers[pair].extend(trades)
+            self._received[pair] += len(trades)
+            self._page_ends[pair].append((self._received[pair], cursor_ns))
+
+    def _update_checkpoint(self, pair: str) -> None:
+        """
+        Checkpoints the cursor after the last page whose trades were all emitted (and
+        delivered).
+        """
+        if self.checkpoint is None:
+            return
+
+        page_ends = self._page_ends[pair]
+        cursor_ns = None
+        while page_ends and page_ends[0][0] <= self._emitted[pair]:
+            _, cursor_ns = page_ends.popleft()
+
+        done = pair in self._exhausted and not self._buffers[pair]
+        if cursor_ns is None and not done:
+            return
+        if done and (self.checkpoint.get(pair) or {}).get('done'):
+            return
+
+        api = self._apis_by_pair[pair]
+        self.checkpoint.save(
+            pair,
+            cursor_ns=api.cursor_ns if done else cursor_ns,
+            until_ns=api.until_ns,
+            done=done,
+        )
 
 
 class KrakenRestAPISinglePair(TradesAPI):
@@ -50,49 +209,66 @@ class KrakenRestAPISinglePair(TradesAPI):
         self,
         pair: str,
         last_n_days: int,
+        rate_limiter: Optional[TokenBucket] = None,
+        page_cache: Optional[PageCache] = None,
+        since_ns: Optional[int] = None,
+        until_ns: Optional[int] = None,
+        max_retries: int = 5,
+        backoff_seconds: float = 1.0,
     ):
         self.pair = pair
         self.last_n_days = last_n_days
+        self.rate_limiter = rate_limiter
+        self.page_cache = page_cache
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
         self._is_done = False
 
         # Gets current Unix timestamp in seconds (the Kraken API expects the timestamp in seconds)
         self.since_timestamp_s = int(time.time()) - self.last_n_days * 24 * 60 * 60  #days * hours * minutes * seconds
 
+        # Pagination cursor. Kraken accepts `since` in seconds or nanoseconds and
+        # returns the cursor of the next page as `last` (in nanoseconds). A resumed
+        # backfill passes the cursor (and end) of its checkpoint.
+        self._since_ns = since_ns or self.since_timestamp_s * 1_000_000_000
+        # Trades after this point are left to the live service
+        self._until_ns = until_ns or time.time_ns()
+
         logger.info(
             f'Getting trades for pair {self.pair} for the last {self.last_n_days} days (in timestamp_seconds = {self.since_timestamp_s})'
         )
 
     def get_trades(self) -> List[Trade]:
         """
-        Sends a request to the Kraken API and returns the trades for the pair.
+        Sends a request to the Kraken API and returns the next page of trades for the pair.
         """
-        headers = {'Accept': 'application/json'}
-        params = {
-            'pair': self.pair,
-            'since': self.since_timestamp_s,
-        }
+        page = (
+            self.page_cache.get(self.pair, self._since_ns) if self.page_cache else None
+        )
 
-        # Send the request
-        try:
-            response = requests.request('GET', self.URL, headers=headers, params=params)
-        except requests.exceptions.RequestException as e:
-            # NOTE: One should check API rate limits and handle them properly
-            logger.error(f'Failed to get trades: {e}')
-            raise
+        if page is None:
+            data = self._request_page()
 
-        # Parse response object as json
-        try:
-            data = json.loads(response.text)
-        except json.JSONDecodeError as e:
-            logger.error(f'Failed to parse response as json: {e}')
-            return []
+            # Unpack trades and the cursor of the next page from the response
+            try:
+                page = {
+                    'trades': data['result'][self.pair],
+                    'last': data['result']['last'],
+                }
+            except KeyError as e:
+                logger.error(f'Failed to get trades for pair {self.pair}: {e}')
+                self._is_done = True
+                return []
 
-        # Unpack trades from the response for the given pair
-        try:
-            trades = data['result'][self.pair]
-        except KeyError as e:
-            logger.error(f'Failed to get trades for pair {self.pair}: {e}')
-            return []
+            if self.page_cache is not None:
+                self.page_cache.put(
+                    self.pair, self._since_ns, int(page['last']), page['trades']
+                )
+
+        trades = page['trades']
+        last_ns = int(page['last'])
+
+        until_ms = self._until_ns // 1_000_000
 
         # Convert the trades retrieved from the API to custom Trade objects
         trades = [
@@ -101,14 +277,68 @@ class KrakenRestAPISinglePair(TradesAPI):
                 price=trade[0],
                 volume=trade[1],
                 timestamp_sec=trade[2],
+                trade_id=trade[6] if len(trade) > 6 else None,
+                side=trade[3] if len(trade) > 3 else None,
             )
             for trade in trades
         ]
-        
-        # Set is_done to finished
-        self._is_done = True
+        trades = [trade for trade in trades if trade.timestamp_ms <= until_ms]
+
+        # We are done once the cursor caught up with the moment the backfill started
+        # (or it stopped moving, which means there are no newer trades)
+        if not trades or last_ns >= self._until_ns or last_ns <= self._since_ns:
+            self._is_done = True
+        self._since_ns = last_ns
+
+        logger.info(
+            f'Fetched {len(trades)} trades for pair {self.pair} (cursor = {self._since_ns})'
+        )
 
         return trades
 
     def is_done(self) -> bool:
         return self._is_done
+
+    @property
+    def cursor_ns(self) -> int:
+        """
+        The `since` cursor of the next page.
+        """
+        return self._since_ns
+
+    @property
+    def until_ns(self) -> int:
+        return self._until_ns
+
+    def _request_page(self) -> dict:
+        """
+        Requests a single page starting at the current cursor. Network errors, invalid
+        responses and rate limit errors are retried with exponential backoff.
+        """
+        headers = {'Accept': 'application/json'}
+        params = {
+            'pair': self.pair,
+            'since': self._since_ns,
+        }
+
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+
+            try:
+                response = requests.request('GET', self.URL, headers=headers, params=params)
+                data = json.loads(response.text)
+                errors = data.get('error', [])
+                if errors:
+                    raise RuntimeError(', '.join(errors))
+                return data
+            except (requests.exceptions.RequestException, json.JSONDecodeError, RuntimeError) as e:
+                if attempt == self.max_retries:
+                    logger.error(f'Failed to get trades for pair {self.pair}: {e}')
+                    raise
+
+                wait_seconds = self.backoff_seconds * 2**attempt
+                logger.warning(
+                    f'Request for pair {self.pair} failed ({e}), retrying in {wait_seconds:.1f}s'
+                )
+                time.sleep(wait_seconds)
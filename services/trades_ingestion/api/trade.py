@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import Optional
 
 from pydantic import BaseModel
 
@@ -13,6 +14,10 @@ class Trade(BaseModel):
     volume: float
     timestamp: str
     timestamp_ms: int
+    # Kraken trade id, sequential per pair (None if the source does not provide one)
+    trade_id: Optional[int] = None
+    # Taker side, 'buy' or 'sell' (None if the source does not provide one)
+    side: Optional[str] = None
 
     @classmethod
     def from_kraken_rest_api_response(
@@ -21,6 +26,8 @@ class Trade(BaseModel):
         price: float,
         volume: float,
         timestamp_sec: float,
+        trade_id: Optional[int] = None,
+        side: Optional[str] = None,
     ) -> 'Trade':
         """
         Returns a Trade object from the Kraken REST API response.
@@ -31,6 +38,8 @@ class Trade(BaseModel):
             price: float
             volume: float
             timestamp_sec: float
+            trade_id: int (the last field)
+            side: 'b' or 's' (the fourth field)
         """
         # Convert timestamp from seconds to milliseconds
         timestamp_ms = int(float(timestamp_sec) * 1000)
@@ -41,6 +50,8 @@ class Trade(BaseModel):
             volume=volume,
             timestamp=cls._milliseconds2datestr(timestamp_ms),
             timestamp_ms=timestamp_ms,
+            trade_id=trade_id,
+            side={'b': 'buy', 's': 'sell'}.get(side),
         )
 
     @classmethod
@@ -50,6 +61,8 @@ class Trade(BaseModel):
         price: float,
         volume: float,
         timestamp: str,
+        trade_id: Optional[int] = None,
+        side: Optional[str] = None,
     ) -> 'Trade':
         return cls(
             pair=pair,
@@ -57,6 +70,8 @@ class Trade(BaseModel):
             volume=volume,
             timestamp=timestamp,
             timestamp_ms=cls._datestr2milliseconds(timestamp),
+            trade_id=trade_id,
+            side=side,
         )
 
     @staticmethod
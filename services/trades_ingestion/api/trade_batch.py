@@ -0,0 +1,254 @@
+from datetime import date
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple, Union
+
+import orjson
+from loguru import logger
+
+from .columnar import SIDE_CODES, encode_trades
+from .trade import Trade
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+_MS_PER_DAY = 24 * 60 * 60 * 1000
+_SIDES_JSON = {'buy': b'"buy"', 'sell': b'"sell"'}
+
+
+@lru_cache(maxsize=4096)
+def _second_start_ms(datestr: str) -> int:
+    """
+    Milliseconds since epoch (UTC) of a 'YYYY-MM-DDTHH:MM:SS' timestamp. Cached, since
+    consecutive trades mostly share the same second.
+    """
+    day = date(int(datestr[0:4]), int(datestr[5:7]), int(datestr[8:10]))
+    return (day.toordinal() - _EPOCH_ORDINAL) * _MS_PER_DAY + (
+        int(datestr[11:13]) * 3_600 + int(datestr[14:16]) * 60 + int(datestr[17:19])
+    ) * 1_000
+
+
+def parse_iso_timestamp_ms(timestamp: str) -> int:
+    """
+    Parses a Kraken timestamp like '2023-09-25T07:49:37.708706Z' (UTC) into
+    milliseconds since epoch, without going through `datetime.strptime`.
+    """
+    millis = timestamp[20:23].rstrip('Z')
+    return _second_start_ms(timestamp[:19]) + (
+        int(millis.ljust(3, '0')) if millis else 0
+    )
+
+
+class TradeBatch:
+    """
+    A batch of trades stored column-wise.
+
+    It is the fast path for the ingestion pipeline: a whole Kraken frame is decoded in
+    one pass, without building a pydantic `Trade` per trade, and serialized straight to
+    Kafka message bytes. Use `to_trades` where the `Trade` objects are needed.
+    """
+
+    __slots__ = (
+        'pairs',
+        'prices',
+        'volumes',
+        'timestamps',
+        'timestamps_ms',
+        'trade_ids',
+        'sides',
+    )
+
+    def __init__(self):
+        self.pairs: List[str] = []
+        self.prices: List[float] = []
+        self.volumes: List[float] = []
+        self.timestamps: List[str] = []
+        self.timestamps_ms: List[int] = []
+        self.trade_ids: List[Optional[int]] = []
+        self.sides: List[Optional[str]] = []
+
+    def __len__(self) -> int:
+        return len(self.timestamps_ms)
+
+    @classmethod
+    def from_trades(cls, trades: Iterable[Trade]) -> 'TradeBatch':
+        batch = cls()
+        for trade in trades:
+            batch.pairs.append(trade.pair)
+            batch.prices.append(trade.price)
+            batch.volumes.append(trade.volume)
+            batch.timestamps.append(trade.timestamp)
+            batch.timestamps_ms.append(trade.timestamp_ms)
+            batch.trade_ids.append(trade.trade_id)
+            batch.sides.append(trade.side)
+        return batch
+
+    def select(self, indices: Iterable[int]) -> 'TradeBatch':
+        """
+        Returns a new batch with the trades at `indices`, in that order.
+        """
+        indices = list(indices)
+        batch = TradeBatch()
+        batch.pairs = [self.pairs[i] for i in indices]
+        batch.prices = [self.prices[i] for i in indices]
+        batch.volumes = [self.volumes[i] for i in indices]
+        batch.timestamps = [self.timestamps[i] for i in indices]
+        batch.timestamps_ms = [self.timestamps_ms[i] for i in indices]
+        batch.trade_ids = [self.trade_ids[i] for i in indices]
+        batch.sides = [self.sides[i] for i in indices]
+        return batch
+
+    def extend(self, other: 'TradeBatch') -> None:
+        """
+        Appends the trades of another batch.
+        """
+        self.pairs += other.pairs
+        self.prices += other.prices
+        self.volumes += other.volumes
+        self.timestamps += other.timestamps
+        self.timestamps_ms += other.timestamps_ms
+        self.trade_ids += other.trade_ids
+        self.sides += other.sides
+
+    @classmethod
+    def from_kraken_websocket_messages(
+        cls, messages: Iterable[Union[str, bytes]]
+    ) -> 'TradeBatch':
+        """
+        Decodes raw messages from the Kraken Websocket API into a single batch.
+        Heartbeats, status messages, subscription acks and malformed messages are skipped.
+
+        E.g message:
+            {"channel": "trade", "type": "update", "data": [{"symbol": "BTC/USD",
+             "side": "buy", "price": 76395.0, "qty": 0.01305597, "ord_type": "market",
+             "trade_id": 75468573, "timestamp": "2024-11-09T12:32:45.415951Z"}]}
+        """
+        batch = cls()
+        pairs = batch.pairs
+        prices = batch.prices
+        volumes = batch.volumes
+        timestamps = batch.timestamps
+        timestamps_ms = batch.timestamps_ms
+        trade_ids = batch.trade_ids
+        sides = batch.sides
+
+        for message in messages:
+            try:
+                data = orjson.loads(message)
+            except orjson.JSONDecodeError as e:
+                logger.error(f'Error decoding JSON: {e}')
+                continue
+
+            if not isinstance(data, dict) or data.get('channel') != 'trade':
+                continue
+
+            try:
+                for trade in data['data']:
+                    timestamp = trade['timestamp']
+                    pair = trade['symbol']
+                    price = float(trade['price'])
+                    volume = float(trade['qty'])
+                    timestamp_ms = parse_iso_timestamp_ms(timestamp)
+                    trade_id = trade.get('trade_id')
+                    side = trade.get('side')
+
+                    pairs.append(pair)
+                    prices.append(price)
+                    volumes.append(volume)
+                    timestamps.append(timestamp)
+                    timestamps_ms.append(timestamp_ms)
+                    trade_ids.append(trade_id)
+                    sides.append(side)
+            except (KeyError, TypeError, ValueError) as e:
+                logger.error(f'Malformed trade message {e}')
+
+        return batch
+
+    def to_trades(self) -> List[Trade]:
+        return [
+            Trade(
+                pair=pair,
+                price=price,
+                volume=volume,
+                timestamp=timestamp,
+                timestamp_ms=timestamp_ms,
+                trade_id=trade_id,
+                side=side,
+            )
+            for pair, price, volume, timestamp, timestamp_ms, trade_id, side in zip(
+                self.pairs,
+                self.prices,
+                self.volumes,
+                self.timestamps,
+                self.timestamps_ms,
+                self.trade_ids,
+                self.sides,
+                strict=True,
+            )
+        ]
+
+    def to_messages(self) -> List[Tuple[bytes, bytes]]:
+        """
+        Serializes the batch into (key, value) Kafka messages. The values are the same
+        JSON documents as `Trade.to_dict()` dumped to JSON, but built directly as bytes.
+        """
+        # Key and JSON prefix are built once per pair
+        prefixes = {}
+        messages = []
+        for pair, price, volume, timestamp, timestamp_ms, trade_id, side in zip(
+            self.pairs,
+            self.prices,
+            self.volumes,
+            self.timestamps,
+            self.timestamps_ms,
+            self.trade_ids,
+            self.sides,
+            strict=True,
+        ):
+            prefix = prefixes.get(pair)
+            if prefix is None:
+                prefix = prefixes[pair] = (
+                    pair.replace('/', '-').encode(),
+                    b'{"pair":' + orjson.dumps(pair) + b',"price":',
+                )
+            key, value_prefix = prefix
+            messages.append(
+                (
+                    key,
+                    value_prefix
+                    + b'%r,"volume":%r,"timestamp":"%s","timestamp_ms":%d,"trade_id":%s,"side":%s}'
+                    % (
+                        price,
+                        volume,
+                        timestamp.encode(),
+                        timestamp_ms,
+                        b'null' if trade_id is None else b'%d' % trade_id,
+                        _SIDES_JSON.get(side, b'null'),
+                    ),
+                )
+            )
+        return messages
+
+    def to_columnar_messages(self) -> List[Tuple[bytes, bytes]]:
+        """
+        Serializes the batch into one columnar (key, value) Kafka message per pair,
+        see `api/columnar.py` for the layout. The trades keep their order within a pair.
+        """
+        columns = {}
+        for pair, price, volume, timestamp_ms, side in zip(
+            self.pairs,
+            self.prices,
+            self.volumes,
+            self.timestamps_ms,
+            self.sides,
+            strict=True,
+        ):
+            column = columns.get(pair)
+            if column is None:
+                column = columns[pair] = ([], [], [], [])
+            column[0].append(timestamp_ms)
+            column[1].append(price)
+            column[2].append(volume)
+            column[3].append(SIDE_CODES.get(side, 0))
+
+        return [
+            (pair.replace('/', '-').encode(), encode_trades(pair, *column))
+            for pair, column in columns.items()
+        ]
@@ -2,13 +2,15 @@ import ssl
 import certifi
 
 import json
-from typing import List
+import time
+from typing import List, Tuple
 
 from loguru import logger
 from websocket import create_connection
 
 from .base import TradesAPI
 from .trade import Trade
+from .trade_batch import TradeBatch
 
 
 class KrakenWebsocketAPI(TradesAPI):
@@ -37,6 +39,28 @@ class KrakenWebsocketAPI(TradesAPI):
         # Receive data from the websocket client
         data = self._ws_client.recv()
 
+        return self.parse_trades_message(data)
+
+    def get_trade_batch(self) -> TradeBatch:
+        """
+        Same as `get_trades`, but decodes the message straight into a TradeBatch.
+        """
+        return TradeBatch.from_kraken_websocket_messages([self._ws_client.recv()])
+
+    def get_frames(self) -> List[Tuple[int, str]]:
+        """
+        Returns the next raw message together with its receive time (in ns since epoch),
+        without decoding it.
+        """
+        data = self._ws_client.recv()
+        return [(time.time_ns(), data)]
+
+    @staticmethod
+    def parse_trades_message(data: str) -> List[Trade]:
+        """
+        Parses a raw message from the Kraken Websocket API into a list of Trade objects.
+        Heartbeats, subscription acks and malformed messages return an empty list.
+        """
         if 'heartbeat' in data:
             logger.info('Heartbeat received')
             return []
@@ -48,6 +72,10 @@ class KrakenWebsocketAPI(TradesAPI):
             logger.error(f'Error decoding JSON: {e}')
             return []
 
+        # Only the trade channel carries trades (skips status messages and subscription acks)
+        if data.get('channel') != 'trade':
+            return []
+
         try:
             trades_data = data['data']
         except KeyError as e:
@@ -60,6 +88,8 @@ class KrakenWebsocketAPI(TradesAPI):
                 price=trade['price'],
                 volume=trade['qty'],
                 timestamp=trade['timestamp'],
+                trade_id=trade.get('trade_id'),
+                side=trade.get('side'),
             )
             for trade in trades_data
         ]
@@ -0,0 +1,190 @@
+import asyncio
+import json
+import queue
+import random
+import ssl
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import certifi
+from loguru import logger
+from websockets.asyncio.client import connect
+from websockets.exceptions import WebSocketException
+
+from .base import TradesAPI
+from .trade import Trade
+from .trade_batch import TradeBatch
+from .websocket import KrakenWebsocketAPI
+
+
+class KrakenAsyncWebsocketAPI(TradesAPI):
+    """
+    Reads trades from the Kraken Websocket API over several asyncio connections.
+
+    The pairs are sharded across `n_connections` websockets that run on an event loop
+    in a background thread. Every connection reconnects with exponential backoff and
+    re-subscribes on its own. The readers only push raw frames into a bounded queue,
+    the decoding happens in `get_trades`, so a slow parse never stalls a socket.
+    """
+
+    URL = 'wss://ws.kraken.com/v2'
+
+    def __init__(
+        self,
+        pairs: List[str],
+        n_connections: int = 1,
+        max_queue_size: int = 10_000,
+        max_frames_per_batch: int = 1_000,
+        min_backoff_seconds: float = 0.5,
+        max_backoff_seconds: float = 30.0,
+        url: Optional[str] = None,
+    ):
+        self.pairs = pairs
+        self.n_connections = max(1, min(n_connections, len(pairs)))
+        self.max_frames_per_batch = max_frames_per_batch
+        self.min_backoff_seconds = min_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.url = url or self.URL
+
+        # Round-robin sharding of the pairs across the connections
+        self.shards = [
+            self.pairs[i :: self.n_connections] for i in range(self.n_connections)
+        ]
+
+        # Raw frames handed over from the network readers to the decoder
+        self._frames: queue.Queue = queue.Queue(maxsize=max_queue_size)
+
+        self._ssl_context = (
+            ssl.create_default_context(cafile=certifi.where())
+            if self.url.startswith('wss://')
+            else None
+        )
+
+        # Run the connections on an event loop in a background thread
+        self._loop = asyncio.new_event_loop()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run_loop, name='kraken-websocket', daemon=True
+        )
+        self._thread.start()
+
+    def get_trades(self) -> List[Trade]:
+        """
+        Decodes all the frames received since the last call (blocks until there is at
+        least one) and returns them as a list of Trade objects.
+
+        Returns:
+            List[Trade]: A list of Trade objects.
+        """
+        trades = []
+        for _, frame in self.get_frames():
+            trades += KrakenWebsocketAPI.parse_trades_message(frame)
+
+        return trades
+
+    def get_trade_batch(self) -> TradeBatch:
+        """
+        Same as `get_trades`, but decodes the frames straight into a TradeBatch.
+        """
+        return TradeBatch.from_kraken_websocket_messages(
+            frame for _, frame in self.get_frames()
+        )
+
+    def is_done(self) -> bool:
+        return False
+
+    def close(self) -> None:
+        """
+        Stops all the connections and the background event loop.
+        """
+        self._stopped.set()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+    def get_frames(self) -> List[Tuple[int, str]]:
+        """
+        Takes up to `max_frames_per_batch` raw frames from the queue, waiting at most one
+        second for the first one. Every frame comes with its receive time (in ns since
+        epoch).
+        """
+        try:
+            frames = [self._frames.get(timeout=1.0)]
+        except queue.Empty:
+            return []
+
+        while len(frames) < self.max_frames_per_batch:
+            try:
+                frames.append(self._frames.get_nowait())
+            except queue.Empty:
+                break
+
+        return frames
+
+    def _run_loop(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        for shard_id, shard in enumerate(self.shards):
+            self._loop.create_task(self._run_connection(shard_id, shard))
+        self._loop.run_forever()
+
+    async def _run_connection(self, shard_id: int, pairs: List[str]) -> None:
+        """
+        Keeps a single connection alive: connects, subscribes to `pairs` and forwards
+        every frame until the connection drops, then reconnects with exponential
+        backoff (with jitter).
+        """
+        attempt = 0
+        while not self._stopped.is_set():
+            try:
+                async with connect(
+                    self.url, ssl=self._ssl_context, max_queue=None
+                ) as ws:
+                    await self._subscribe(ws, pairs)
+                    logger.info(f'Connection {shard_id} subscribed to {pairs}')
+                    attempt = 0
+
+                    async for frame in ws:
+                        await self._enqueue((time.time_ns(), frame))
+            except (OSError, asyncio.TimeoutError, WebSocketException) as e:
+                logger.warning(f'Connection {shard_id} lost: {e}')
+
+            if self._stopped.is_set():
+                break
+
+            backoff = min(
+                self.max_backoff_seconds, self.min_backoff_seconds * 2**attempt
+            )
+            backoff *= random.uniform(0.5, 1.0)
+            attempt += 1
+            logger.info(f'Reconnecting connection {shard_id} in {backoff:.2f}s')
+            await asyncio.sleep(backoff)
+
+    async def _enqueue(self, frame: Tuple[int, str]) -> None:
+        """
+        Hands a frame over to the decoder. If the queue is full we stop reading from
+        the socket until there is room again (backpressure instead of dropping trades).
+        """
+        while True:
+            try:
+                self._frames.put_nowait(frame)
+                return
+            except queue.Full:
+                await asyncio.sleep(0.01)
+
+    @staticmethod
+    async def _subscribe(ws, pairs: List[str]) -> None:
+        """
+        Sends the subscription message for the given pairs.
+        """
+        await ws.send(
+            json.dumps(
+                {
+                    'method': 'subscribe',
+                    'params': {
+                        'channel': 'trade',
+                        'symbol': pairs,
+                        'snapshot': False,
+                    },
+                }
+            )
+        )
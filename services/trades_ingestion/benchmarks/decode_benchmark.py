@@ -0,0 +1,99 @@
+"""
+Micro-benchmark of the websocket decoding path.
+
+Compares the Trade path (json.loads + pydantic Trade + strptime + model_dump + JSON
+dump per trade) against the TradeBatch path (one orjson pass per frame and direct
+serialization to message bytes).
+
+Usage (from services/trades_ingestion):
+    uv run python -m benchmarks.decode_benchmark --frames 2000 --trades-per-frame 50
+"""
+
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from api.trade_batch import TradeBatch
+from api.websocket import KrakenWebsocketAPI
+from quixstreams.utils.json import dumps
+
+
+def make_frames(n_frames: int, trades_per_frame: int, pairs: List[str]) -> List[str]:
+    """
+    Builds Kraken Websocket API v2 trade frames with random prices and volumes.
+    """
+    start = datetime(2024, 11, 9, tzinfo=timezone.utc)
+    frames = []
+    for i in range(n_frames):
+        frame_time = start + timedelta(milliseconds=10 * i)
+        frames.append(
+            json.dumps(
+                {
+                    'channel': 'trade',
+                    'type': 'update',
+                    'data': [
+                        {
+                            'symbol': random.choice(pairs),
+                            'side': random.choice(['buy', 'sell']),
+                            'price': round(random.uniform(70_000, 80_000), 1),
+                            'qty': round(random.uniform(0, 1), 8),
+                            'ord_type': 'market',
+                            'trade_id': i * trades_per_frame + j,
+                            'timestamp': (
+                                frame_time + timedelta(microseconds=j)
+                            ).strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+                        }
+                        for j in range(trades_per_frame)
+                    ],
+                }
+            )
+        )
+    return frames
+
+
+def trade_path(frames: List[str]) -> int:
+    n_messages = 0
+    for frame in frames:
+        for trade in KrakenWebsocketAPI.parse_trades_message(frame):
+            key = trade.pair.replace('/', '-').encode()
+            value = dumps(trade.to_dict())
+            n_messages += bool(key and value)
+    return n_messages
+
+
+def trade_batch_path(frames: List[str]) -> int:
+    return len(TradeBatch.from_kraken_websocket_messages(frames).to_messages())
+
+
+def main(n_frames: int, trades_per_frame: int, repeat: int) -> None:
+    frames = make_frames(
+        n_frames, trades_per_frame, ['BTC/USD', 'BTC/EUR', 'ETH/EUR', 'ETH/USD']
+    )
+    n_trades = n_frames * trades_per_frame
+
+    results = {}
+    for name, path in [('Trade', trade_path), ('TradeBatch', trade_batch_path)]:
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            assert path(frames) == n_trades
+            best = min(best, time.perf_counter() - start)
+        results[name] = best
+        print(
+            f'{name:>10}: {n_trades / best:>12,.0f} trades/sec ({best * 1e6 / n_trades:.2f} us/trade)'
+        )
+
+    print(f'   speedup: {results["Trade"] / results["TradeBatch"]:.1f}x')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--frames', type=int, default=2000)
+    parser.add_argument('--trades-per-frame', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    main(args.frames, args.trades_per_frame, args.repeat)
@@ -0,0 +1,419 @@
+"""
+End-to-end throughput benchmark of the ingestion `pipeline`.
+
+Drives the produce loop of the pipeline with deterministic, pre-generated sources that
+are as fast as possible, so the numbers measure the service itself:
+- websocket:      raw Kraken Websocket frames, decoded to a TradeBatch per call
+- rest:           canned Kraken REST pages, fetched and decoded by KrakenRestAPI
+- serialization:  ready-made TradeBatches, so only serialization and producing count
+
+Every scenario runs in a fresh process (for a clean peak RSS) against an in-memory
+producer, or against a real broker with `--broker` (e.g. the local redpanda of
+docker-compose/redpanda.yaml). Reported are trades/sec, p50/p99 per-batch latency
+(one iteration of the produce loop), CPU time and peak RSS. The results are written
+as JSON, so runs on different commits can be compared with `--compare`.
+
+Usage (from services/trades_ingestion):
+    uv run python -m benchmarks.pipeline_benchmark --trades 500000
+    uv run python -m benchmarks.pipeline_benchmark --compare benchmarks/results/pipeline-<commit>.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+from unittest import mock
+
+import numpy as np
+from loguru import logger
+
+from api import rest
+from api.base import TradesAPI
+from api.mock import KrakenMockAPI
+from api.trade import Trade
+from api.trade_batch import TradeBatch
+from benchmarks.decode_benchmark import make_frames
+from utils.producer_stats import ProducerStats
+
+PAIRS = ['BTC/USD', 'BTC/EUR', 'ETH/EUR', 'ETH/USD']
+SCENARIOS = ['websocket', 'rest', 'serialization']
+RESULTS_DIR = Path(__file__).parent / 'results'
+
+# Kraken returns up to 1000 trades per REST page
+REST_PAGE_SIZE = 1000
+
+
+class InMemoryProducer:
+    """
+    Stand-in for the Kafka producer that acknowledges every message right away and
+    only keeps count of what it was given.
+    """
+
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+
+    def produce(
+        self, topic: str, value: bytes, key: bytes, partition=None, on_delivery=None
+    ) -> None:
+        self.messages += 1
+        self.bytes += len(key) + len(value)
+        if on_delivery is not None:
+            on_delivery(None, None)
+
+    def __len__(self) -> int:
+        return 0
+
+
+class TimedTradesAPI(TradesAPI):
+    """
+    Wraps a source and records the time of every `is_done` call, i.e. of the start of
+    every iteration of the produce loop.
+    """
+
+    def __init__(self, api: TradesAPI):
+        self.api = api
+        self.ticks: List[float] = []
+
+    def get_trades(self) -> List[Trade]:
+        return self.api.get_trades()
+
+    def get_trade_batch(self) -> TradeBatch:
+        return self.api.get_trade_batch()
+
+    def is_done(self) -> bool:
+        self.ticks.append(time.perf_counter())
+        return self.api.is_done()
+
+
+class FrameSource(TradesAPI):
+    """
+    Websocket decode path: hands out pre-generated frames like KrakenAsyncWebsocketAPI.
+    """
+
+    def __init__(self, frames: List[str], frames_per_batch: int):
+        self.frames = frames
+        self.frames_per_batch = frames_per_batch
+        self._position = 0
+
+    def get_trades(self) -> List[Trade]:
+        return self.get_trade_batch().to_trades()
+
+    def get_trade_batch(self) -> TradeBatch:
+        frames = self.frames[self._position : self._position + self.frames_per_batch]
+        self._position += self.frames_per_batch
+        return TradeBatch.from_kraken_websocket_messages(frames)
+
+    def is_done(self) -> bool:
+        return self._position >= len(self.frames)
+
+
+class BatchSource(TradesAPI):
+    """
+    Serialization path: hands out ready-made TradeBatches.
+    """
+
+    def __init__(self, batches: List[TradeBatch]):
+        self.batches = batches
+        self._position = 0
+
+    def get_trades(self) -> List[Trade]:
+        return self.get_trade_batch().to_trades()
+
+    def get_trade_batch(self) -> TradeBatch:
+        batch = self.batches[self._position]
+        self._position += 1
+        return batch
+
+    def is_done(self) -> bool:
+        return self._position >= len(self.batches)
+
+
+def make_rest_responder(n_trades: int, seed: int) -> Callable:
+    """
+    Returns a replacement for `requests.request` that serves canned Kraken REST pages:
+    `n_trades` trades per pair, evenly spread over the last day.
+    """
+    end_ns = time.time_ns() - 60 * 1_000_000_000
+    step_ns = 24 * 60 * 60 * 1_000_000_000 // max(n_trades, 1)
+    start_ns = end_ns - n_trades * step_ns
+
+    class Response:
+        def __init__(self, text: str):
+            self.text = text
+
+    def respond(method: str, url: str, headers=None, params=None) -> Response:
+        since_ns = params['since']
+        if since_ns < 10**12:  # seconds
+            since_ns *= 1_000_000_000
+
+        first = max(0, (since_ns - start_ns) // step_ns + 1)
+        last = min(n_trades, first + REST_PAGE_SIZE)
+        # Seeded per page, as the pairs are fetched concurrently
+        rng = random.Random(f'{seed}-{params["pair"]}-{first}')
+        trades = [
+            [
+                f'{rng.uniform(70_000, 80_000):.1f}',
+                f'{rng.uniform(0, 1):.8f}',
+                (start_ns + i * step_ns) / 1e9,
+                rng.choice('bs'),
+                'm',
+                '',
+                i,
+            ]
+            for i in range(first, last)
+        ]
+        cursor_ns = start_ns + (last - 1) * step_ns if trades else since_ns
+        return Response(
+            json.dumps(
+                {
+                    'error': [],
+                    'result': {params['pair']: trades, 'last': str(cursor_ns)},
+                }
+            )
+        )
+
+    return respond
+
+
+def run_scenario(
+    scenario: str,
+    wire_format: str,
+    n_trades: int,
+    batch_size: int,
+    seed: int,
+    broker: Optional[str],
+) -> dict:
+    """
+    Runs a single scenario and returns its measurements. Meant to run in a fresh
+    process.
+    """
+    # Per-page and per-interval logs would dominate the measurements
+    logger.remove()
+    logger.add(sys.stderr, level='WARNING')
+
+    patch = None
+    if scenario == 'websocket':
+        random.seed(seed)
+        trades_per_frame = 50
+        source = FrameSource(
+            make_frames(n_trades // trades_per_frame, trades_per_frame, PAIRS),
+            frames_per_batch=max(batch_size // trades_per_frame, 1),
+        )
+    elif scenario == 'rest':
+        patch = mock.patch.object(
+            rest.requests,
+            'request',
+            make_rest_responder(n_trades // len(PAIRS), seed),
+        )
+        patch.start()
+        source = rest.KrakenRestAPI(
+            pairs=PAIRS, last_n_days=2, requests_per_second=1e9, burst=1_000_000
+        )
+    elif scenario == 'serialization':
+        mock_api = KrakenMockAPI(
+            pairs=PAIRS,
+            trades_per_second=batch_size / len(PAIRS),
+            interval_seconds=1.0,
+            burst_probability=0.0,
+            realtime=False,
+            seed=seed,
+        )
+        batches, n = [], 0
+        while n < n_trades:
+            batches.append(mock_api.get_trade_batch())
+            n += len(batches[-1])
+        source = BatchSource(batches)
+    else:
+        raise ValueError(f'Invalid scenario: {scenario}')
+
+    # Count the trades on their way through
+    n_produced = 0
+    get_trade_batch = source.get_trade_batch
+
+    def counting_get_trade_batch() -> TradeBatch:
+        nonlocal n_produced
+        batch = get_trade_batch()
+        n_produced += len(batch)
+        return batch
+
+    source.get_trade_batch = counting_get_trade_batch
+    timed = TimedTradesAPI(source)
+
+    rss_before_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+
+    if broker is None:
+        from pipeline import produce_trades
+
+        produce_trades(
+            trades_api=timed,
+            producer=InMemoryProducer(),
+            topic_name='trades_benchmark',
+            stats=ProducerStats(report_interval_seconds=float('inf')),
+            wire_format=wire_format,
+        )
+    else:
+        from pipeline import pipeline
+
+        pipeline(
+            kafka_broker_address=broker,
+            kafka_topic=f'trades_benchmark_{wire_format}',
+            trades_api=timed,
+            stats_interval_seconds=float('inf'),
+            wire_format=wire_format,
+        )
+
+    seconds = time.perf_counter() - start
+    usage_after = resource.getrusage(resource.RUSAGE_SELF)
+    if patch is not None:
+        patch.stop()
+
+    cpu_seconds = (usage_after.ru_utime - usage_before.ru_utime) + (
+        usage_after.ru_stime - usage_before.ru_stime
+    )
+    latencies_ms = np.diff(timed.ticks) * 1000
+
+    return {
+        'scenario': scenario,
+        'wire_format': wire_format,
+        'trades': n_produced,
+        'batches': len(latencies_ms),
+        'seconds': round(seconds, 4),
+        'trades_per_sec': round(n_produced / seconds, 1),
+        'latency_ms': {
+            'p50': round(float(np.percentile(latencies_ms, 50)), 4),
+            'p99': round(float(np.percentile(latencies_ms, 99)), 4),
+            'max': round(float(latencies_ms.max()), 4),
+        },
+        'cpu_seconds': round(cpu_seconds, 4),
+        'cpu_utilization': round(cpu_seconds / seconds, 3),
+        'rss_before_mb': round(rss_before_mb, 1),
+        'peak_rss_mb': round(usage_after.ru_maxrss / 1024, 1),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(results: List[dict], baseline_path: Path) -> None:
+    """
+    Prints the change in throughput against a previous results file.
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    by_key = {(r['scenario'], r['wire_format']): r for r in baseline['results']}
+    print(f'\nCompared to {baseline["commit"]} ({baseline_path}):')
+    for result in results:
+        key = (result['scenario'], result['wire_format'])
+        if key not in by_key:
+            continue
+        change = result['trades_per_sec'] / by_key[key]['trades_per_sec'] - 1
+        print(f'{key[0]:>14} {key[1]:>8}: {change:+.1%} trades/sec')
+
+
+def main(
+    scenarios: List[str],
+    wire_formats: List[str],
+    n_trades: int,
+    batch_size: int,
+    seed: int,
+    broker: Optional[str],
+    output: Optional[Path],
+    baseline: Optional[Path],
+) -> None:
+    runs: List[Tuple[str, str]] = [
+        (scenario, wire_format)
+        for scenario in scenarios
+        for wire_format in wire_formats
+    ]
+
+    results = []
+    for scenario, wire_format in runs:
+        with ProcessPoolExecutor(
+            max_workers=1, mp_context=get_context('spawn')
+        ) as pool:
+            result = pool.submit(
+                run_scenario, scenario, wire_format, n_trades, batch_size, seed, broker
+            ).result()
+        results.append(result)
+        print(
+            f'{scenario:>14} {wire_format:>8}: {result["trades_per_sec"]:>12,.0f} trades/sec, '
+            f'p50 {result["latency_ms"]["p50"]:.2f} ms, p99 {result["latency_ms"]["p99"]:.2f} ms, '
+            f'cpu {result["cpu_utilization"]:.0%}, peak rss {result["peak_rss_mb"]:.0f} MB'
+        )
+
+    commit = git_commit()
+    report = {
+        'commit': commit,
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': {
+            'trades': n_trades,
+            'batch_size': batch_size,
+            'seed': seed,
+            'producer': broker or 'in-memory',
+        },
+        'results': results,
+    }
+
+    output = output or RESULTS_DIR / f'pipeline-{commit}.json'
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'\nResults written to {output}')
+
+    if baseline is not None:
+        compare(results, baseline)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument(
+        '--wire-formats',
+        nargs='+',
+        choices=['json', 'columnar'],
+        default=['json', 'columnar'],
+    )
+    parser.add_argument('--trades', type=int, default=200_000)
+    parser.add_argument(
+        '--batch-size', type=int, default=1_000, help='trades per batch'
+    )
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--broker', default=None, help='e.g. localhost:19092')
+    parser.add_argument('--output', type=Path, default=None)
+    parser.add_argument('--compare', type=Path, default=None, dest='baseline')
+    args = parser.parse_args()
+
+    main(
+        scenarios=args.scenarios,
+        wire_formats=args.wire_formats,
+        n_trades=args.trades,
+        batch_size=args.batch_size,
+        seed=args.seed,
+        broker=args.broker,
+        output=args.output,
+        baseline=args.baseline,
+    )
@@ -15,9 +15,34 @@ class Config(BaseSettings):
     
     kafka_broker_address: str
     kafka_topic: str
+    kafka_topic_partitions: Optional[int] = None
+    kafka_topic_replication_factor: Optional[int] = 1
     pairs: List[str]
-    data_source: Literal['live', 'historical', 'test']
+    data_source: Literal['live', 'historical', 'test', 'replay']
     last_n_days: Optional[int] = None
+    rest_requests_per_second: Optional[float] = 1.0
+    rest_burst: Optional[int] = 1
+    backfill_cache_dir: Optional[str] = None
+    websocket_connections: Optional[int] = 1
+    websocket_max_queue_size: Optional[int] = 10000
+    dedup_window_size: Optional[int] = 100000
+    gap_refill: Optional[bool] = True
+    gap_refill_max_trades: Optional[int] = 10000
+    producer_linger_ms: Optional[int] = 50
+    producer_batch_size: Optional[int] = 1000000
+    producer_compression_type: Literal['none', 'gzip', 'snappy', 'lz4', 'zstd'] = 'lz4'
+    stats_interval_seconds: Optional[float] = 10.0
+    trades_wire_format: Literal['json', 'columnar'] = 'json'
+    record_dir: Optional[str] = None
+    record_segment_seconds: Optional[int] = 300
+    replay_dir: Optional[str] = None
+    replay_speed: Optional[float] = 1.0
+    replay_start_offset_seconds: Optional[float] = 0.0
+    mock_trades_per_second: Optional[float] = 10.0
+    mock_burst_multiplier: Optional[float] = 10.0
+    mock_out_of_order_fraction: Optional[float] = 0.0
+    mock_duplicate_fraction: Optional[float] = 0.0
+    mock_realtime: Optional[bool] = True
 
 
 api_config = Config()
\ No newline at end of file
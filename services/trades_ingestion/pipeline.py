@@ -1,16 +1,36 @@
-from loguru import logger
-from quixstreams import Application
+from typing import List, Literal, Optional
 
 from api.base import TradesAPI
+from api.dedup import DedupTradesAPI, TradeDeduplicator
+from api.gap_refill import GapRefiller
 from api.mock import KrakenMockAPI
+from api.page_cache import BackfillCheckpoint, PageCache
+from api.rate_limiter import TokenBucket
+from api.recording import FrameRecorder, RecordingTradesAPI
+from api.replay import ReplayTradesAPI
 from api.rest import KrakenRestAPI
-from api.websocket import KrakenWebsocketAPI
+from api.websocket_async import KrakenAsyncWebsocketAPI
+from loguru import logger
+from quixstreams import Application
+from quixstreams.kafka import Producer
+from quixstreams.models import TopicConfig
+from quixstreams.models.topics import TopicAdmin
+from utils.partitioning import PairPartitioner
+from utils.producer_stats import ProducerStats
 
 
 def pipeline(
     kafka_broker_address: str,
     kafka_topic: str,
     trades_api: TradesAPI,
+    linger_ms: int = 50,
+    batch_size: int = 1_000_000,
+    compression_type: Literal['none', 'gzip', 'snappy', 'lz4', 'zstd'] = 'lz4',
+    stats_interval_seconds: float = 10.0,
+    wire_format: Literal['json', 'columnar'] = 'json',
+    topic_partitions: Optional[int] = None,
+    topic_replication_factor: int = 1,
+    pairs: Optional[List[str]] = None,
 ) -> None:
     """
     Pipeline that:
@@ -21,6 +41,17 @@ def pipeline(
         kafka_broker_address: str
         kafka_topic: str
         trades_api: TradesAPI (with 2 methods: get_trades and is_done)
+        linger_ms: int (how long the producer waits to fill a batch)
+        batch_size: int (maximum size of a producer batch in bytes)
+        compression_type: str (compression codec of the producer batches)
+        stats_interval_seconds: float (how often throughput and queue depth are logged)
+        wire_format: str (`json` for one message per trade, `columnar` for one
+            micro-batch message per pair)
+        topic_partitions: int (partitions of the topic if it gets created, by default
+            the broker default)
+        topic_replication_factor: int (replication factor of the topic if it gets
+            created)
+        pairs: list of str (pairs whose partitions are logged at the start)
 
     Returns:
         None
@@ -31,26 +62,98 @@ def pipeline(
     # This class handles all the low-level details to connect to Kafka.
     app = Application(
         broker_address=kafka_broker_address,
+        producer_extra_config={
+            'linger.ms': linger_ms,
+            'batch.size': batch_size,
+            'compression.type': compression_type,
+        },
     )
 
     # Define the topic where we will push the trades to
-    topic = app.topic(name=kafka_topic, value_serializer='json')
+    config = None
+    if topic_partitions:
+        config = TopicConfig(
+            num_partitions=topic_partitions,
+            replication_factor=topic_replication_factor,
+        )
+    topic = app.topic(name=kafka_topic, value_serializer='json', config=config)
+
+    # Delivery is tracked through callbacks and reported periodically
+    stats = ProducerStats(report_interval_seconds=stats_interval_seconds)
 
     with app.get_producer() as producer:
-        while not trades_api.is_done():
-            trades = trades_api.get_trades()
-
-            for trade in trades:
-                # Serialize the trade to a JSON string
-                message = topic.serialize(
-                    key=f"{trade.pair.replace('/', '-')}",  # Unique key for the trade - overwrites the previous trade (if applicable)
-                    value=trade.to_dict(),
-                )
+        # The topic exists now, map the pairs to its actual partitions
+        partitioner = None
+        if pairs:
+            n_partitions = (
+                TopicAdmin(broker_address=kafka_broker_address)
+                .inspect_topics([topic.name])[topic.name]
+                .num_partitions
+            )
+            partitioner = PairPartitioner(n_partitions=n_partitions)
+            logger.info(
+                f'Partitions of the pairs (of {n_partitions}): '
+                f'{partitioner.assignment(pairs)}'
+            )
 
-                # Push the trade to the Kafka topic
-                producer.produce(topic=topic.name, value=message.value, key=message.key)
+        produce_trades(
+            trades_api=trades_api,
+            producer=producer,
+            topic_name=topic.name,
+            stats=stats,
+            wire_format=wire_format,
+            partitioner=partitioner,
+        )
 
-                logger.info(f'Pushed trade to Kafka (topic={kafka_topic}): {trade}')
+
+def produce_trades(
+    trades_api: TradesAPI,
+    producer: Producer,
+    topic_name: str,
+    stats: ProducerStats,
+    wire_format: Literal['json', 'columnar'] = 'json',
+    partitioner: Optional[PairPartitioner] = None,
+) -> None:
+    """
+    Produces the trades of `trades_api` until it is done.
+
+    Split from `pipeline` so the same loop can be driven with any producer (e.g. an
+    in-memory one in the benchmarks).
+    """
+    while not trades_api.is_done():
+        trades = trades_api.get_trade_batch()
+
+        # Serialize the whole batch of trades at once
+        if wire_format == 'columnar':
+            messages = trades.to_columnar_messages()
+        else:
+            messages = trades.to_messages()
+
+        # Push the trades to the Kafka topic
+        for key, value in messages:
+            producer.produce(
+                topic=topic_name,
+                value=value,
+                key=key,
+                partition=partitioner.partition(key) if partitioner else None,
+                on_delivery=stats.on_delivery,
+            )
+
+        stats.record_produced(n_trades=len(trades), n_messages=len(messages))
+
+        # An API that checkpoints its progress (the resumable backfill) may only move
+        # its checkpoint once the trades are on the topic, so wait for their delivery
+        if trades_api.tracks_delivery:
+            failed = stats.failed
+            producer.flush()
+            if stats.failed > failed:
+                raise RuntimeError(
+                    f'Failed to deliver {stats.failed - failed} messages, stopping '
+                    'before the checkpoint moves past them'
+                )
+            trades_api.on_delivered()
+
+        stats.maybe_report(queue_depth=len(producer))
 
 
 if __name__ == '__main__':
@@ -59,18 +162,91 @@ if __name__ == '__main__':
     # Initialize the Kraken API depending on the data source
     if api_config.data_source == 'live':
         logger.info('Using the Kraken Websocket API')
-        kraken_api = KrakenWebsocketAPI(pairs=api_config.pairs)
+        kraken_api = KrakenAsyncWebsocketAPI(
+            pairs=api_config.pairs,
+            n_connections=api_config.websocket_connections,
+            max_queue_size=api_config.websocket_max_queue_size,
+        )
+        if api_config.record_dir:
+            logger.info(
+                f'Recording the raw websocket frames to {api_config.record_dir}'
+            )
+            kraken_api = RecordingTradesAPI(
+                api=kraken_api,
+                recorder=FrameRecorder(
+                    directory=api_config.record_dir,
+                    segment_seconds=api_config.record_segment_seconds,
+                ),
+            )
     elif api_config.data_source == 'historical':
         logger.info('Using the Kraken REST API')
-        kraken_api = KrakenRestAPI(pairs=api_config.pairs, last_n_days=api_config.last_n_days)
+        page_cache, checkpoint = None, None
+        if api_config.backfill_cache_dir:
+            # The checkpoint is per topic, and only an unfinished backfill over the same
+            # number of days is resumed. Any other run starts a fresh backfill, while
+            # still reusing the cached pages
+            logger.info(f'Caching the backfill in {api_config.backfill_cache_dir}')
+            page_cache = PageCache(f'{api_config.backfill_cache_dir}/pages')
+            checkpoint = BackfillCheckpoint(
+                f'{api_config.backfill_cache_dir}/checkpoints/{api_config.kafka_topic}.json',
+                last_n_days=api_config.last_n_days,
+            )
+        kraken_api = KrakenRestAPI(
+            pairs=api_config.pairs,
+            last_n_days=api_config.last_n_days,
+            requests_per_second=api_config.rest_requests_per_second,
+            burst=api_config.rest_burst,
+            page_cache=page_cache,
+            checkpoint=checkpoint,
+        )
     elif api_config.data_source == 'test':
         logger.info('Using the Kraken Mock API')
-        kraken_api = KrakenMockAPI(pairs=api_config.pairs)
+        kraken_api = KrakenMockAPI(
+            pairs=api_config.pairs,
+            trades_per_second=api_config.mock_trades_per_second,
+            burst_multiplier=api_config.mock_burst_multiplier,
+            out_of_order_fraction=api_config.mock_out_of_order_fraction,
+            duplicate_fraction=api_config.mock_duplicate_fraction,
+            realtime=api_config.mock_realtime,
+        )
+    elif api_config.data_source == 'replay':
+        logger.info(f'Replaying the recording in {api_config.replay_dir}')
+        kraken_api = ReplayTradesAPI(
+            directory=api_config.replay_dir,
+            speed=api_config.replay_speed,
+            start_offset_seconds=api_config.replay_start_offset_seconds,
+        )
     else:
         raise ValueError(f'Invalid data source: {api_config.data_source}')
 
+    # Drop duplicate trades of the streaming sources (by trade id) and refill the
+    # gaps of the live stream from the REST API
+    if api_config.data_source != 'historical' and api_config.dedup_window_size:
+        refiller = None
+        if api_config.data_source == 'live' and api_config.gap_refill:
+            refiller = GapRefiller(
+                rate_limiter=TokenBucket(
+                    rate_per_second=api_config.rest_requests_per_second,
+                    capacity=api_config.rest_burst,
+                ),
+                max_gap_trades=api_config.gap_refill_max_trades,
+            )
+        kraken_api = DedupTradesAPI(
+            api=kraken_api,
+            deduplicator=TradeDeduplicator(window_size=api_config.dedup_window_size),
+            refiller=refiller,
+        )
+
     pipeline(
         kafka_broker_address=api_config.kafka_broker_address,
         kafka_topic=api_config.kafka_topic,
         trades_api=kraken_api,
+        linger_ms=api_config.producer_linger_ms,
+        batch_size=api_config.producer_batch_size,
+        compression_type=api_config.producer_compression_type,
+        stats_interval_seconds=api_config.stats_interval_seconds,
+        wire_format=api_config.trades_wire_format,
+        topic_partitions=api_config.kafka_topic_partitions,
+        topic_replication_factor=api_config.kafka_topic_replication_factor,
+        pairs=api_config.pairs,
     )
@@ -0,0 +1,23 @@
+import zlib
+from typing import Dict, List
+
+
+class PairPartitioner:
+    """
+    Maps the message key of a pair to its partition of the trades topic.
+
+    The partition is the CRC32 of the key modulo the partition count, the same as the
+    `consistent` partitioner of librdkafka. It only depends on the key and the
+    partition count, so adding, removing or reordering pairs in the config never moves
+    a pair (and the state the candles service keeps for it) to another partition.
+    """
+
+    def __init__(self, n_partitions: int):
+        self.n_partitions = n_partitions
+
+    def partition(self, key: bytes) -> int:
+        return zlib.crc32(key) % self.n_partitions
+
+    def assignment(self, pairs: List[str]) -> Dict[str, int]:
+        """Returns the partition of every pair"""
+        return {pair: self.partition(pair.replace('/', '-').encode()) for pair in pairs}
@@ -0,0 +1,59 @@
+import time
+from typing import Optional
+
+from confluent_kafka import KafkaError, Message
+from loguru import logger
+
+
+class ProducerStats:
+    """
+    Keeps track of the produced and delivered messages and periodically logs the
+    throughput and the producer queue depth, instead of logging every single trade.
+    """
+
+    def __init__(self, report_interval_seconds: float = 10.0):
+        self.report_interval_seconds = report_interval_seconds
+
+        self.produced = 0
+        self.messages = 0
+        self.delivered = 0
+        self.failed = 0
+
+        self._last_report_time = time.monotonic()
+        self._last_report_produced = 0
+        self._last_report_delivered = 0
+
+    def on_delivery(self, err: Optional[KafkaError], msg: Message) -> None:
+        """
+        Delivery callback, called by the producer on `poll()` for every message.
+        """
+        if err is not None:
+            self.failed += 1
+            logger.error(f'Failed to deliver message (key={msg.key()}): {err}')
+        else:
+            self.delivered += 1
+
+    def record_produced(self, n_trades: int, n_messages: int) -> None:
+        self.produced += n_trades
+        self.messages += n_messages
+
+    def maybe_report(self, queue_depth: int) -> None:
+        """
+        Logs the throughput since the last report, if the report interval has passed.
+        """
+        now = time.monotonic()
+        elapsed = now - self._last_report_time
+        if elapsed < self.report_interval_seconds:
+            return
+
+        produced_per_sec = (self.produced - self._last_report_produced) / elapsed
+        delivered_per_sec = (self.delivered - self._last_report_delivered) / elapsed
+        logger.info(
+            f'Produced {produced_per_sec:.0f} trades/sec, delivered {delivered_per_sec:.0f} messages/sec '
+            f'(total trades={self.produced}, messages={self.messages}, delivered={self.delivered}, '
+            f'failed={self.failed}, queue depth={queue_depth})'
+        )
+
+        self._last_report_time = now
+        self._last_report_produced = self.produced
+        self._last_report_delivered = self.delivered